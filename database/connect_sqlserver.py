@@ -1,46 +1,164 @@
+import threading
 import traceback
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 import urllib
-from settings.config import USER_NAME, PASSWORD
+from settings.config import (
+    USER_NAME, PASSWORD,
+    SQL_POOL_SIZE, SQL_MAX_OVERFLOW, SQL_POOL_TIMEOUT, SQL_POOL_RECYCLE,
+    SQL_CHUNK_SIZE, SQL_CONNECT_TIMEOUT, SQL_QUERY_TIMEOUT
+)
+from database.resilience import DataSourceError, call_with_retry, get_breaker, is_transient
+
+SQL_SERVER_HOST = "esq-mssql-std-dm.cogfagymhkon.ap-southeast-2.rds.amazonaws.com"
+SQL_SERVER_DATABASE = "ESQ_DATA"
+
+# Engine dùng chung cho cả process: mỗi DSN một engine (tạo lazy ở lần dùng đầu tiên)
+_engines = {}
+_engines_lock = threading.Lock()
+
+def build_dsn(user=USER_NAME, password=PASSWORD):
+    """Chuỗi kết nối ODBC tới SQL Server"""
+    return (
+        "DRIVER={ODBC Driver 17 for SQL Server};"
+        f"SERVER={SQL_SERVER_HOST};"
+        f"DATABASE={SQL_SERVER_DATABASE};"
+        f"UID={user};"
+        f"PWD={password}"
+    )
+
+def get_engine(dsn: str):
+    """Lấy engine dùng chung theo DSN, chỉ tạo một lần cho cả process"""
+    engine = _engines.get(dsn)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(dsn)
+            if engine is None:
+                params = urllib.parse.quote_plus(dsn)
+                engine = create_engine(
+                    f"mssql+pyodbc:///?odbc_connect={params}",
+                    pool_size=SQL_POOL_SIZE,
+                    max_overflow=SQL_MAX_OVERFLOW,
+                    pool_timeout=SQL_POOL_TIMEOUT,
+                    pool_recycle=SQL_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    # Timeout khi mở kết nối (login timeout của pyodbc)
+                    connect_args={"timeout": SQL_CONNECT_TIMEOUT}
+                )
+
+                @event.listens_for(engine, "connect")
+                def set_query_timeout(dbapi_connection, connection_record):
+                    # Timeout cho từng câu lệnh trên kết nối pyodbc
+                    dbapi_connection.timeout = SQL_QUERY_TIMEOUT
+
+                _engines[dsn] = engine
+    return engine
+
+def _dsn_label(dsn: str) -> str:
+    """Tên hiển thị của DSN (bỏ UID/PWD)"""
+    parts = dict(
+        item.split("=", 1) for item in dsn.split(";") if "=" in item
+    )
+    return f"{parts.get('SERVER', '?')}/{parts.get('DATABASE', '?')}"
+
+def pool_stats() -> dict:
+    """Thống kê pool của tất cả engine đang mở"""
+    stats = {}
+    for dsn, engine in list(_engines.items()):
+        pool = engine.pool
+        stats[_dsn_label(dsn)] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "status": pool.status()
+        }
+    return stats
+
+def dispose_engines():
+    """Đóng toàn bộ engine (dùng khi tắt ứng dụng)"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+def _prepare(query, params):
+    """Câu truy vấn có tham số dạng :name cần bọc bằng text() để bind"""
+    return text(query) if params else query
 
 class ConnectSQLServer:
     def __init__(self):
         self.engine = None
         self.user = USER_NAME
         self.password = PASSWORD
+        self.dsn = build_dsn(self.user, self.password)
 
         self.connectSQL()
 
     def connectSQL(self):
         try:
-            # Thông tin kết nối
-            params = urllib.parse.quote_plus(
-                "DRIVER={ODBC Driver 17 for SQL Server};"
-                "SERVER=esq-mssql-std-dm.cogfagymhkon.ap-southeast-2.rds.amazonaws.com;"
-                "DATABASE=ESQ_DATA;"
-                f"UID={USER_NAME};"
-                f"PWD={PASSWORD}"
-            )
-
-            # Tạo engine SQLAlchemy
-            self.engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
+            # Mượn engine dùng chung thay vì tạo engine + pool mới cho mỗi instance
+            self.engine = get_engine(self.dsn)
             return self.engine
         except Exception as e:
             print(f"Error: {e}")
 
-    def getData(self, query):
+    def pool_status(self) -> dict:
+        """Thống kê pool của engine đang dùng"""
+        if self.engine is None:
+            return {}
+        return pool_stats().get(_dsn_label(self.dsn), {})
+
+    def getData(self, query, params: dict = None):
+        """
+        Đọc toàn bộ kết quả. Lỗi tạm thời được thử lại; lỗi cuối cùng ném DataSourceError
+        (kết quả rỗng chỉ có nghĩa là không có dữ liệu)
+        """
+        if self.engine is None:
+            raise DataSourceError("sql_server", "Kết nối SQL không tồn tại.")
+
+        def read():
+            # Kết nối được mượn từ pool và trả lại khi ra khỏi with
+            with self.engine.connect() as conn:
+                return pd.read_sql(_prepare(query, params), conn, params=params)
+
+        try:
+            return call_with_retry(read, "sql_server", description="getData")
+        except DataSourceError as e:
+            traceback.print_exc()
+            print(f"Lỗi khi lấy dữ liệu {e}")
+            raise
+
+    def getDataChunks(self, query, params: dict = None, chunksize: int = SQL_CHUNK_SIZE):
+        """
+        Đọc streaming theo từng chunk DataFrame (server-side cursor),
+        bộ nhớ chỉ giữ tối đa một chunk thay vì toàn bộ kết quả.
+        Chỉ thử lại khi lỗi xảy ra trước chunk đầu tiên (chưa trả dữ liệu nào cho caller)
+        """
+        if self.engine is None:
+            raise DataSourceError("sql_server", "Kết nối SQL không tồn tại.")
+
+        def open_stream():
+            conn = self.engine.connect().execution_options(stream_results=True)
+            try:
+                chunks = pd.read_sql(_prepare(query, params), conn, params=params, chunksize=chunksize)
+                return conn, chunks, next(chunks, None)
+            except Exception:
+                conn.close()
+                raise
+
+        conn, chunks, first = call_with_retry(open_stream, "sql_server", description="getDataChunks")
+        breaker = get_breaker("sql_server")
         try:
-            print(self.engine)
-            if self.engine is not None:
-                with self.engine.connect() as conn:
-                    data = pd.read_sql(query, conn)
-                    return data
-            else:
-                print("Kết nối SQL không tồn tại.")
-
-                return pd.DataFrame()
+            chunk = first
+            while chunk is not None:
+                yield chunk
+                chunk = next(chunks, None)
         except Exception as e:
+            if is_transient(e):
+                breaker.record_failure()
             traceback.print_exc()
             print(f"Lỗi khi lấy dữ liệu {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            raise DataSourceError("sql_server", f"getDataChunks {e}", e) from e
+        finally:
+            conn.close()
@@ -1,19 +1,137 @@
+import io
+import json
+import threading
+import time
 import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 import pandas as pd
-from settings.config import SUPABASE_API, SUPABASE_URL
+from settings.config import (
+    SUPABASE_API, SUPABASE_URL,
+    SUPABASE_PAGE_SIZE, SUPABASE_READ_WORKERS, SUPABASE_MAX_ROWS,
+    SUPABASE_INSERT_BATCH_ROWS, SUPABASE_INSERT_BATCH_BYTES,
+    SUPABASE_WRITE_WORKERS, SUPABASE_INSERT_RETRIES, SUPABASE_TIMEOUT, UPSERT_STAGE_MAX_AGE
+)
 from supabase import Client, create_client
+from supabase.lib.client_options import ClientOptions
+from database.read_cache import read_cache
+from database.resilience import DataSourceError, call_with_retry
 print(SUPABASE_URL, SUPABASE_API)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_API)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_API, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+
+def execute(request, description: str = "", retries: int = None, idempotent: bool = True):
+    """
+    Chạy request supabase-py (.rpc()/.table()...) qua retry + circuit breaker của Supabase.
+    idempotent=False cho lệnh ghi mà gửi lại sẽ ghi trùng (chỉ thử lại khi request chưa tới server)
+    """
+    if retries is None:
+        return call_with_retry(request.execute, "supabase", description=description, idempotent=idempotent)
+    return call_with_retry(request.execute, "supabase", retries=retries, description=description, idempotent=idempotent)
+
+# Khóa duy nhất của các bảng ghi bằng insert_data mà gửi lại batch không tạo dòng trùng
+# (upsert bỏ qua dòng trùng khóa); bảng khác chỉ thử lại khi request chưa tới server
+IDEMPOTENT_INSERT_KEYS = {
+    "upsert_stage": "row_id",
+}
+
+# Khóa tự nhiên của từng bảng, dùng cho upsert
+TABLE_KEYS = {
+    "fabric_trans": ["SC_NO", "JO_NO", "TRANS_DATE", "TRANS_CD", "ITEM_CODE", "PO_NO", "TRANS_TYPE"],
+    "submat_trans": ["SC_NO", "JO_NO", "TRANS_DATE", "TRANS_CD", "ITEM_CODE", "STORE_CODE"],
+    "process_wip": ["JO_NO", "Color_Code", "Size_Code", "Process_Code"],
+    "submat_demand": ["JO_NO", "Product_Code", "Dimm_No"],
+    "go_quantity": ["GO_No", "Year"],
+    "cutting_forecast": ["GO", "JO", "Color", "PPO_No"],
+    "dm_actual": ["SC_NO", "CODE_CUSTOMS"],
+    "dm_technical": ["SC_NO", "CODE_CUSTOMS"],
+}
+
+# Cột được tính ở bước sau: mỗi lần upsert, mọi dòng trong phạm vi được reset về null để tính lại
+# (như khi xóa rồi thêm lại), kể cả dòng không đổi vì bảng tham chiếu có thể đã sửa.
+# cutting_forecast: process_fabric_demand tính lại các dòng "CODE_CUSTOMS" IS NULL theo fabric_list
+# submat_demand: rpc update_submat_demand tính CODE_HQ theo trims_list
+# dm_technical: rpc update_dm_technical tính DEMAND (không phụ thuộc rpc chỉ tính dòng DEMAND null hay tính lại tất cả)
+TABLE_RESET_COLUMNS = {
+    "cutting_forecast": ["CODE_CUSTOMS", "Width", "TOTAL_FB_USED"],
+    "submat_demand": ["CODE_HQ", "TOTAL_SUB_USED"],
+    "dm_technical": ["DEMAND"],
+}
+
+# Lần dọn upsert_stage gần nhất của process
+_stage_purged_at = 0.0
+_stage_purge_lock = threading.Lock()
+
+# Thống kê ghi dữ liệu theo bảng (rows, bytes, seconds, batches, failed_batches)
+_insert_stats = {}
+_insert_stats_lock = threading.Lock()
+
+def get_insert_stats() -> dict:
+    """Thống kê throughput insert theo bảng (dòng/s, bytes/s)"""
+    with _insert_stats_lock:
+        stats = {}
+        for table_name, item in _insert_stats.items():
+            seconds = item["seconds"] or 1e-9
+            stats[table_name] = dict(item, rows_per_sec=item["rows"] / seconds, bytes_per_sec=item["bytes"] / seconds)
+        return stats
+
+def _record_insert_stats(table_name, rows, size, seconds, batches, failed_batches):
+    with _insert_stats_lock:
+        item = _insert_stats.setdefault(table_name, {"rows": 0, "bytes": 0, "seconds": 0.0, "batches": 0, "failed_batches": 0})
+        item["rows"] += rows
+        item["bytes"] += size
+        item["seconds"] += seconds
+        item["batches"] += batches
+        item["failed_batches"] += failed_batches
+
+def split_batches(records, max_rows: int = SUPABASE_INSERT_BATCH_ROWS, max_bytes: int = SUPABASE_INSERT_BATCH_BYTES):
+    """Chia records thành các batch không vượt quá số dòng và kích thước JSON cho phép"""
+    batch, size = [], 0
+    for record in records:
+        record_size = len(json.dumps(record, default=str)) + 1
+        if batch and (len(batch) >= max_rows or size + record_size > max_bytes):
+            yield batch, size
+            batch, size = [], 0
+        batch.append(record)
+        size += record_size
+    if batch:
+        yield batch, size
+
+def invalidates_cache(func):
+    """Xóa cache đọc của bảng sau khi ghi (kể cả khi ghi lỗi giữa chừng)"""
+    @wraps(func)
+    def wrapper(self, table_name, *args, **kwargs):
+        try:
+            return func(self, table_name, *args, **kwargs)
+        finally:
+            read_cache.invalidate(table_name)
+    return wrapper
 
 class SupabaseFunctions:
     # FUNCTION RUN ON PYTHON
-    def get_data(self, table_name: str, items: str, conditions: str = None):
+    def get_data(self, table_name: str, items: str, conditions: str = None, page_size: int = None, response_format: str = "json"):
+        if not read_cache.cacheable(table_name):
+            return self._select(table_name, items, conditions, page_size, response_format)
+
+        # Bảng master: đọc qua cache, trả bản copy để caller sửa thoải mái
+        key = (table_name, items.strip(), (conditions or "").strip(), page_size, response_format)
+        data = read_cache.get(key)
+        if data is None:
+            generation = read_cache.generation(table_name)
+            data = self._select(table_name, items, conditions, page_size, response_format)
+            read_cache.put(key, data, generation)
+        return data
+
+    def _select(self, table_name: str, items: str, conditions: str = None, page_size: int = None, response_format: str = "json"):
+        if page_size:
+            return self.get_data_paged(table_name, items, conditions, page_size, response_format=response_format)
         try:
-            res = supabase.rpc("select_data", {
+            res = execute(supabase.rpc("select_data", {
                 "table_name": table_name,
                 "select_item": items,
                 "conditions": conditions
-            }).execute()
+            }), f"select {table_name}")
 
             if res:
                 data = res.data
@@ -22,60 +140,262 @@ class SupabaseFunctions:
             else:
                 return pd.DataFrame()
         
+        except DataSourceError as e:
+            # Lỗi khác với không có dữ liệu: ném lên cho caller
+            print(e)
+            raise
+
+    def count_rows(self, table_name: str, conditions: str = None):
+        """Số dòng thỏa điều kiện (không qua cache), None nếu lỗi"""
+        try:
+            res = execute(supabase.rpc("select_data", {
+                "table_name": table_name,
+                "select_item": ' COUNT(*) AS "n" ',
+                "conditions": conditions
+            }), f"count {table_name}")
+            return int(res.data[0]["n"]) if res and res.data else 0
         except Exception as e:
             print(e)
-            return pd.DataFrame()
+            return None
+
+    def checksum_rows(self, table_name: str, conditions: str = None):
+        """md5 nội dung các dòng thỏa điều kiện theo thứ tự id (không qua cache), "" nếu không có dòng, None nếu lỗi"""
+        try:
+            res = execute(supabase.rpc("select_data", {
+                "table_name": table_name,
+                "select_item": f' md5(string_agg(md5(CAST("{table_name}" AS text)), \'\' ORDER BY "id")) AS "checksum" ',
+                "conditions": conditions
+            }), f"checksum {table_name}")
+            return (res.data[0]["checksum"] or "") if res and res.data else ""
+        except Exception as e:
+            print(e)
+            return None
+
+    def _get_id_bounds(self, table_name: str, conditions: str = None):
+        """Lấy id nhỏ nhất/lớn nhất thỏa điều kiện để chia trang"""
+        res = execute(supabase.rpc("select_data", {
+            "table_name": table_name,
+            "select_item": ' MIN("id") AS "lo", MAX("id") AS "hi" ',
+            "conditions": conditions
+        }), f"select {table_name}")
+        if not res or not res.data or res.data[0].get("lo") is None:
+            return None, None
+        return int(res.data[0]["lo"]), int(res.data[0]["hi"])
+
+    def _fetch_page(self, table_name: str, items: str, conditions: str, lo: int, hi: int, response_format: str):
+        """Lấy một trang theo khoảng id [lo, hi)"""
+        if response_format == "csv" and not conditions:
+            # CSV đi qua REST API của bảng nên chỉ dùng được khi không có điều kiện SQL
+            res = execute(supabase.table(table_name).select(items.strip())
+                          .gte("id", lo).lt("id", hi).order("id").csv(), f"select {table_name}")
+            return pd.read_csv(io.StringIO(res.data)) if res and res.data else pd.DataFrame()
+
+        page_conditions = f'"id" >= {lo} AND "id" < {hi}'
+        if conditions:
+            page_conditions = f'({conditions}) AND {page_conditions}'
+        res = execute(supabase.rpc("select_data", {
+            "table_name": table_name,
+            "select_item": items,
+            "conditions": page_conditions
+        }), f"select {table_name}")
+        return pd.DataFrame(res.data) if res and res.data else pd.DataFrame()
+
+    def iter_data_pages(self, table_name: str, items: str, conditions: str = None,
+                        page_size: int = SUPABASE_PAGE_SIZE, max_workers: int = SUPABASE_READ_WORKERS,
+                        response_format: str = "json"):
+        """
+        Đọc phân trang theo khoảng "id" (keyset), tải song song tối đa max_workers trang
+        và trả lần lượt từng trang theo thứ tự id cho caller
+        """
+        if response_format == "csv" and not conditions:
+            page_size = min(page_size, SUPABASE_MAX_ROWS)
+
+        lo, hi = self._get_id_bounds(table_name, conditions)
+        if lo is None:
+            return
+
+        ranges = deque((start, min(start + page_size, hi + 1)) for start in range(lo, hi + 1, page_size))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            while ranges or pending:
+                # Giữ tối đa max_workers trang đang tải để bộ nhớ không tăng theo kích thước bảng
+                while ranges and len(pending) < max_workers:
+                    start, end = ranges.popleft()
+                    pending.append(pool.submit(self._fetch_page, table_name, items, conditions, start, end, response_format))
+                page = pending.popleft().result()
+                if not page.empty:
+                    yield page
+
+    def get_data_paged(self, table_name: str, items: str, conditions: str = None,
+                       page_size: int = SUPABASE_PAGE_SIZE, max_workers: int = SUPABASE_READ_WORKERS,
+                       response_format: str = "json"):
+        """Đọc phân trang song song rồi ghép lại thành một DataFrame"""
+        try:
+            pages = list(self.iter_data_pages(table_name, items, conditions, page_size, max_workers, response_format))
+            if not pages:
+                return pd.DataFrame()
+            return pd.concat(pages, ignore_index=True)
+
+        except DataSourceError as e:
+            print(e)
+            raise
 
+    @invalidates_cache
     def update_data(self, table_name: str, set_value: str, conditions: str):
         try:
-            response = supabase.rpc('update_data',
+            response = execute(supabase.rpc('update_data',
                                 {'table_name': table_name, 
                                 'set_value': set_value, 
                                 'conditions': conditions}
-                                ).execute()
+                                ), f"update {table_name}")
             if response:
                 return True
         except Exception as e:
             print(traceback.format_exc())
             return False
         
+    @invalidates_cache
     def update_batch(self, table_name: str, set_columns: str, where_columns: str, updates: str, batch_mode: str = False):
         try:
-            response = supabase.rpc('update_dynamic_batch',
+            response = execute(supabase.rpc('update_dynamic_batch',
                                 {'table_name': table_name, 
                                 'set_columns': set_columns, 
                                 'where_columns': where_columns,
                                 'updates': updates,
                                 'batch_mode': batch_mode
                                 }
-                                ).execute()
+                                ), f"update {table_name}")
             if response:
                 return True
         except Exception as e:
             print(traceback.format_exc())
             return False
         
-    def insert_data(self, table_name, data_json):
+    def _insert_batch(self, table_name, batch, retries: int = SUPABASE_INSERT_RETRIES):
+        """
+        Insert một batch. Timeout/mất kết nối sau khi gửi không cho biết server đã ghi hay chưa:
+        bảng có khóa trong IDEMPOTENT_INSERT_KEYS được ghi bằng upsert bỏ qua dòng trùng nên thử lại an toàn,
+        bảng khác chỉ thử lại khi request chưa tới server
+        """
+        on_conflict = IDEMPOTENT_INSERT_KEYS.get(table_name)
+        if on_conflict:
+            request = supabase.table(table_name).upsert(batch, on_conflict=on_conflict, ignore_duplicates=True)
+        else:
+            request = supabase.table(table_name).insert(batch)
+        try:
+            response = execute(request, f"insert {table_name} ({len(batch)} dòng)", retries, idempotent=bool(on_conflict))
+            return bool(response)
+        except DataSourceError as e:
+            print(f"❌ Lỗi insert batch {e}")
+            return False
+
+    @invalidates_cache
+    def insert_data(self, table_name, data_json, max_workers: int = SUPABASE_WRITE_WORKERS):
+        try:
+            batches = list(split_batches(data_json))
+            if not batches:
+                return True
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+                results = list(pool.map(lambda item: self._insert_batch(table_name, item[0]), batches))
+            seconds = time.perf_counter() - start
+
+            rows = sum(len(batch) for (batch, _), ok in zip(batches, results) if ok)
+            size = sum(size for (_, size), ok in zip(batches, results) if ok)
+            failed = results.count(False)
+            _record_insert_stats(table_name, rows, size, seconds, len(batches), failed)
+            print(f"📊 Insert {table_name}: {rows} dòng / {len(batches)} batch, "
+                  f"{rows / max(seconds, 1e-9):.0f} dòng/s, {size / 1024 / max(seconds, 1e-9):.0f} KB/s")
+
+            if failed:
+                print(f"❌ {failed}/{len(batches)} batch {table_name} lỗi sau khi thử lại")
+                return False
+            return True
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    def purge_stale_stages(self, max_age: int = UPSERT_STAGE_MAX_AGE):
+        """
+        Xóa dòng upsert_stage cũ hơn max_age giây: stage bị bỏ lại khi tiến trình dừng
+        giữa stage_upsert và commit_upsert (không qua discard_upsert). Mỗi process chạy tối đa một lần mỗi max_age/2
+        """
+        global _stage_purged_at
+        with _stage_purge_lock:
+            if time.time() - _stage_purged_at < max_age / 2:
+                return
+            _stage_purged_at = time.time()
+        self.delete_data("upsert_stage", f' "created_at" < now() - interval \'{int(max_age)} seconds\' ')
+
+    def stage_upsert(self, table_name, data_json, stage_id: str = None):
+        """
+        Đẩy một phần dữ liệu (vd một chunk) vào upsert_stage.
+        Trả về stage_id để đẩy tiếp hoặc commit_upsert, None nếu lỗi
+        """
+        if stage_id is None:
+            self.purge_stale_stages()
+        stage_id = stage_id or str(uuid.uuid4())
+        # row_id cố định theo dòng để gửi lại batch (sau timeout) không stage trùng
+        rows = [
+            {"stage_id": stage_id, "row_id": str(uuid.uuid4()), "table_name": table_name, "payload": record}
+            for record in data_json
+        ]
+        if self.insert_data("upsert_stage", rows):
+            return stage_id
+        self.discard_upsert(stage_id)
+        return None
+
+    @invalidates_cache
+    def commit_upsert(self, table_name, stage_id, scope_conditions: str = None, key_columns: list = None):
+        """
+        Gộp dữ liệu đã stage vào bảng trong một transaction phía server (upsert_keyed):
+        chỉ ghi dòng mới/thay đổi theo khóa tự nhiên và xóa dòng cũ trong scope_conditions.
+        Không thử lại sau khi đã gửi: lần commit đầu đã dọn stage thì lần gửi lại sẽ xóa toàn bộ phạm vi
+        """
         try:
-            response = supabase.table(table_name).insert(data_json).execute()
+            response = execute(supabase.rpc('upsert_keyed', {
+                'table_name': table_name,
+                'key_columns': key_columns or TABLE_KEYS[table_name],
+                'stage_id': stage_id,
+                'scope_conditions': scope_conditions,
+                'reset_columns': TABLE_RESET_COLUMNS.get(table_name, [])
+            }), f"upsert {table_name}", idempotent=False)
             if response:
+                counts = response.data or {}
+                print(f"✅ Upsert {table_name}: thêm {counts.get('inserted', 0)}, "
+                      f"cập nhật {counts.get('updated', 0)}, xóa {counts.get('deleted', 0)} dòng")
                 return True
         except Exception as e:
             print(traceback.format_exc())
+            self.discard_upsert(stage_id)
+            return False
+
+    def discard_upsert(self, stage_id):
+        """Xóa dữ liệu stage khi upsert bị hủy"""
+        return self.delete_data("upsert_stage", f' "stage_id" = \'{stage_id}\' ')
+
+    def upsert_data(self, table_name, data_json, scope_conditions: str = None, key_columns: list = None):
+        """Upsert toàn bộ data_json vào bảng (stage + commit)"""
+        stage_id = str(uuid.uuid4())
+        if data_json and self.stage_upsert(table_name, data_json, stage_id) is None:
             return False
+        return self.commit_upsert(table_name, stage_id, scope_conditions, key_columns)
 
+    @invalidates_cache
     def truncate_table(self, table_name):
         try:
-            response = supabase.rpc('truncate_func', {'table_name': table_name}).execute()
+            response = execute(supabase.rpc('truncate_func', {'table_name': table_name}), f"truncate {table_name}")
             if response:
                 return True
         except Exception as e:
             print(traceback.format_exc())
             return False
 
+    @invalidates_cache
     def delete_data(self, table_name, conditions = None):
         try:
-            response = supabase.rpc('delete_data', {'table_name': table_name, 'conditions': conditions}).execute()
+            response = execute(supabase.rpc('delete_data', {'table_name': table_name, 'conditions': conditions}), f"delete {table_name}")
             if response:
                 return True
         except Exception as e:
@@ -85,7 +405,7 @@ class SupabaseFunctions:
     # FUNCTION RUN ON SUPABASE
     def update_submat_demand(self):
         try:
-            response = supabase.rpc('update_submat_demand').execute()
+            response = execute(supabase.rpc('update_submat_demand'), 'update_submat_demand')
             if response:
                 return True
         except Exception as e:
@@ -94,7 +414,7 @@ class SupabaseFunctions:
         
     def update_check_technical(self):
         try:
-            response = supabase.rpc('update_check_technical').execute()
+            response = execute(supabase.rpc('update_check_technical'), 'update_check_technical')
             if response:
                 return True
         except Exception as e:
@@ -103,7 +423,8 @@ class SupabaseFunctions:
 
     def insert_update_dm_technical(self):
         try:
-            response = supabase.rpc('insert_update_dm_technical').execute()
+            # RPC có thêm dòng: không gửi lại khi không chắc server đã chạy hay chưa
+            response = execute(supabase.rpc('insert_update_dm_technical'), 'insert_update_dm_technical', idempotent=False)
             if response:
                 return True
         except Exception as e:
@@ -112,7 +433,7 @@ class SupabaseFunctions:
         
     def update_dm_technical(self):
         try:
-            response = supabase.rpc('update_dm_technical').execute()
+            response = execute(supabase.rpc('update_dm_technical'), 'update_dm_technical')
             if response:
                 return True
         except Exception as e:
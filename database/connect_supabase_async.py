@@ -0,0 +1,227 @@
+import asyncio
+import time
+import traceback
+from functools import wraps
+
+import httpx
+import pandas as pd
+
+from settings.config import (
+    SUPABASE_API, SUPABASE_URL,
+    SUPABASE_PAGE_SIZE, SUPABASE_READ_WORKERS, SUPABASE_WRITE_WORKERS, SUPABASE_INSERT_RETRIES,
+    SUPABASE_HTTP2, SUPABASE_HTTP_MAX_CONNECTIONS, SUPABASE_HTTP_MAX_KEEPALIVE,
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY, SUPABASE_HTTP_TIMEOUT
+)
+from database.connect_supabase import split_batches, _record_insert_stats, IDEMPOTENT_INSERT_KEYS
+from database.read_cache import read_cache
+from database.resilience import DataSourceError, async_call_with_retry
+
+# Mỗi event loop một client dùng chung (httpx.AsyncClient gắn với loop tạo ra nó)
+_clients = {}
+
+def get_async_client() -> httpx.AsyncClient:
+    """HTTP client bất đồng bộ dùng chung cho loop hiện tại (keep-alive, HTTP/2, pool có giới hạn)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": SUPABASE_API,
+                "Authorization": f"Bearer {SUPABASE_API}",
+                "Content-Type": "application/json"
+            },
+            http2=SUPABASE_HTTP2,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=SUPABASE_HTTP_TIMEOUT
+        )
+        _clients[loop] = client
+    return client
+
+async def close_async_clients():
+    """Đóng các client (khi tắt ứng dụng)"""
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+def invalidates_cache(func):
+    """Xóa cache đọc của bảng sau khi ghi (bản async)"""
+    @wraps(func)
+    async def wrapper(self, table_name, *args, **kwargs):
+        try:
+            return await func(self, table_name, *args, **kwargs)
+        finally:
+            read_cache.invalidate(table_name)
+    return wrapper
+
+class AsyncSupabaseFunctions:
+    """
+    Cùng các hàm select/insert/update/delete/RPC như SupabaseFunctions nhưng chạy
+    trực tiếp trên event loop (httpx async), không chiếm thread của executor mặc định
+    """
+    async def rpc(self, function_name: str, params: dict = None):
+        """Gọi RPC qua retry + circuit breaker dùng chung với SupabaseFunctions"""
+        client = get_async_client()
+
+        async def post():
+            response = await client.post(f"/rpc/{function_name}", json=params or {})
+            response.raise_for_status()
+            return response.json() if response.content else None
+
+        return await async_call_with_retry(post, "supabase", description=function_name)
+
+    # FUNCTION RUN ON PYTHON
+    async def get_data(self, table_name: str, items: str, conditions: str = None):
+        if not read_cache.cacheable(table_name):
+            return await self._select(table_name, items, conditions)
+
+        # Dùng chung cache với SupabaseFunctions.get_data
+        key = (table_name, items.strip(), (conditions or "").strip(), None, "json")
+        data = read_cache.get(key)
+        if data is None:
+            generation = read_cache.generation(table_name)
+            data = await self._select(table_name, items, conditions)
+            read_cache.put(key, data, generation)
+        return data
+
+    async def _select(self, table_name: str, items: str, conditions: str = None):
+        try:
+            data = await self.rpc("select_data", {
+                "table_name": table_name,
+                "select_item": items,
+                "conditions": conditions
+            })
+            return pd.DataFrame(data) if data else pd.DataFrame()
+
+        except DataSourceError as e:
+            # Lỗi khác với không có dữ liệu: ném lên cho caller
+            print(e)
+            raise
+
+    async def get_data_paged(self, table_name: str, items: str, conditions: str = None,
+                             page_size: int = SUPABASE_PAGE_SIZE, max_workers: int = SUPABASE_READ_WORKERS):
+        """Đọc phân trang theo khoảng "id", các trang chạy đồng thời trên event loop"""
+        try:
+            bounds = await self.rpc("select_data", {
+                "table_name": table_name,
+                "select_item": ' MIN("id") AS "lo", MAX("id") AS "hi" ',
+                "conditions": conditions
+            })
+            if not bounds or bounds[0].get("lo") is None:
+                return pd.DataFrame()
+            lo, hi = int(bounds[0]["lo"]), int(bounds[0]["hi"])
+
+            semaphore = asyncio.Semaphore(max_workers)
+
+            async def fetch_page(start, end):
+                page_conditions = f'"id" >= {start} AND "id" < {end}'
+                if conditions:
+                    page_conditions = f'({conditions}) AND {page_conditions}'
+                async with semaphore:
+                    data = await self.rpc("select_data", {
+                        "table_name": table_name,
+                        "select_item": items,
+                        "conditions": page_conditions
+                    })
+                return pd.DataFrame(data) if data else pd.DataFrame()
+
+            pages = await asyncio.gather(*[
+                fetch_page(start, min(start + page_size, hi + 1)) for start in range(lo, hi + 1, page_size)
+            ])
+            pages = [page for page in pages if not page.empty]
+            return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+
+        except DataSourceError as e:
+            print(e)
+            raise
+
+    @invalidates_cache
+    async def update_data(self, table_name: str, set_value: str, conditions: str):
+        try:
+            await self.rpc('update_data', {'table_name': table_name, 'set_value': set_value, 'conditions': conditions})
+            return True
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    @invalidates_cache
+    async def update_batch(self, table_name: str, set_columns: str, where_columns: str, updates: str, batch_mode: str = False):
+        try:
+            await self.rpc('update_dynamic_batch', {
+                'table_name': table_name,
+                'set_columns': set_columns,
+                'where_columns': where_columns,
+                'updates': updates,
+                'batch_mode': batch_mode
+            })
+            return True
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    async def _insert_batch(self, table_name, batch, retries: int = SUPABASE_INSERT_RETRIES):
+        """Như SupabaseFunctions._insert_batch: chỉ thử lại khi gửi lại không thể ghi trùng"""
+        client = get_async_client()
+        on_conflict = IDEMPOTENT_INSERT_KEYS.get(table_name)
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        prefer = "resolution=ignore-duplicates,return=minimal" if on_conflict else "return=minimal"
+
+        async def post():
+            response = await client.post(f"/{table_name}", json=batch, params=params, headers={"Prefer": prefer})
+            response.raise_for_status()
+
+        try:
+            await async_call_with_retry(post, "supabase", retries, f"insert {table_name} ({len(batch)} dòng)",
+                                        idempotent=bool(on_conflict))
+            return True
+        except DataSourceError as e:
+            print(f"❌ Lỗi insert batch {e}")
+            return False
+
+    @invalidates_cache
+    async def insert_data(self, table_name, data_json, max_workers: int = SUPABASE_WRITE_WORKERS):
+        try:
+            batches = list(split_batches(data_json))
+            if not batches:
+                return True
+
+            semaphore = asyncio.Semaphore(max_workers)
+
+            async def insert_one(batch):
+                async with semaphore:
+                    return await self._insert_batch(table_name, batch)
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*[insert_one(batch) for batch, _ in batches])
+            seconds = time.perf_counter() - start
+
+            rows = sum(len(batch) for (batch, _), ok in zip(batches, results) if ok)
+            size = sum(size for (_, size), ok in zip(batches, results) if ok)
+            failed = results.count(False)
+            _record_insert_stats(table_name, rows, size, seconds, len(batches), failed)
+            return failed == 0
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    @invalidates_cache
+    async def truncate_table(self, table_name):
+        try:
+            await self.rpc('truncate_func', {'table_name': table_name})
+            return True
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
+
+    @invalidates_cache
+    async def delete_data(self, table_name, conditions = None):
+        try:
+            await self.rpc('delete_data', {'table_name': table_name, 'conditions': conditions})
+            return True
+        except Exception as e:
+            print(traceback.format_exc())
+            return False
@@ -0,0 +1,346 @@
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from settings.config import FRESHNESS_PROBE, FRESHNESS_PATH, FRESHNESS_MAX_AGE, TRANS_FULL_REBUILD_INTERVAL
+from database.connect_sqlserver import ConnectSQLServer
+from database.lookback import month_windows
+from database.query_builder import CodeSet, parse_codes
+from database.reference_mirror import get_reference_mirror
+from database.view_schema import get_view_schema
+
+class SourceProbe:
+    """
+    Truy vấn rẻ (GROUP BY theo mã, không đọc cột chi tiết) trả về watermark của nguồn
+    cho từng mã: số dòng, ngày mới nhất và tổng các cột số lượng.
+    Cùng điều kiện lọc với truy vấn lấy dữ liệu thật để watermark đổi khi dữ liệu đổi
+    """
+    def __init__(self, schema_name: str, key_columns: List[str], date_column: str = None,
+                 windows: Callable[[], List[str]] = None, sums: List[str] = None,
+                 filters: List[str] = None, references: List[str] = None):
+        self.schema = get_view_schema(schema_name)
+        self.key_columns = key_columns
+        self.date_column = date_column
+        self.windows = windows
+        self.sums = sums or []
+        self.filters = filters or []
+        # Bảng tham chiếu ghép vào kết quả: bảng này đổi (kể cả từ process khác) cũng làm kết quả cũ hết hiệu lực
+        self.references = references or []
+
+    def _key_expression(self, code_set: CodeSet) -> str:
+        if len(self.key_columns) == 1:
+            return self.key_columns[0]
+        cases = " ".join(f"WHEN {col} IN {code_set.sql} THEN {col}" for col in self.key_columns[:-1])
+        return f"CASE {cases} ELSE {self.key_columns[-1]} END"
+
+    def version(self) -> str:
+        """Phần watermark không nằm trong view: mốc lookback hiện tại và phiên bản bảng tham chiếu"""
+        parts = list(self.windows()) if self.windows else []
+        parts += [f"{table}:{get_reference_mirror().version(table)}" for table in self.references]
+        return ",".join(parts)
+
+    def build_query(self, codes_str: str):
+        """
+        Mã của từng dòng (CASE có truy vấn con STRING_SPLIT) được tính trong bảng dẫn xuất,
+        GROUP BY theo cột bí danh: SQL Server không cho truy vấn con trong GROUP BY (Msg 144)
+        """
+        code_set = CodeSet(codes_str)
+        params = dict(code_set.params)
+
+        columns = [f"{self._key_expression(code_set)} AS [PROBE_KEY]"]
+        aggregates = ["COUNT(*) AS [PROBE_ROWS]"]
+        conditions = [f"({code_set.match(self.key_columns)})"] + self.filters
+        if self.date_column:
+            columns.append(f"{self.date_column} AS [PROBE_DATE]")
+            aggregates.append("MAX(probe.[PROBE_DATE]) AS [PROBE_LATEST]")
+        if self.date_column and self.windows:
+            conditions.append(f"{self.date_column} >= :probe_since")
+            params["probe_since"] = self.windows()[-1]
+        for idx, col in enumerate(self.sums):
+            columns.append(f"{self.schema.column(col)} AS [PROBE_VALUE_{idx}]")
+            aggregates.append(f"SUM(probe.[PROBE_VALUE_{idx}]) AS [PROBE_SUM_{idx}]")
+
+        where = "\n                    AND ".join(conditions)
+        query = f'''
+            SELECT probe.[PROBE_KEY], {", ".join(aggregates)}
+            FROM (
+                SELECT {", ".join(columns)}
+                FROM {self.schema.view}
+                WHERE {where}
+            ) probe
+            GROUP BY probe.[PROBE_KEY]
+        '''
+        return query, params
+
+    def watermarks(self, codes_str: str, sql_query: ConnectSQLServer = None) -> Dict[str, str]:
+        """{mã: watermark}, mã không có dòng nào trong nguồn có watermark "0" """
+        sql_query = sql_query or ConnectSQLServer()
+        self.schema.resolve(sql_query)
+        query, params = self.build_query(codes_str)
+        data = sql_query.getData(query, params)
+        version = self.version()
+
+        result = {code.upper(): f"0|{version}" for code in parse_codes(codes_str)}
+        for row in data.itertuples(index=False):
+            row = row._asdict()
+            values = [str(row["PROBE_ROWS"])]
+            if "PROBE_LATEST" in row:
+                values.append(str(row["PROBE_LATEST"]))
+            values += [f"{float(row[f'PROBE_SUM_{idx}'] or 0):.6f}" for idx in range(len(self.sums))]
+            result[str(row["PROBE_KEY"]).strip().upper()] = "|".join(values + [version])
+        return result
+
+def _year_windows() -> List[str]:
+    year = datetime.today().year
+    return [str(year - 1), str(year - 3)]
+
+# Bảng Supabase có probe nguồn (trùng tên view trong view_schema)
+PROBED_VIEWS = ["fabric_trans", "submat_trans", "submat_demand", "process_wip", "go_quantity"]
+
+_source_probes = None
+_source_probes_lock = threading.Lock()
+
+def get_source_probes(sql_query: ConnectSQLServer = None) -> Dict[str, SourceProbe]:
+    """
+    Probe theo bảng Supabase, tạo ở lần dùng đầu tiên thay vì lúc import module.
+    Có sql_query thì đối chiếu cột các view trước để probe dùng đúng tên cột thực tế
+    """
+    global _source_probes
+    with _source_probes_lock:
+        if _source_probes is not None:
+            return _source_probes
+        if sql_query is None:
+            return _build_source_probes()
+        for name in PROBED_VIEWS:
+            get_view_schema(name, sql_query)
+        _source_probes = _build_source_probes()
+        return _source_probes
+
+def _build_source_probes() -> Dict[str, SourceProbe]:
+    """Probe khớp với truy vấn của FabricTrans/SubmatTrans/DemandSM/JoProcessWip"""
+    fabric_trans = get_view_schema("fabric_trans")
+    submat_trans = get_view_schema("submat_trans")
+    submat_demand = get_view_schema("submat_demand")
+    process_wip = get_view_schema("process_wip")
+    go_quantity = get_view_schema("go_quantity")
+
+    return {
+        "fabric_trans": SourceProbe(
+            "fabric_trans",
+            key_columns=[fabric_trans.column("SC_NO"), fabric_trans.column("JO_NO")],
+            date_column=fabric_trans.column("TRANS_DATE"),
+            windows=lambda: month_windows(step_months=6, steps=3),
+            sums=["QTY"],
+            references=["fabric_list"]
+        ),
+        "submat_trans": SourceProbe(
+            "submat_trans",
+            key_columns=[submat_trans.column("SC_NO"), submat_trans.column("JO_NO")],
+            date_column=submat_trans.column("TRANS_DATE"),
+            windows=lambda: month_windows(step_months=6, steps=3),
+            sums=["QTY"],
+            references=["trims_list"]
+        ),
+        "submat_demand": SourceProbe(
+            "submat_demand",
+            key_columns=[f"LEFT({submat_demand.column('JO_NO')}, 8)", submat_demand.column("JO_NO")],
+            date_column=submat_demand.column("Create_Date"),
+            windows=lambda: month_windows(step_months=12, steps=3),
+            sums=["Required_Qty", "Allocated_Qty", "Issued_Qty", "Demand_Qty"],
+            filters=[f"{submat_demand.column('Required_Qty')} > 0"]
+        ),
+        # View WIP không có cột ngày: dùng số dòng và tổng số lượng
+        "process_wip": SourceProbe(
+            "process_wip",
+            key_columns=[f"LEFT({process_wip.column('JO_NO')}, 8)", process_wip.column("JO_NO")],
+            sums=["In_Qty", "Output_Qty", "Pull_In_Qty", "Discrepancy_Qty", "Wip"]
+        ),
+        "go_quantity": SourceProbe(
+            "go_quantity",
+            key_columns=[go_quantity.column("GO_No")],
+            date_column=go_quantity.column("Year"),
+            windows=_year_windows,
+            sums=["Order_QTY"],
+            filters=["[Factory Code] = 'EHV'", f"{go_quantity.column('Order_QTY')} > 0"]
+        ),
+    }
+
+class FreshnessRegistry:
+    """
+    Ghi nhận theo (bảng, mã) watermark của nguồn SQL Server tại lần cập nhật thành công gần nhất.
+    refresh() chạy probe trước và chỉ cập nhật các mã có nguồn đã đổi
+    (hoặc đã quá max_age kể từ lần cập nhật trước).
+    Đồng thời lưu mốc (TRANS_DATE, TRANS_CD) đã đồng bộ của từng mã cho đồng bộ tăng dần
+    """
+    def __init__(self, path: str = FRESHNESS_PATH, max_age: int = FRESHNESS_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS "freshness" (
+                    "table_name" TEXT NOT NULL,
+                    "code" TEXT NOT NULL,
+                    "watermark" TEXT NOT NULL,
+                    "synced_at" REAL NOT NULL,
+                    PRIMARY KEY ("table_name", "code")
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS "high_water_marks" (
+                    "table_name" TEXT NOT NULL,
+                    "code" TEXT NOT NULL,
+                    "trans_date" TEXT NOT NULL,
+                    "trans_cd" TEXT NOT NULL,
+                    "full_at" REAL NOT NULL,
+                    "updated_at" REAL NOT NULL,
+                    "reference" TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY ("table_name", "code")
+                )
+            ''')
+            # File tạo trước khi có cột reference: mốc cũ không khớp phiên bản nào nên sẽ lấy lại toàn bộ
+            columns = [row[1] for row in conn.execute('PRAGMA table_info("high_water_marks")')]
+            if "reference" not in columns:
+                conn.execute('ALTER TABLE "high_water_marks" ADD COLUMN "reference" TEXT NOT NULL DEFAULT \'\'')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, table_name: str, codes: List[str]) -> Dict[str, tuple]:
+        """{mã: (watermark, synced_at)} của các mã đã từng cập nhật"""
+        if not codes:
+            return {}
+        placeholders = ", ".join("?" for _ in codes)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT "code", "watermark", "synced_at" FROM "freshness" WHERE "table_name" = ? AND "code" IN ({placeholders})',
+                [table_name] + list(codes)
+            ).fetchall()
+        return {code: (watermark, synced_at) for code, watermark, synced_at in rows}
+
+    def record(self, table_name: str, watermarks: Dict[str, str]):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO "freshness" ("table_name", "code", "watermark", "synced_at") VALUES (?, ?, ?, ?)',
+                [(table_name, code, watermark, now) for code, watermark in watermarks.items()]
+            )
+
+    def invalidate(self, table_name: str, codes: List[str] = None):
+        """Buộc lần refresh sau cập nhật lại (cả bảng hoặc một số mã)"""
+        with self._lock, self._connect() as conn:
+            if codes is None:
+                conn.execute('DELETE FROM "freshness" WHERE "table_name" = ?', (table_name,))
+            else:
+                conn.executemany('DELETE FROM "freshness" WHERE "table_name" = ? AND "code" = ?',
+                                 [(table_name, code.upper()) for code in codes])
+
+    def get_marks(self, table_name: str, codes: List[str], reference: str = None) -> Dict[str, Tuple[str, str]]:
+        """
+        {mã: (TRANS_DATE, TRANS_CD)} của các mã đồng bộ tăng dần được. Bị bỏ ra để lấy lại toàn bộ:
+        mã có lần lấy toàn bộ gần nhất quá TRANS_FULL_REBUILD_INTERVAL và mã được lấy toàn bộ với
+        phiên bản bảng tham chiếu khác reference (dòng cũ đã ghép với MasterList cũ)
+        """
+        if not codes or reference is None:
+            return {}
+        placeholders = ", ".join("?" for _ in codes)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT "code", "trans_date", "trans_cd", "full_at", "reference" FROM "high_water_marks" '
+                f'WHERE "table_name" = ? AND "code" IN ({placeholders})',
+                [table_name] + [code.upper() for code in codes]
+            ).fetchall()
+        now = time.time()
+        return {
+            code: (trans_date, trans_cd) for code, trans_date, trans_cd, full_at, mark_reference in rows
+            if now - full_at < TRANS_FULL_REBUILD_INTERVAL and mark_reference == reference
+        }
+
+    def save_marks(self, table_name: str, marks: Dict[str, Tuple[str, str]], full: bool = False, reference: str = None):
+        """Lưu mốc mới; full=True khi mốc đến từ lần lấy lại toàn bộ với bảng tham chiếu phiên bản reference"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            if full:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO "high_water_marks" '
+                    '("table_name", "code", "trans_date", "trans_cd", "full_at", "updated_at", "reference") '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(table_name, code, date, cd, now, now, reference or "") for code, (date, cd) in marks.items()]
+                )
+            else:
+                conn.executemany(
+                    'UPDATE "high_water_marks" SET "trans_date" = ?, "trans_cd" = ?, "updated_at" = ? '
+                    'WHERE "table_name" = ? AND "code" = ?',
+                    [(date, cd, now, table_name, code) for code, (date, cd) in marks.items()]
+                )
+
+    def clear_marks(self, table_name: str, codes: List[str]):
+        with self._lock, self._connect() as conn:
+            conn.executemany('DELETE FROM "high_water_marks" WHERE "table_name" = ? AND "code" = ?',
+                             [(table_name, code.upper()) for code in codes])
+
+    def stale_codes(self, table_name: str, watermarks: Dict[str, str]) -> List[str]:
+        """Các mã có watermark khác lần cập nhật trước hoặc đã quá max_age"""
+        known = self.get(table_name, list(watermarks))
+        now = time.time()
+        return [
+            code for code, watermark in watermarks.items()
+            if code not in known or known[code][0] != watermark or now - known[code][1] >= self.max_age
+        ]
+
+    def refresh(self, table_name: str, codes_str: str, run: Callable[[str], Any], force: bool = False) -> dict:
+        """
+        Chạy run(codes_str) chỉ với các mã có nguồn đã đổi, ghi nhận watermark khi run trả về True.
+        Watermark lấy TRƯỚC khi chạy: dòng mới phát sinh trong lúc chạy sẽ được bắt ở lần sau.
+        Trả về {"refreshed": [...], "skipped": [...], "result": kết quả run hoặc None}
+        """
+        codes = [code.upper() for code in parse_codes(codes_str)]
+        watermarks = None
+        if FRESHNESS_PROBE and table_name in PROBED_VIEWS and codes:
+            try:
+                sql_query = ConnectSQLServer()
+                watermarks = get_source_probes(sql_query)[table_name].watermarks(codes_str, sql_query)
+            except Exception:
+                # Probe lỗi: cập nhật toàn bộ như trước
+                print(traceback.format_exc())
+                print(f"❌ Probe nguồn {table_name} lỗi, cập nhật lại toàn bộ {len(codes)} mã")
+
+        if watermarks is None or force:
+            stale = codes
+        else:
+            stale = self.stale_codes(table_name, watermarks)
+
+        skipped = [code for code in codes if code not in stale]
+        if not stale:
+            print(f"♻️ {table_name}: nguồn chưa đổi cho {len(codes)} mã, bỏ qua cập nhật")
+            return {"refreshed": [], "skipped": skipped, "result": True}
+        if skipped:
+            print(f"♻️ {table_name}: bỏ qua {len(skipped)} mã nguồn chưa đổi, cập nhật {len(stale)} mã")
+
+        result = run(",".join(f"'{code}'" for code in stale))
+        if result is True and watermarks is not None:
+            self.record(table_name, {code: watermarks[code] for code in stale if code in watermarks})
+        return {"refreshed": stale, "skipped": skipped, "result": result}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_freshness_registry() -> FreshnessRegistry:
+    """Sổ theo dõi dùng chung cho cả process"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FreshnessRegistry()
+        return _registry
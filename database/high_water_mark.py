@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from database.query_builder import CodeSet
+
+# Cột phụ chứa mã đã khớp của từng dòng (bị loại bỏ sau khi đọc)
+SYNC_KEY = "SYNC_KEY"
+
+def overlap_windows(marks: Dict[str, Tuple[str, str]], overlap_days: int) -> Dict[str, str]:
+    """{mã: (TRANS_DATE, TRANS_CD)} -> {mã: đầu cửa sổ đọc lại "%Y-%m-%d 00:00:00"}"""
+    windows = {}
+    for code, (date, _) in marks.items():
+        since = datetime.strptime(date[:10], "%Y-%m-%d") - timedelta(days=overlap_days)
+        windows[code] = since.strftime("%Y-%m-%d %H:%M:%S")
+    return windows
+
+class HighWaterMarkPlanner:
+    """
+    Lấy lại các giao dịch trong cửa sổ chồng lấn của từng mã trong một lần truy vấn: cửa sổ bắt đầu từ
+    ngày của mốc (TRANS_DATE, TRANS_CD) lùi overlap_days ngày (overlap_windows), để không sót giao dịch cùng ngày có
+    TRANS_CD nhỏ hơn, nhập lùi ngày hoặc bị sửa gần đây (ghi lại bằng upsert theo khóa nên không trùng).
+    SQL Server lọc từ cửa sổ sớm nhất trong các mã, từng mã được lọc chính xác theo cửa sổ riêng ở pandas
+    """
+    def __init__(self, view: str, date_column: str, key_columns: List[str]):
+        self.view = view
+        self.date_column = date_column
+        self.key_columns = key_columns
+
+    def _key_expression(self, code_set: CodeSet) -> str:
+        if len(self.key_columns) == 1:
+            return self.key_columns[0]
+        cases = " ".join(f"WHEN {col} IN {code_set.sql} THEN {col}" for col in self.key_columns[:-1])
+        return f"CASE {cases} ELSE {self.key_columns[-1]} END"
+
+    def build_query(self, windows: Dict[str, str], columns: str = "*") -> Tuple[str, dict]:
+        """windows: {mã: đầu cửa sổ} -> (câu truy vấn có tham số, giá trị tham số)"""
+        code_set = CodeSet(",".join(windows))
+        query = f'''
+            SELECT {columns}, {self._key_expression(code_set)} AS [{SYNC_KEY}]
+            FROM {self.view}
+            WHERE ({code_set.match(self.key_columns)})
+                AND {self.date_column} >= :since
+        '''
+        params = dict(code_set.params)
+        params["since"] = min(windows.values())
+        return query, params
+
+    @staticmethod
+    def in_window(data: pd.DataFrame, windows: Dict[str, str]) -> pd.DataFrame:
+        """Chỉ giữ các dòng nằm trong cửa sổ của mã tương ứng"""
+        if data.empty:
+            return data
+        keys = data[SYNC_KEY].astype(str).str.strip().str.upper()
+        dates = data["TRANS_DATE"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        return data[dates >= keys.map(windows)]
+
+    @staticmethod
+    def marks_of(data: pd.DataFrame, key_column: str) -> Dict[str, Tuple[str, str]]:
+        """Mốc (TRANS_DATE, TRANS_CD) lớn nhất theo mã của một chunk"""
+        if data.empty:
+            return {}
+        frame = pd.DataFrame({
+            "code": data[key_column].astype(str).str.strip().str.upper(),
+            "date": data["TRANS_DATE"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+            "cd": data["TRANS_CD"].fillna("").astype(str),
+        }).dropna(subset=["date"])
+        latest = frame.sort_values(["date", "cd"]).groupby("code").tail(1)
+        return {row.code: (row.date, row.cd) for row in latest.itertuples(index=False)}
+
+    @staticmethod
+    def merge_marks(marks: Dict[str, Tuple[str, str]], other: Dict[str, Tuple[str, str]]):
+        """Gộp mốc của chunk mới vào marks (giữ mốc lớn hơn)"""
+        for code, mark in other.items():
+            if code not in marks or mark > marks[code]:
+                marks[code] = mark
+
+    @staticmethod
+    def strip(data: pd.DataFrame) -> pd.DataFrame:
+        return data.drop(columns=[SYNC_KEY], errors="ignore")
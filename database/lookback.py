@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import List, Tuple
+
+import pandas as pd
+
+from database.query_builder import CodeSet
+
+# Các cột phụ do planner thêm vào kết quả (bị loại bỏ sau khi đọc)
+LOOKBACK_COLUMNS = ["LOOKBACK_KEY", "LOOKBACK_DATE", "LOOKBACK_LATEST"]
+
+def month_windows(step_months: int, steps: int = 3, today: datetime = None) -> List[str]:
+    """
+    Danh sách mốc thời gian lùi dần từ đầu tháng hiện tại,
+    mỗi mốc lùi thêm step_months tháng (mốc mới nhất đứng đầu)
+    """
+    current = (today or datetime.today()).replace(day=1)
+    windows = []
+    for _ in range(steps):
+        month = current.month - step_months
+        year = current.year
+        while month <= 0:
+            month += 12
+            year -= 1
+        current = datetime(year, month, 1)
+        windows.append(current.strftime("%Y-%m-%d"))
+    return windows
+
+class LookbackPlanner:
+    """
+    Chọn cửa sổ thời gian cho từng mã chỉ trong một lần truy vấn:
+    mỗi mã lấy mốc mới nhất mà mã đó còn có dữ liệu (MAX(date) theo mã),
+    thay cho vòng lặp chạy lại cả view mỗi lần lùi thêm 6/12 tháng
+    """
+    def __init__(self, view: str, date_column: str, key_columns: List[str], windows: List[str], filters: List[str] = None):
+        self.view = view
+        self.date_column = date_column
+        self.key_columns = key_columns
+        self.windows = windows
+        self.filters = filters or []
+
+    def _key_expression(self, code_set: CodeSet) -> str:
+        """Mã đã khớp của từng dòng (ưu tiên theo thứ tự key_columns)"""
+        if len(self.key_columns) == 1:
+            return self.key_columns[0]
+        cases = " ".join(
+            f"WHEN {col} IN {code_set.sql} THEN {col}" for col in self.key_columns[:-1]
+        )
+        return f"CASE {cases} ELSE {self.key_columns[-1]} END"
+
+    def _window_expression(self) -> str:
+        """Mốc thời gian của từng mã dựa trên ngày mới nhất của mã đó"""
+        cases = " ".join(
+            f"WHEN src.[LOOKBACK_LATEST] >= :lookback_{idx} THEN :lookback_{idx}" for idx in range(len(self.windows) - 1)
+        )
+        return f"CASE {cases} ELSE :lookback_{len(self.windows) - 1} END"
+
+    def build_query(self, codes_str: str, columns: str = "*") -> Tuple[str, dict]:
+        """Trả về (câu truy vấn có tham số, giá trị tham số)"""
+        code_set = CodeSet(codes_str)
+        key_expr = self._key_expression(code_set)
+        oldest = f":lookback_{len(self.windows) - 1}"
+        conditions = [f"({code_set.match(self.key_columns)})", f"{self.date_column} >= {oldest}"] + self.filters
+        where = "\n                    AND ".join(conditions)
+
+        # Mã của từng dòng (CASE có truy vấn con STRING_SPLIT) tính trong bảng dẫn xuất keyed,
+        # PARTITION BY theo cột bí danh: SQL Server không cho truy vấn con trong PARTITION BY
+        query = f'''
+            SELECT * FROM (
+                SELECT keyed.*,
+                    MAX(keyed.[LOOKBACK_DATE]) OVER (PARTITION BY keyed.[LOOKBACK_KEY]) AS [LOOKBACK_LATEST]
+                FROM (
+                    SELECT {columns},
+                        {key_expr} AS [LOOKBACK_KEY],
+                        {self.date_column} AS [LOOKBACK_DATE]
+                    FROM {self.view}
+                    WHERE {where}
+                ) keyed
+            ) src
+            WHERE src.[LOOKBACK_DATE] >= {self._window_expression()}
+        '''
+        params = dict(code_set.params)
+        params.update({f"lookback_{idx}": window for idx, window in enumerate(self.windows)})
+        return query, params
+
+    @staticmethod
+    def strip(data: pd.DataFrame) -> pd.DataFrame:
+        """Bỏ các cột phụ của planner"""
+        return data.drop(columns=[col for col in LOOKBACK_COLUMNS if col in data.columns])
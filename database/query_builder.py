@@ -0,0 +1,38 @@
+from typing import List
+
+# Độ dài tối đa của một mã GO/JO khi so sánh với cột VARCHAR của view
+CODE_MAX_LENGTH = 50
+
+def parse_codes(codes_str: str) -> List[str]:
+    """Tách chuỗi "'S24M1','24M2AB01'" thành danh sách mã (bỏ trùng, giữ thứ tự)"""
+    codes = []
+    for code in codes_str.split(","):
+        code = code.strip().strip("'").strip()
+        if code and code not in codes:
+            codes.append(code)
+    return codes
+
+class CodeSet:
+    """
+    Bind cả danh sách mã thành MỘT tham số và tách ở phía SQL Server (STRING_SPLIT),
+    nên câu lệnh không đổi giữa các lần gọi (tái sử dụng plan) và không bị
+    giới hạn 2100 tham số khi truyền hàng nghìn mã
+    """
+    def __init__(self, codes_str: str, name: str = "codes"):
+        self.codes = parse_codes(codes_str)
+        self.name = name
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def sql(self) -> str:
+        return f"(SELECT CAST([value] AS VARCHAR({CODE_MAX_LENGTH})) FROM STRING_SPLIT(:{self.name}, ','))"
+
+    @property
+    def params(self) -> dict:
+        return {self.name: ",".join(self.codes)}
+
+    def match(self, columns: List[str]) -> str:
+        """Điều kiện một trong các cột thuộc danh sách mã"""
+        return " OR ".join(f"{col} IN {self.sql}" for col in columns)
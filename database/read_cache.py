@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from settings.config import SUPABASE_CACHE_TTL, SUPABASE_CACHE_MAX_ENTRIES
+
+# Thời gian sống (giây) của cache theo bảng; bảng không có trong đây không được cache
+CACHE_TTL = {
+    "fabric_list": SUPABASE_CACHE_TTL,
+    "trims_list": SUPABASE_CACHE_TTL,
+    "range_dm": SUPABASE_CACHE_TTL,
+}
+
+class ReadCache:
+    """
+    Cache đọc dùng chung cho cả process: hết hạn theo TTL của từng bảng,
+    giới hạn số entry (LRU) và bị xóa khi bảng được ghi
+    """
+    def __init__(self, ttl: dict, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Số lần ghi của từng bảng trong process (tăng mỗi lần invalidate)
+        self._generations = {}
+
+    def cacheable(self, table_name: str) -> bool:
+        return table_name in self.ttl
+
+    def get(self, key):
+        """DataFrame đã cache (bản copy) hoặc None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1].copy()
+
+    def put(self, key, data: pd.DataFrame, generation: int):
+        """
+        Cache kết quả đọc. generation là generation(bảng) lấy TRƯỚC khi đọc:
+        bảng bị ghi trong lúc đọc thì kết quả có thể là dữ liệu cũ nên không cache
+        """
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl[key[0]], data.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, table_name: str) -> int:
+        """Số lần bảng đã bị ghi từ khi process khởi động"""
+        return self._generations.get(table_name, 0)
+
+    def invalidate(self, table_name: str):
+        """Xóa mọi entry của bảng (gọi sau mỗi lần ghi)"""
+        with self._lock:
+            self._generations[table_name] = self._generations.get(table_name, 0) + 1
+        if not self.cacheable(table_name):
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == table_name]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+read_cache = ReadCache(CACHE_TTL, SUPABASE_CACHE_MAX_ENTRIES)
+
+def get_cache_stats() -> dict:
+    return read_cache.stats()
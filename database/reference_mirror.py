@@ -0,0 +1,254 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+import pandas as pd
+
+from settings.config import REFERENCE_MIRROR_PATH, REFERENCE_MIRROR_SYNC_INTERVAL, REFERENCE_MIRROR_FULL_RELOAD_INTERVAL
+from database.connect_supabase import SupabaseFunctions
+from database.read_cache import read_cache
+
+# Bảng được sao lưu cục bộ và các cột được đánh index để tra cứu
+MIRROR_TABLES = {
+    "fabric_list": ["PO_Item", "PO_NO"],
+    "trims_list": ["THV_CODE"],
+    "range_dm": ["CODE"],
+    "list_go": ["SC_NO"],
+    "go_quantity": ["GO_No"],
+}
+
+# Số giá trị tối đa trong một câu IN (giới hạn tham số của SQLite)
+LOOKUP_BATCH = 500
+
+class ReferenceMirror:
+    """
+    Bản sao SQLite cục bộ của các bảng tham chiếu trên Supabase.
+    Đồng bộ tăng dần theo "id" lớn nhất đã có (watermark). Tải lại toàn bộ khi checksum phía Supabase
+    của các dòng đã sao (id <= watermark) đổi (dòng bị sửa tại chỗ/xóa, kể cả từ process khác),
+    khi bảng được ghi từ ứng dụng và định kỳ sau full_reload_interval
+    """
+    def __init__(self, path: str = REFERENCE_MIRROR_PATH, sync_interval: int = REFERENCE_MIRROR_SYNC_INTERVAL,
+                 full_reload_interval: int = REFERENCE_MIRROR_FULL_RELOAD_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.full_reload_interval = full_reload_interval
+        self.supabase = SupabaseFunctions()
+        self._lock = threading.Lock()
+        # Số lần ghi (read_cache.generation) của bảng tại lần đồng bộ gần nhất
+        self._generations = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS "_mirror_meta" (
+                    "table_name" TEXT PRIMARY KEY,
+                    "max_id" INTEGER,
+                    "synced_at" REAL
+                )
+            ''')
+            # File tạo trước khi có checksum: thiếu cột thì thêm vào (NULL => lần sau tải lại toàn bộ)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info("_mirror_meta")')]
+            for column, col_type in [("full_at", "REAL"), ("remote_checksum", "TEXT"), ("checksum", "TEXT")]:
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE "_mirror_meta" ADD COLUMN "{column}" {col_type}')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _meta(self, conn, table_name):
+        row = conn.execute('SELECT "max_id", "synced_at" FROM "_mirror_meta" WHERE "table_name" = ?', (table_name,)).fetchone()
+        return row if row else (None, None)
+
+    def _checksums(self, conn, table_name):
+        """(thời điểm tải toàn bộ, checksum Supabase của các dòng id <= max_id, checksum bản sao cục bộ)"""
+        row = conn.execute('SELECT "full_at", "remote_checksum", "checksum" FROM "_mirror_meta" WHERE "table_name" = ?',
+                           (table_name,)).fetchone()
+        return row if row else (None, None, None)
+
+    def _local_checksum(self, conn, table_name) -> str:
+        """md5 toàn bộ nội dung bản sao theo thứ tự id: đổi khi bất kỳ dòng nào đổi"""
+        if not self._has_table(conn, table_name):
+            return ""
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+        order = ' ORDER BY "id"' if "id" in columns else ""
+        digest = hashlib.md5()
+        for row in conn.execute(f'SELECT * FROM "{table_name}"{order}'):
+            digest.update(repr(row).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _save_meta(self, conn, table_name, max_id, remote_checksum, full: bool = False, changed: bool = True):
+        full_at, _, checksum = self._checksums(conn, table_name)
+        if full or full_at is None:
+            full_at = time.time()
+        if changed or checksum is None:
+            checksum = self._local_checksum(conn, table_name)
+        conn.execute(
+            'INSERT OR REPLACE INTO "_mirror_meta" ("table_name", "max_id", "synced_at", "full_at", "remote_checksum", "checksum") '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (table_name, max_id, time.time(), full_at, remote_checksum, checksum)
+        )
+
+    def _has_table(self, conn, table_name) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is not None
+
+    def is_stale(self, table_name: str) -> bool:
+        """Bảng đã được ghi qua SupabaseFunctions (có thể sửa tại chỗ) kể từ lần đồng bộ trước"""
+        return read_cache.generation(table_name) != self._generations.get(table_name, 0)
+
+    def _full_reload(self, conn, table_name):
+        # Checksum lấy TRƯỚC khi đọc: dòng bị sửa trong lúc đọc làm checksum lệch và được tải lại ở lần sau
+        remote_checksum = self.supabase.checksum_rows(table_name)
+        data = self.supabase.get_data_paged(table_name, "*")
+        if data.empty and self.supabase.count_rows(table_name) != 0:
+            # Lỗi đọc: giữ nguyên bản sao cũ
+            raise RuntimeError(f"Không tải được {table_name} từ Supabase")
+
+        if data.columns.empty:
+            # Bảng trên Supabase rỗng: không có cột để tạo bảng, chỉ xóa dòng của bản sao cũ (giữ cấu trúc)
+            if self._has_table(conn, table_name):
+                conn.execute(f'DELETE FROM "{table_name}"')
+        else:
+            data.to_sql(table_name, conn, if_exists="replace", index=False)
+            for column in MIRROR_TABLES[table_name]:
+                if column in data.columns:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{column}" ON "{table_name}" ("{column}")')
+        max_id = int(data["id"].max()) if "id" in data.columns and not data.empty else 0
+        self._save_meta(conn, table_name, max_id, remote_checksum, full=True)
+        print(f"📥 Mirror {table_name}: tải lại {len(data)} dòng")
+
+    def _incremental(self, conn, table_name, max_id):
+        full_at, remote_checksum, _ = self._checksums(conn, table_name)
+        if full_at is None or time.time() - full_at >= self.full_reload_interval:
+            return self._full_reload(conn, table_name)
+
+        # Dòng đã sao (id <= max_id) bị sửa tại chỗ hoặc xóa phía Supabase: thêm dòng theo id không bắt được
+        range_checksum = self.supabase.checksum_rows(table_name, f' "id" <= {max_id} ')
+        if range_checksum is not None and remote_checksum is not None and range_checksum != remote_checksum:
+            print(f"♻️ Mirror {table_name}: có dòng bị sửa/xóa phía Supabase, tải lại toàn bộ")
+            return self._full_reload(conn, table_name)
+
+        new_rows = self.supabase.get_data_paged(table_name, "*", f' "id" > {max_id} ')
+        changed = not new_rows.empty
+        if not new_rows.empty:
+            try:
+                new_rows.to_sql(table_name, conn, if_exists="append", index=False)
+            except sqlite3.OperationalError:
+                # Bảng trên Supabase đổi cột: tải lại toàn bộ
+                return self._full_reload(conn, table_name)
+            max_id = int(new_rows["id"].max())
+            range_checksum = self.supabase.checksum_rows(table_name, f' "id" <= {max_id} ')
+
+        # Không so được checksum: số dòng lệch => có dòng bị xóa phía Supabase, đối chiếu theo id
+        remote_count = self.supabase.count_rows(table_name) if range_checksum is None else None
+        local_count = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        if remote_count is not None and remote_count != local_count:
+            changed = True
+            remote_ids = self.supabase.get_data_paged(table_name, ' "id" ')
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS "_remote_ids" ("id" INTEGER PRIMARY KEY)')
+            conn.execute('DELETE FROM "_remote_ids"')
+            if not remote_ids.empty:
+                conn.executemany('INSERT OR IGNORE INTO "_remote_ids" VALUES (?)', [(int(i),) for i in remote_ids["id"]])
+            conn.execute(f'DELETE FROM "{table_name}" WHERE "id" NOT IN (SELECT "id" FROM "_remote_ids")')
+
+        self._save_meta(conn, table_name, max_id, range_checksum, changed=changed)
+        if not new_rows.empty:
+            print(f"📥 Mirror {table_name}: thêm {len(new_rows)} dòng")
+
+    def sync(self, table_name: str, force: bool = False):
+        """Đồng bộ bảng nếu đã quá sync_interval, bị đánh dấu stale hoặc force"""
+        with self._lock, self._connect() as conn:
+            max_id, synced_at = self._meta(conn, table_name)
+            stale = self.is_stale(table_name)
+            if not force and not stale and synced_at and time.time() - synced_at < self.sync_interval:
+                return
+            generation = read_cache.generation(table_name)
+            if stale or max_id is None or not self._has_table(conn, table_name):
+                self._full_reload(conn, table_name)
+            else:
+                self._incremental(conn, table_name, max_id)
+            self._generations[table_name] = generation
+
+    def _read(self, table_name: str, query: str, params=()):
+        try:
+            self.sync(table_name)
+        except Exception:
+            print(traceback.format_exc())
+        with self._connect() as conn:
+            if not self._has_table(conn, table_name):
+                return None
+            data = pd.read_sql(query, conn, params=params)
+            # Giữ kiểu số như khi đọc từ Supabase (kể cả khi kết quả rỗng hoặc toàn NULL)
+            for _, column, col_type, *_ in conn.execute(f'PRAGMA table_info("{table_name}")'):
+                if column in data.columns and col_type == "REAL":
+                    data[column] = pd.to_numeric(data[column], errors="coerce").astype("float64")
+                elif column in data.columns and col_type == "INTEGER":
+                    data[column] = pd.to_numeric(data[column], errors="coerce")
+            return data
+
+    def get_table(self, table_name: str) -> pd.DataFrame:
+        """Toàn bộ bảng từ bản sao cục bộ (đọc Supabase nếu chưa có bản sao)"""
+        data = self._read(table_name, f'SELECT * FROM "{table_name}"')
+        if data is None:
+            return self.supabase.get_data(table_name, "*")
+        return data
+
+    def lookup(self, table_name: str, column: str, values) -> pd.DataFrame:
+        """Các dòng có column thuộc values, tra theo index cục bộ"""
+        values = [value for value in pd.unique(pd.Series(list(values)).dropna())]
+        if not values:
+            data = self._read(table_name, f'SELECT * FROM "{table_name}" WHERE 0')
+            if data is not None:
+                return data
+            return self.supabase.get_data(table_name, "*").iloc[0:0]
+
+        parts = []
+        for start in range(0, len(values), LOOKUP_BATCH):
+            batch = values[start:start + LOOKUP_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            data = self._read(table_name, f'SELECT * FROM "{table_name}" WHERE "{column}" IN ({placeholders})', batch)
+            if data is None:
+                full = self.supabase.get_data(table_name, "*")
+                return full[full[column].isin(values)] if not full.empty else full
+            parts.append(data)
+        return pd.concat(parts, ignore_index=True)
+
+    def version(self, table_name: str):
+        """
+        Phiên bản nội dung của bảng tham chiếu ("id lớn nhất:số dòng:checksum bản sao"), None nếu chưa có bản sao.
+        Đổi khi bản sao đổi, kể cả dòng bị sửa tại chỗ từ process khác
+        """
+        try:
+            self.sync(table_name)
+        except Exception:
+            print(traceback.format_exc())
+        with self._connect() as conn:
+            max_id, _ = self._meta(conn, table_name)
+            if max_id is None or not self._has_table(conn, table_name):
+                return None
+            count = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+            _, _, checksum = self._checksums(conn, table_name)
+        return f"{max_id}:{count}:{(checksum or '')[:12]}"
+
+    def count(self, table_name: str) -> int:
+        data = self._read(table_name, f'SELECT COUNT(*) AS "n" FROM "{table_name}"')
+        return int(data["n"].iloc[0]) if data is not None else 0
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_reference_mirror() -> ReferenceMirror:
+    """Bản sao dùng chung cho cả process"""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = ReferenceMirror()
+        return _mirror
@@ -0,0 +1,192 @@
+import asyncio
+import random
+import threading
+import time
+
+from settings.config import (
+    DATA_RETRIES, DATA_RETRY_BASE_DELAY, DATA_RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+
+class DataSourceError(Exception):
+    """
+    Lỗi khi đọc/ghi nguồn dữ liệu (SQL Server, Supabase).
+    Khác với kết quả rỗng: caller không được coi lỗi là "không có dữ liệu"
+    """
+    def __init__(self, source: str, message: str, cause: Exception = None):
+        super().__init__(f"{source}: {message}")
+        self.source = source
+        self.cause = cause
+
+class CircuitOpenError(DataSourceError):
+    """Nguồn dữ liệu đang lỗi liên tục, từ chối ngay thay vì chờ timeout"""
+
+# Tên lớp lỗi mạng/timeout của pyodbc, SQLAlchemy, httpx, requests
+TRANSIENT_ERRORS = {
+    "OperationalError", "InterfaceError", "TimeoutError", "ConnectionError",
+    "TimeoutException", "TransportError", "ConnectError", "ConnectTimeout",
+    "ReadTimeout", "WriteTimeout", "PoolTimeout", "ReadError", "WriteError",
+    "RemoteProtocolError", "ProtocolError",
+}
+
+# SQLSTATE tạm thời: mất kết nối, timeout (ODBC/SQL Server), hủy do timeout, deadlock (Postgres)
+TRANSIENT_SQLSTATES = ("08S01", "08001", "08003", "08006", "HYT00", "HYT01", "40001", "40P01", "57014")
+
+def is_transient(exc: Exception) -> bool:
+    """Lỗi tạm thời (mạng, timeout, 5xx, deadlock) có thể thử lại"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if getattr(exc, "connection_invalidated", False):
+        return True
+    if any(cls.__name__ in TRANSIENT_ERRORS for cls in type(exc).__mro__):
+        return True
+
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code
+    if status is not None and (status >= 500 or status == 429):
+        return True
+
+    message = str(exc)
+    return any(state in message for state in TRANSIENT_SQLSTATES) or "timed out" in message.lower()
+
+# Lỗi xảy ra trước khi request tới server (chưa mở được kết nối): gửi lại không thể ghi trùng
+UNSENT_ERRORS = {"ConnectError", "ConnectTimeout", "PoolTimeout"}
+
+def is_unsent(exc: Exception) -> bool:
+    """Request chắc chắn chưa được server xử lý (không mở được kết nối hoặc bị giới hạn tần suất 429)"""
+    if any(cls.__name__ in UNSENT_ERRORS for cls in type(exc).__mro__):
+        return True
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+def backoff_delay(attempt: int, base: float = DATA_RETRY_BASE_DELAY, maximum: float = DATA_RETRY_MAX_DELAY) -> float:
+    """Exponential backoff có jitter (full jitter) để các client không thử lại cùng lúc"""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Sau failure_threshold lỗi tạm thời liên tiếp, mở mạch trong reset_timeout giây:
+    mọi lời gọi bị từ chối ngay (CircuitOpenError). Hết thời gian thì chỉ MỘT lời gọi thử được đi qua,
+    các lời gọi khác vẫn bị từ chối cho tới khi lời gọi thử thành công (đóng mạch) hoặc lỗi (mở lại)
+    """
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: int = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Đang có lời gọi thử ở trạng thái half_open
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """Cho phép gọi hoặc ném CircuitOpenError; True nếu lời gọi này là lời gọi thử"""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.probing:
+                # Lời gọi đầu tiên sau reset_timeout là lời gọi thử
+                self.probing = True
+                return True
+        raise CircuitOpenError(self.name, f"tạm ngưng gọi sau {self.failures} lỗi liên tiếp, thử lại sau {self.reset_timeout}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """Lời gọi thử bị hủy giữa chừng (không biết kết quả): cho lời gọi sau được thử"""
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"❌ Circuit {self.name} mở sau {self.failures} lỗi liên tiếp")
+                self.opened_at = time.monotonic()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Circuit breaker dùng chung cho cả process theo tên nguồn dữ liệu"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def call_with_retry(func, source: str, retries: int = DATA_RETRIES, description: str = "", idempotent: bool = True):
+    """
+    Gọi func(), thử lại lỗi tạm thời với backoff có jitter qua circuit breaker của source.
+    idempotent=False (lệnh ghi gửi lại có thể ghi trùng): chỉ thử lại khi request chưa tới server,
+    timeout/mất kết nối giữa chừng không được thử lại vì server có thể đã ghi xong.
+    Lỗi cuối cùng (hoặc lỗi không tạm thời) được đổi thành DataSourceError
+    """
+    breaker = get_breaker(source)
+    for attempt in range(retries):
+        probe = breaker.before_call()
+        try:
+            result = func()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if not is_transient(e):
+                # Lỗi nghiệp vụ: nguồn vẫn trả lời nên không tính là lỗi kết nối (và kết thúc lời gọi thử)
+                breaker.record_success()
+                raise DataSourceError(source, f"{description} {e}".strip(), e) from e
+            breaker.record_failure()
+            if attempt == retries - 1:
+                raise DataSourceError(source, f"{description} lỗi sau {retries} lần thử: {e}".strip(), e) from e
+            if not idempotent and not is_unsent(e):
+                raise DataSourceError(source, f"{description} lỗi, không thử lại vì server có thể đã ghi: {e}".strip(), e) from e
+            print(f"❌ {source} {description} lỗi tạm thời, lần {attempt + 1}/{retries}: {e}")
+            time.sleep(backoff_delay(attempt))
+        except BaseException:
+            # KeyboardInterrupt/SystemExit khi đang là lời gọi thử: không giữ mạch ở trạng thái đang thử
+            if probe:
+                breaker.release_probe()
+            raise
+
+async def async_call_with_retry(func, source: str, retries: int = DATA_RETRIES, description: str = "",
+                                idempotent: bool = True):
+    """Bản async của call_with_retry, func() trả về awaitable"""
+    breaker = get_breaker(source)
+    for attempt in range(retries):
+        probe = breaker.before_call()
+        try:
+            result = await func()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            if not is_transient(e):
+                # Lỗi nghiệp vụ: nguồn vẫn trả lời nên không tính là lỗi kết nối (và kết thúc lời gọi thử)
+                breaker.record_success()
+                raise DataSourceError(source, f"{description} {e}".strip(), e) from e
+            breaker.record_failure()
+            if attempt == retries - 1:
+                raise DataSourceError(source, f"{description} lỗi sau {retries} lần thử: {e}".strip(), e) from e
+            if not idempotent and not is_unsent(e):
+                raise DataSourceError(source, f"{description} lỗi, không thử lại vì server có thể đã ghi: {e}".strip(), e) from e
+            print(f"❌ {source} {description} lỗi tạm thời, lần {attempt + 1}/{retries}: {e}")
+            await asyncio.sleep(backoff_delay(attempt))
+        except BaseException:
+            # Bị hủy (CancelledError) khi đang là lời gọi thử: không giữ mạch ở trạng thái đang thử
+            if probe:
+                breaker.release_probe()
+            raise
@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import traceback
+from typing import List, Optional
+
+import pandas as pd
+
+from settings.config import SNAPSHOT_DIR, SNAPSHOT_KEEP_VERSIONS, SNAPSHOT_MAX_AGE
+
+# Thuộc tính (DataFrame.attrs) chứa thời điểm lưu snapshot cũ nhất trong kết quả load
+SAVED_AT = "snapshot_saved_at"
+
+# Cột dùng để tách kết quả theo mã, và mã có được chuẩn hóa S + code[:8] hay không
+# (giống điều kiện đọc lại trong các _execute_* của TaskManager)
+SNAPSHOT_KEYS = {
+    "dm_technical": (["SC_NO"], True),
+    "dm_actual": (["SC_NO"], True),
+    "cutting_forecast": (["GO", "JO"], False),
+    "submat_demand": (["GO", "JO_NO"], False),
+    "fabric_trans": (["SC_NO", "JO_NO"], False),
+    "submat_trans": (["SC_NO", "JO_NO"], False),
+    "process_wip": (["SC_NO", "JO_NO"], False),
+}
+
+def snapshot_code(code: str, normalize: bool = False) -> str:
+    code = code.strip().strip("'").upper()
+    if normalize and len(code) > 9:
+        return f"S{code[:8]}"
+    return code
+
+class SnapshotStore:
+    """
+    Lưu kết quả của mỗi lần chạy online theo từng (bảng, mã) thành file pickle có phiên bản
+    (tên file là thời điểm lưu), để truy vấn "xem" đọc trực tiếp từ đĩa thay vì gọi Supabase.
+    Snapshot quá max_age giây bị bỏ qua như chưa có
+    """
+    def __init__(self, root: str = SNAPSHOT_DIR, keep_versions: int = SNAPSHOT_KEEP_VERSIONS,
+                 max_age: int = SNAPSHOT_MAX_AGE):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.max_age = max_age
+
+    def _dir(self, table_name: str, code: str) -> str:
+        safe_code = re.sub(r"[^A-Z0-9_-]", "_", code)
+        return os.path.join(self.root, table_name, safe_code)
+
+    def _versions(self, folder: str) -> List[str]:
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name for name in os.listdir(folder) if name.endswith(".pkl"))
+
+    @staticmethod
+    def _saved_at(version: str) -> float:
+        """Thời điểm lưu (epoch giây) theo tên file phiên bản "<time_ns>.pkl" """
+        return int(version[:-len(".pkl")]) / 1e9
+
+    def save(self, table_name: str, codes: List[str], data: pd.DataFrame):
+        """Tách data theo từng mã và ghi một phiên bản snapshot mới cho mỗi mã"""
+        if table_name not in SNAPSHOT_KEYS or data is None or not isinstance(data, pd.DataFrame):
+            return
+        columns, normalize = SNAPSHOT_KEYS[table_name]
+        columns = [col for col in columns if col in data.columns]
+        if not columns and not data.empty:
+            return
+
+        version = f"{time.time_ns()}.pkl"
+        for code in {snapshot_code(code, normalize) for code in codes}:
+            try:
+                mask = pd.Series(False, index=data.index)
+                for col in columns:
+                    mask |= data[col].astype(str).str.upper() == code
+                folder = self._dir(table_name, code)
+                os.makedirs(folder, exist_ok=True)
+
+                # Ghi file tạm rồi đổi tên để người đọc không thấy file ghi dở
+                path = os.path.join(folder, version)
+                data[mask].to_pickle(path + ".tmp")
+                os.replace(path + ".tmp", path)
+
+                for old in self._versions(folder)[:-self.keep_versions]:
+                    os.remove(os.path.join(folder, old))
+            except Exception:
+                print(traceback.format_exc())
+
+    def load(self, table_name: str, codes: List[str]) -> Optional[pd.DataFrame]:
+        """
+        Snapshot mới nhất của các mã, None nếu có mã chưa có snapshot hoặc snapshot đã quá max_age.
+        Thời điểm lưu cũ nhất trong các mã nằm ở data.attrs[SAVED_AT] để báo cho người dùng
+        """
+        if table_name not in SNAPSHOT_KEYS:
+            return None
+        _, normalize = SNAPSHOT_KEYS[table_name]
+
+        parts = []
+        saved_at = None
+        for code in {snapshot_code(code, normalize) for code in codes}:
+            folder = self._dir(table_name, code)
+            versions = self._versions(folder)
+            if not versions:
+                return None
+            try:
+                version_saved_at = self._saved_at(versions[-1])
+                if time.time() - version_saved_at > self.max_age:
+                    return None
+                parts.append(pd.read_pickle(os.path.join(folder, versions[-1])))
+            except Exception:
+                print(traceback.format_exc())
+                return None
+            saved_at = version_saved_at if saved_at is None else min(saved_at, version_saved_at)
+
+        if not parts:
+            return None
+        data = pd.concat(parts, ignore_index=True)
+        # Một dòng có thể khớp nhiều mã (vd GO và JO của GO đó)
+        if "id" in data.columns:
+            data = data.drop_duplicates(subset=["id"]).reset_index(drop=True)
+        data.attrs[SAVED_AT] = saved_at
+        return data
+
+snapshot_store = SnapshotStore()
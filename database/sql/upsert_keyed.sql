@@ -0,0 +1,163 @@
+-- Upsert theo khóa tự nhiên, chạy trên Supabase (SQL editor)
+--
+-- Client đẩy các dòng mới vào upsert_stage (có thể nhiều lần, theo từng chunk),
+-- sau đó gọi rpc upsert_keyed: trong MỘT transaction sẽ
+--   * xóa các dòng trong phạm vi scope_conditions không còn trong dữ liệu mới
+--   * cập nhật các dòng cùng khóa nhưng khác giá trị
+--   * thêm các dòng có khóa mới
+--   * reset về null các cột tính ở bước sau (reset_columns) của mọi dòng trong phạm vi,
+--     như khi xóa rồi thêm lại, để bước sau tính lại theo bảng tham chiếu hiện tại
+-- rồi dọn dữ liệu stage. Các dòng không đổi (và đã reset) không bị ghi lại.
+-- Khóa trùng nhau (vd nhiều giao dịch giống hệt) được ghép theo thứ tự xuất hiện.
+
+create table if not exists public.upsert_stage (
+    id bigserial primary key,
+    stage_id uuid not null,
+    table_name text not null,
+    payload jsonb not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists upsert_stage_stage_id_idx on public.upsert_stage (stage_id);
+
+-- row_id do client sinh cho từng dòng: gửi lại batch sau timeout (upsert on_conflict=row_id,
+-- ignore-duplicates) không stage trùng dòng
+alter table public.upsert_stage add column if not exists row_id uuid;
+create unique index if not exists upsert_stage_row_id_idx on public.upsert_stage (row_id);
+
+-- Stage bị bỏ lại (tiến trình dừng giữa stage và commit) được dọn theo created_at:
+-- client xóa dòng quá UPSERT_STAGE_MAX_AGE khi bắt đầu stage mới (SupabaseFunctions.purge_stale_stages)
+create index if not exists upsert_stage_created_at_idx on public.upsert_stage (created_at);
+
+create or replace function public.upsert_keyed(
+    table_name text,
+    key_columns text[],
+    stage_id uuid,
+    scope_conditions text default null,
+    reset_columns text[] default '{}'
+) returns jsonb
+language plpgsql
+as $$
+declare
+    data_columns text[];
+    col_list text;
+    key_list text;
+    order_list text;
+    key_match text;
+    set_list text;
+    reset_list text;
+    reset_needed text;
+    row_changed text;
+    existing_filter text;
+    n_deleted int := 0;
+    n_updated int := 0;
+    n_inserted int := 0;
+begin
+    select array_agg(k order by k) into data_columns
+    from (
+        select distinct jsonb_object_keys(s.payload) as k
+        from public.upsert_stage s
+        where s.stage_id = upsert_keyed.stage_id
+    ) t
+    where k <> 'id';
+
+    -- Không có dữ liệu mới: chỉ xóa các dòng trong phạm vi
+    if data_columns is null then
+        if scope_conditions is not null then
+            execute format('delete from %I where %s', table_name, scope_conditions);
+            get diagnostics n_deleted = row_count;
+        end if;
+        return jsonb_build_object('inserted', 0, 'updated', 0, 'deleted', n_deleted);
+    end if;
+
+    select string_agg(format('%I', c), ', ') into col_list from unnest(data_columns) c;
+    select string_agg(format('%I', c), ', ') into key_list from unnest(key_columns) c;
+    select string_agg(format('%I', c), ', ') into order_list from unnest(data_columns) c;
+    select string_agg(format('i.%1$I is not distinct from e.%1$I', c), ' and ') into key_match from unnest(key_columns) c;
+
+    -- Dữ liệu mới, đánh số thứ tự trong từng khóa
+    execute format(
+        'create temp table _upsert_incoming on commit drop as
+         select %2$s, row_number() over (partition by %3$s order by %4$s) as _ord
+         from (
+             select r.*
+             from public.upsert_stage s
+             cross join lateral jsonb_populate_record(null::%1$I, s.payload) r
+             where s.stage_id = $1
+         ) src',
+        table_name, col_list, key_list, order_list
+    ) using stage_id;
+
+    -- Dữ liệu hiện có trong phạm vi (hoặc cùng khóa nếu không có phạm vi)
+    if scope_conditions is not null then
+        existing_filter := format('(%s)', scope_conditions);
+    else
+        existing_filter := format(
+            'exists (select 1 from _upsert_incoming i where %s)',
+            (select string_agg(format('i.%1$I is not distinct from t.%1$I', c), ' and ') from unnest(key_columns) c)
+        );
+    end if;
+
+    execute format(
+        'create temp table _upsert_existing on commit drop as
+         select t.id, %2$s, row_number() over (partition by %3$s order by %4$s) as _ord
+         from %1$I t
+         where %5$s',
+        table_name, (select string_agg(format('t.%I', c), ', ') from unnest(data_columns) c),
+        (select string_agg(format('t.%I', c), ', ') from unnest(key_columns) c),
+        (select string_agg(format('t.%I', c), ', ') from unnest(data_columns) c),
+        existing_filter
+    );
+
+    -- 1. Xóa dòng cũ không còn trong dữ liệu mới
+    execute format(
+        'delete from %I t using _upsert_existing e
+         where t.id = e.id
+         and not exists (select 1 from _upsert_incoming i where %s and i._ord = e._ord)',
+        table_name, key_match
+    );
+    get diagnostics n_deleted = row_count;
+
+    -- 2. Cập nhật dòng cùng khóa nhưng khác giá trị
+    select string_agg(format('%1$I = i.%1$I', c), ', ') into set_list from unnest(data_columns) c;
+    select string_agg(format('t.%1$I is distinct from i.%1$I', c), ' or ') into row_changed from unnest(data_columns) c;
+
+    execute format(
+        'update %1$I t set %2$s
+         from _upsert_existing e
+         join _upsert_incoming i on %3$s and i._ord = e._ord
+         where t.id = e.id and (%4$s)',
+        table_name, set_list, key_match, row_changed
+    );
+    get diagnostics n_updated = row_count;
+
+    -- 2b. Reset cột tính ở bước sau của mọi dòng còn lại trong phạm vi (kể cả dòng không đổi):
+    -- giá trị cũ được tính từ bảng tham chiếu (fabric_list, trims_list...) có thể đã sửa
+    select string_agg(format('%I = null', c), ', '), string_agg(format('t.%I is not null', c), ' or ')
+    into reset_list, reset_needed
+    from unnest(reset_columns) c
+    where not c = any(data_columns);
+
+    if reset_list is not null then
+        execute format(
+            'update %1$I t set %2$s
+             from _upsert_existing e
+             where t.id = e.id and (%3$s)',
+            table_name, reset_list, reset_needed
+        );
+    end if;
+
+    -- 3. Thêm dòng có khóa mới
+    execute format(
+        'insert into %1$I (%2$s)
+         select %2$s from _upsert_incoming i
+         where not exists (select 1 from _upsert_existing e where %3$s and i._ord = e._ord)',
+        table_name, col_list, key_match
+    );
+    get diagnostics n_inserted = row_count;
+
+    delete from public.upsert_stage s where s.stage_id = upsert_keyed.stage_id;
+
+    return jsonb_build_object('inserted', n_inserted, 'updated', n_updated, 'deleted', n_deleted);
+end;
+$$;
@@ -0,0 +1,90 @@
+from typing import Dict, List
+
+import pandas as pd
+
+class TableDtypes:
+    """
+    Kiểu dữ liệu gọn cho DataFrame đọc từ một bảng Supabase:
+    cột mã lặp lại nhiều -> category, số lượng -> float32, ngày -> datetime64
+    """
+    def __init__(self, category: List[str] = None, float32: List[str] = None, datetime: List[str] = None):
+        self.category = category or []
+        self.float32 = float32 or []
+        self.datetime = datetime or []
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        for col in self.category:
+            if col in data.columns:
+                data[col] = data[col].astype("category")
+        for col in self.float32:
+            if col in data.columns:
+                data[col] = pd.to_numeric(data[col], errors="coerce").astype("float32")
+        for col in self.datetime:
+            if col in data.columns:
+                data[col] = pd.to_datetime(data[col], errors="coerce")
+        return data
+
+# Chỉ dùng cho dữ liệu hiển thị/lưu lịch sử; các pipeline (groupby, fillna(''), merge)
+# vẫn đọc kiểu mặc định vì category/float32 làm thay đổi kết quả của các phép đó
+TABLE_DTYPES: Dict[str, TableDtypes] = {
+    "fabric_trans": TableDtypes(
+        category=["SC_NO", "JO_NO", "TRANS_CD", "ITEM_CODE", "PO_NO", "PO_Item", "TRANS_TYPE", "TRANS_UOM", "CODE_CUSTOMS"],
+        float32=["QTY", "Width", "TOTAL"],
+        datetime=["TRANS_DATE"]
+    ),
+    "submat_trans": TableDtypes(
+        category=["STORE_CODE", "SC_NO", "JO_NO", "TRANS_CD", "ITEM_CODE", "PRODUCT_CODE", "SUB_CODE",
+                  "PRODUCT_GROUP_NAME", "PRODUCT_CLASS", "TRANS_UOM", "CODE_CUSTOMS"],
+        float32=["QTY", "CONVERT", "TOTAL"],
+        datetime=["TRANS_DATE"]
+    ),
+    "process_wip": TableDtypes(
+        category=["SC_NO", "JO_NO", "Color_Code", "Size_Code", "Process_Code"],
+        float32=["In_Qty", "Output_Qty", "Pull_In_Qty", "Discrepancy_Qty", "Wip"]
+    ),
+    "submat_demand": TableDtypes(
+        category=["GO", "JO_NO", "UOM", "Manual_Demand", "Product_Code", "Dimm_No", "CODE_HQ"],
+        float32=["Required_Qty", "Allocated_Qty", "Issued_Qty", "Demand_Qty", "TOTAL_SUB_USED"],
+        datetime=["Create_Date"]
+    ),
+    "cutting_forecast": TableDtypes(
+        category=["GO", "JO", "Color", "PPO_No", "CODE_CUSTOMS"],
+        float32=["Plan_Cut_Qty", "Marker_YY", "Width", "TOTAL_FB_USED"]
+    ),
+    "dm_actual": TableDtypes(
+        category=["SC_NO", "CODE_CUSTOMS", "NOTE_AT", "CHECK_DM_AT", "REMARK_AT"],
+        float32=["TOTAL_AT", "TOTAL_PCS_AT", "DEMAND_AT", "DEMAND_CA_AT"]
+    ),
+    "dm_technical": TableDtypes(
+        category=["SC_NO", "CODE_CUSTOMS", "NOTE", "CHECK_DM", "REMARK"],
+        float32=["TOTAL", "TOTAL_PCS", "DEMAND"]
+    ),
+}
+
+def memory_usage(data: pd.DataFrame) -> int:
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+def compact_dtypes(table_name: str, data: pd.DataFrame) -> pd.DataFrame:
+    """Đổi DataFrame của bảng sang kiểu gọn theo TABLE_DTYPES và in lượng bộ nhớ tiết kiệm được"""
+    schema = TABLE_DTYPES.get(table_name)
+    if schema is None or data is None or data.empty:
+        return data
+
+    before = memory_usage(data)
+    data = schema.apply(data)
+    after = memory_usage(data)
+    print(f"📊 {table_name}: {len(data)} dòng, {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
+    return data
+
+def restore_dtypes(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Đưa cột float32 về float64 theo giá trị thập phân ngắn nhất (1234.567 thay vì 1234.5670166)
+    trước khi hiển thị hoặc xuất Excel
+    """
+    columns = data.select_dtypes(include=["float32"]).columns
+    if len(columns) == 0:
+        return data
+    data = data.copy()
+    for col in columns:
+        data[col] = data[col].astype(str).astype("float64")
+    return data
@@ -0,0 +1,136 @@
+import threading
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+class ViewSchema:
+    """
+    Mô tả các cột cần lấy của một view SQL Server:
+    (tên cột gốc, tên cột đích, kiểu dữ liệu "str" | "float" | "int" | "datetime", vị trí cột trong SELECT *)
+    Vị trí là cách đọc cũ (iloc), chỉ dùng khi view không có cột theo tên khai báo
+    """
+    def __init__(self, view: str, columns: List[Tuple[str, str, str, Optional[int]]]):
+        self.view = view
+        self.columns = columns
+        # Tên cột gốc theo tên đích, được sửa lại sau khi đối chiếu với view (resolve)
+        self._sources = {target: source for source, target, _, _ in columns}
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    @property
+    def targets(self) -> List[str]:
+        return [target for _, target, _, _ in self.columns]
+
+    def resolve(self, sql_query) -> "ViewSchema":
+        """
+        Đối chiếu tên cột khai báo với cột thực tế của view (một lần cho cả process).
+        Cột không có theo tên được lấy theo vị trí như cách đọc cũ và ghi log để sửa khai báo
+        """
+        if self._resolved:
+            return self
+        with self._lock:
+            if self._resolved:
+                return self
+            try:
+                actual = list(sql_query.getData(f"SELECT TOP 0 * FROM {self.view}").columns)
+            except Exception as e:
+                # Không đọc được danh sách cột: dùng tên khai báo, lần sau đối chiếu lại
+                print(f"❌ Không đọc được danh sách cột của {self.view}: {e}")
+                return self
+
+            by_name = {name.lower(): name for name in actual}
+            for source, target, _, position in self.columns:
+                if source.lower() in by_name:
+                    self._sources[target] = by_name[source.lower()]
+                elif position is not None and position < len(actual):
+                    self._sources[target] = actual[position]
+                    print(f"❌ {self.view} không có cột [{source}], dùng cột thứ {position} [{actual[position]}] cho {target}")
+                else:
+                    print(f"❌ {self.view} không có cột [{source}] ({target})")
+            self._resolved = True
+        return self
+
+    def select_list(self) -> str:
+        """Danh sách cột tường minh cho câu SELECT (đã đổi tên sang tên đích)"""
+        return ", ".join(f"[{self._sources[target]}] AS [{target}]" for target in self.targets)
+
+    def column(self, target: str) -> str:
+        """Tên cột gốc (dạng [..]) theo tên đích, dùng trong WHERE"""
+        if target not in self._sources:
+            raise KeyError(f"{self.view} không có cột {target}")
+        return f"[{self._sources[target]}]"
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Ép kiểu dữ liệu theo schema cho các cột đích"""
+        for _, target, dtype, _ in self.columns:
+            if target not in data.columns:
+                continue
+            if dtype == "datetime":
+                data[target] = pd.to_datetime(data[target], errors="coerce")
+            elif dtype == "float":
+                data[target] = pd.to_numeric(data[target], errors="coerce").astype("float64")
+            elif dtype == "int":
+                data[target] = pd.to_numeric(data[target], errors="coerce")
+        return data
+
+# Vị trí cột lấy từ cách đọc cũ (data.iloc[:, cols]); go_quantity vốn đã chọn cột theo tên
+VIEW_SCHEMAS = {
+    "fabric_trans": ViewSchema("[dbo].[V_Fabric_Trans_Summary_EHV]", [
+        ("SC_NO", "SC_NO", "str", 3),
+        ("JO NO", "JO_NO", "str", 4),
+        ("TRANS_DATE", "TRANS_DATE", "datetime", 5),
+        ("TRANS_CD", "TRANS_CD", "str", 6),
+        ("ITEM_CODE", "ITEM_CODE", "str", 7),
+        ("PO_NO", "PO_NO", "str", 8),
+        ("TRANS TYPE", "TRANS_TYPE", "str", 9),
+        ("TRANS_UOM", "TRANS_UOM", "str", 19),
+        ("QTY", "QTY", "float", 20),
+    ]),
+    "submat_trans": ViewSchema("[dbo].[V_Submat_Trans_Summary_EHV]", [
+        ("STORE_CODE", "STORE_CODE", "str", 0),
+        ("SC_NO", "SC_NO", "str", 3),
+        ("JO NO", "JO_NO", "str", 4),
+        ("TRANS_DATE", "TRANS_DATE", "datetime", 5),
+        ("TRANS_CD", "TRANS_CD", "str", 6),
+        ("ITEM_CODE", "ITEM_CODE", "str", 7),
+        ("PRODUCT_GROUP_NAME", "PRODUCT_GROUP_NAME", "str", 15),
+        ("PRODUCT_CLASS", "PRODUCT_CLASS", "str", 17),
+        ("TRANS_UOM", "TRANS_UOM", "str", 19),
+        ("QTY", "QTY", "float", 20),
+    ]),
+    "submat_demand": ViewSchema("dbo.V_MRP_JO_Demand_EHV", [
+        ("JO NO", "JO_NO", "str", 0),
+        ("Required Qty", "Required_Qty", "float", 7),
+        ("Allocated Qty", "Allocated_Qty", "float", 8),
+        ("Issued Qty", "Issued_Qty", "float", 9),
+        ("Demand Qty", "Demand_Qty", "float", 10),
+        ("UOM", "UOM", "str", 11),
+        ("Manual Demand", "Manual_Demand", "str", 15),
+        ("Create Date", "Create_Date", "datetime", 17),
+        ("Product Code", "Product_Code", "str", 19),
+        ("Dimm No", "Dimm_No", "str", 20),
+    ]),
+    "process_wip": ViewSchema("[dbo].[V_JO_Process_WIP_EHV]", [
+        ("JO NO", "JO_NO", "str", 1),
+        ("Color Code", "Color_Code", "str", 2),
+        ("Size Code", "Size_Code", "str", 3),
+        ("Process Code", "Process_Code", "str", 4),
+        ("In Qty", "In_Qty", "float", 8),
+        ("Output Qty", "Output_Qty", "float", 9),
+        ("Pull In Qty", "Pull_In_Qty", "float", 10),
+        ("Discrepancy Qty", "Discrepancy_Qty", "float", 11),
+        ("WIP", "Wip", "float", 12),
+    ]),
+    "go_quantity": ViewSchema("escmowner.V_GO", [
+        ("GO No", "GO_No", "str", None),
+        ("Order QTY", "Order_QTY", "float", None),
+        ("Year", "Year", "int", None),
+    ]),
+}
+
+def get_view_schema(name: str, sql_query=None) -> ViewSchema:
+    """Schema của view; có sql_query thì đối chiếu tên cột với view trước khi dùng"""
+    schema = VIEW_SCHEMAS[name]
+    if sql_query is not None:
+        schema.resolve(sql_query)
+    return schema
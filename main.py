@@ -1,6 +1,7 @@
 import flet as ft
 from ui_setup.pages.login_page import LoginPage
 from ui_setup.main_page import MainPage
+from ui_setup.utils.warm_up import start_warm_up
 
 class FletApp:
     def __init__(self):
@@ -34,4 +35,6 @@ def main(page: ft.Page):
     app.main(page)
 
 if __name__ == "__main__":
+    # Mở sẵn kết nối SQL Server/Supabase và load model trong lúc người dùng đăng nhập
+    start_warm_up()
     ft.app(target=main)
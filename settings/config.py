@@ -8,3 +8,97 @@ PASSWORD = os.getenv("PASSWORD")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_API = os.getenv("SUPABASE_API")
+
+# Pool kết nối SQL Server (dùng chung cho cả process)
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "5"))
+SQL_POOL_TIMEOUT = int(os.getenv("SQL_POOL_TIMEOUT", "30"))
+SQL_POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "1800"))
+
+# Số dòng mỗi chunk khi đọc streaming từ view SQL Server
+SQL_CHUNK_SIZE = int(os.getenv("SQL_CHUNK_SIZE", "20000"))
+
+# Đọc phân trang từ Supabase (theo khoảng "id")
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "5000"))
+SUPABASE_READ_WORKERS = int(os.getenv("SUPABASE_READ_WORKERS", "4"))
+# Giới hạn số dòng mỗi response của REST API (Max rows trong cài đặt Supabase)
+SUPABASE_MAX_ROWS = int(os.getenv("SUPABASE_MAX_ROWS", "1000"))
+
+# Ghi hàng loạt lên Supabase: chia batch theo số dòng/kích thước, tải song song
+SUPABASE_INSERT_BATCH_ROWS = int(os.getenv("SUPABASE_INSERT_BATCH_ROWS", "1000"))
+SUPABASE_INSERT_BATCH_BYTES = int(os.getenv("SUPABASE_INSERT_BATCH_BYTES", "1000000"))
+SUPABASE_WRITE_WORKERS = int(os.getenv("SUPABASE_WRITE_WORKERS", "4"))
+SUPABASE_INSERT_RETRIES = int(os.getenv("SUPABASE_INSERT_RETRIES", "3"))
+# Dòng upsert_stage bị bỏ lại (tiến trình dừng giữa stage và commit) quá số giây này sẽ bị dọn
+UPSERT_STAGE_MAX_AGE = int(os.getenv("UPSERT_STAGE_MAX_AGE", "21600"))
+
+# HTTP client bất đồng bộ cho Supabase (keep-alive, HTTP/2)
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "20"))
+SUPABASE_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "10"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+
+# Cache đọc cho các bảng master (fabric_list, trims_list, range_dm)
+SUPABASE_CACHE_TTL = int(os.getenv("SUPABASE_CACHE_TTL", "600"))
+SUPABASE_CACHE_MAX_ENTRIES = int(os.getenv("SUPABASE_CACHE_MAX_ENTRIES", "32"))
+
+# Bản sao cục bộ (SQLite) của các bảng tham chiếu
+REFERENCE_MIRROR_PATH = os.getenv("REFERENCE_MIRROR_PATH", os.path.join("local_data", "reference_mirror.sqlite"))
+REFERENCE_MIRROR_SYNC_INTERVAL = int(os.getenv("REFERENCE_MIRROR_SYNC_INTERVAL", "300"))
+# Sau khoảng thời gian này (giây) luôn tải lại toàn bộ bản sao (phòng khi không so được checksum dòng đã sửa tại chỗ)
+REFERENCE_MIRROR_FULL_RELOAD_INTERVAL = int(os.getenv("REFERENCE_MIRROR_FULL_RELOAD_INTERVAL", "3600"))
+
+# Snapshot cục bộ cho chế độ xem offline ("xem ...")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("local_data", "snapshots"))
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("SNAPSHOT_KEEP_VERSIONS", "3"))
+# Snapshot cũ hơn khoảng thời gian này (giây) không dùng để xem offline, đọc lại từ Supabase
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "86400"))
+
+# Khởi động trước kết nối/model khi mở ứng dụng và giữ kết nối sống
+WARM_UP_SQL_CONNECTIONS = int(os.getenv("WARM_UP_SQL_CONNECTIONS", "2"))
+WARM_UP_KEEPALIVE_INTERVAL = int(os.getenv("WARM_UP_KEEPALIVE_INTERVAL", "240"))
+
+# Timeout, thử lại và circuit breaker cho SQL Server/Supabase
+SQL_CONNECT_TIMEOUT = int(os.getenv("SQL_CONNECT_TIMEOUT", "15"))
+SQL_QUERY_TIMEOUT = int(os.getenv("SQL_QUERY_TIMEOUT", "300"))
+SUPABASE_TIMEOUT = int(os.getenv("SUPABASE_TIMEOUT", "60"))
+DATA_RETRIES = int(os.getenv("DATA_RETRIES", "3"))
+DATA_RETRY_BASE_DELAY = float(os.getenv("DATA_RETRY_BASE_DELAY", "0.5"))
+DATA_RETRY_MAX_DELAY = float(os.getenv("DATA_RETRY_MAX_DELAY", "8"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = int(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Số bước ETL độc lập chạy đồng thời trong một báo cáo (DM Actual/Technical)
+STAGE_CONCURRENCY = int(os.getenv("STAGE_CONCURRENCY", "3"))
+
+# Thời gian (giây) dùng lại kết quả một bước của báo cáo khi dữ liệu đầu vào chưa đổi
+TASK_MEMO_TTL = int(os.getenv("TASK_MEMO_TTL", "900"))
+TASK_MEMO_MAX_ENTRIES = int(os.getenv("TASK_MEMO_MAX_ENTRIES", "128"))
+
+# Sổ theo dõi độ mới của nguồn SQL Server theo từng GO: bỏ qua cập nhật khi nguồn chưa đổi
+FRESHNESS_PROBE = os.getenv("FRESHNESS_PROBE", "1") == "1"
+FRESHNESS_PATH = os.getenv("FRESHNESS_PATH", os.path.join("local_data", "freshness.sqlite"))
+# Sau khoảng thời gian này (giây) luôn cập nhật lại dù nguồn không đổi
+FRESHNESS_MAX_AGE = int(os.getenv("FRESHNESS_MAX_AGE", "21600"))
+
+# Đồng bộ fabric_trans/submat_trans: "incremental" chỉ lấy lại các giao dịch từ mốc TRANS_DATE
+# của từng GO lùi TRANS_SYNC_OVERLAP_DAYS ngày, "full" luôn lấy lại toàn bộ
+TRANS_SYNC_MODE = os.getenv("TRANS_SYNC_MODE", "incremental")
+# Số ngày đọc lại trước mốc: bắt giao dịch cùng ngày/nhập lùi ngày/bị sửa gần đây (upsert theo khóa không tạo dòng trùng)
+TRANS_SYNC_OVERLAP_DAYS = int(os.getenv("TRANS_SYNC_OVERLAP_DAYS", "7"))
+# Sau khoảng thời gian này (giây) lấy lại toàn bộ để bắt giao dịch bị sửa/xóa/nhập lùi ngày
+TRANS_FULL_REBUILD_INTERVAL = int(os.getenv("TRANS_FULL_REBUILD_INTERVAL", "604800"))
+
+# Báo cáo MES (Cutting Forecast): "browser" điều khiển Edge headless, "http" gửi lại form ASP.NET qua HTTP
+MES_BASE_URL = os.getenv("MES_BASE_URL", "http://192.168.155.16/MesReports")
+CUTTING_FORECAST_ENGINE = os.getenv("CUTTING_FORECAST_ENGINE", "browser")
+# Số GO lấy song song khi dùng engine "http" (mỗi luồng một session riêng)
+CUTTING_FORECAST_HTTP_WORKERS = int(os.getenv("CUTTING_FORECAST_HTTP_WORKERS", "6"))
+
+# Pool trình duyệt Edge headless dùng chung để lấy Cutting Forecast từ MES
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "3"))
+# Thời gian chờ tối đa (giây) trang kết quả tải xong cho mỗi GO
+CUTTING_FORECAST_WAIT_TIMEOUT = int(os.getenv("CUTTING_FORECAST_WAIT_TIMEOUT", "30"))
+# Dòng chữ MES hiển thị khi GO không có dữ liệu: chỉ khi thấy dòng này mới coi GO là rỗng và xóa dữ liệu cũ
+CUTTING_FORECAST_NO_DATA_TEXT = os.getenv("CUTTING_FORECAST_NO_DATA_TEXT", "No Data")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Cho phép import các module của dự án khi chạy pytest từ thư mục gốc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# connect_supabase tạo client khi import: cần URL và key đúng định dạng (không kết nối thật)
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_API", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.dGVzdA")
@@ -0,0 +1,85 @@
+import os
+
+from ui_setup.data_dmkt import cutting_forecast
+from ui_setup.data_dmkt.cutting_forecast import CuttingForecast
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "cutting_forecast")
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.calls = []
+
+    def upsert_data(self, table_name, data_json, scope_conditions=None):
+        self.calls.append((table_name, data_json, scope_conditions))
+        return True
+
+
+def make_forecast(monkeypatch, outcomes):
+    """outcomes: {GO: (dòng dữ liệu, STATUS)}"""
+    forecast = CuttingForecast.__new__(CuttingForecast)
+    forecast.supa_func = FakeSupabase()
+    forecast.code_name = ",".join(f"'{go}'" for go in outcomes)
+    forecast.go_report = []
+
+    def fetch_go(input_go):
+        rows, status = outcomes[input_go]
+        return rows, {"SC_NO": input_go, "STATUS": status, "ROWS": len(rows), "SECONDS": 0.0, "ATTEMPTS": 1, "ERROR": ""}
+
+    monkeypatch.setattr(forecast, "fetch_go", fetch_go)
+    monkeypatch.setattr(cutting_forecast, "write_go_report", lambda report: None)
+    return forecast
+
+
+def test_scope_excludes_failed_gos(monkeypatch):
+    forecast = make_forecast(monkeypatch, {
+        "GO1": ([{"GO": "GO1", "JO": "JO1"}], "ok"),
+        "GO2": ([], "timeout"),
+        "GO3": ([], "no_data"),
+        "GO4": ([], "no_table"),
+    })
+
+    assert forecast.into_supabase() is True
+
+    (_, data_json, scope), = forecast.supa_func.calls
+    assert data_json == [{"GO": "GO1", "JO": "JO1"}]
+    assert scope == """ "GO" IN ('GO1','GO3') OR "JO" IN ('GO1','GO3') """
+
+
+def test_nothing_written_when_every_go_failed(monkeypatch):
+    forecast = make_forecast(monkeypatch, {"GO1": ([], "error"), "GO2": ([], "no_table")})
+
+    assert forecast.into_supabase() is None
+    assert forecast.supa_func.calls == []
+
+
+def saved_page(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_saved_no_data_page_is_recognised(monkeypatch):
+    forecast = CuttingForecast.__new__(CuttingForecast)
+    page = saved_page("no_data.html")
+    monkeypatch.setattr(forecast, "fetch_html", lambda input_go: page)
+
+    assert cutting_forecast.parse_cutting_forecast(page, "GO-EMPTY") is None
+    assert cutting_forecast.has_no_data_marker(page)
+    assert forecast.fetch_go("GO-EMPTY")[1]["STATUS"] == "no_data"
+
+
+def test_fetch_go_needs_marker_to_treat_page_as_empty(monkeypatch):
+    forecast = CuttingForecast.__new__(CuttingForecast)
+    no_data = saved_page("no_data.html")
+    pages = {
+        # Trang form chưa query: không có bảng thông tin GO
+        "GO1": saved_page("form.html").replace("{result}", '<span class="Warning">No Data</span>'),
+        # Chữ chỉ nằm trong script, trang không hiển thị thông báo
+        "GO2": no_data.replace('<span id="lblMessage" class="Warning"> No Data </span>', ""),
+        # Thông báo khác có chứa chữ "No Data"
+        "GO3": no_data.replace(" No Data ", "No Data for site EGM, please check"),
+    }
+    monkeypatch.setattr(forecast, "fetch_html", lambda input_go: pages[input_go])
+
+    for go in pages:
+        assert forecast.fetch_go(go)[1]["STATUS"] == "no_table"
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from ui_setup.components.dm_technical import DemandTechnical
+
+
+class FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.upserts = []
+
+    def get_data(self, table_name, items, conditions=None):
+        return self.tables[table_name]
+
+    def upsert_data(self, table_name, data_json, scope_conditions=None):
+        self.upserts.append((table_name, data_json, scope_conditions))
+        return True
+
+
+def make_technical(tables):
+    technical = DemandTechnical.__new__(DemandTechnical)
+    technical.code_name = "'GO1'"
+    technical.supabase = FakeSupabase(tables)
+    return technical
+
+
+def test_empty_demand_still_replaces_scope():
+    technical = make_technical({"submat_demand": pd.DataFrame(), "cutting_forecast": pd.DataFrame()})
+
+    assert technical.process_to_technical("'GO1','GO2'") is True
+    assert technical.supabase.upserts == [("dm_technical", [], """ "SC_NO" IN ('GO1','GO2') """)]
+
+
+def test_demand_grouped_per_code():
+    technical = make_technical({
+        "submat_demand": pd.DataFrame({"GO": ["GO1", "GO1"], "CODE_HQ": ["CA", "CA"], "TOTAL_SUB_USED": [1.0, 2.0]}),
+        "cutting_forecast": pd.DataFrame({"GO": ["GO1"], "CODE_CUSTOMS": ["CB"], "TOTAL_FB_USED": [4.0], "Plan_Cut_Qty": [10.0]}),
+    })
+
+    assert technical.process_to_technical("'GO1'") is True
+    (_, data_json, _), = technical.supabase.upserts
+    assert data_json == [
+        {"SC_NO": "GO1", "CODE_CUSTOMS": "CA", "TOTAL": 3.0, "TOTAL_PCS": 0.0},
+        {"SC_NO": "GO1", "CODE_CUSTOMS": "CB", "TOTAL": 4.0, "TOTAL_PCS": 10.0},
+    ]
@@ -0,0 +1,44 @@
+import re
+
+from database import freshness
+from database.freshness import PROBED_VIEWS, get_source_probes
+
+
+def group_by_clause(query):
+    return query[query.index("GROUP BY"):]
+
+
+def test_probes_are_built_lazily():
+    assert freshness._source_probes is None
+    assert sorted(get_source_probes()) == sorted(PROBED_VIEWS)
+    # Chưa đối chiếu cột với view: không giữ lại probe
+    assert freshness._source_probes is None
+
+
+def test_multi_key_probe_groups_by_derived_column():
+    for table_name in ["fabric_trans", "submat_trans", "submat_demand", "process_wip"]:
+        query, params = get_source_probes()[table_name].build_query("'GO1','GO2'")
+
+        # CASE có truy vấn con STRING_SPLIT chỉ nằm trong bảng dẫn xuất, GROUP BY theo cột bí danh
+        assert "CASE WHEN" in query
+        assert re.search(r"GROUP BY probe\.\[PROBE_KEY\]\s*$", query)
+        assert "SELECT" not in group_by_clause(query)
+        assert query.index("STRING_SPLIT") > query.index("FROM (")
+        assert params["codes"] == "GO1,GO2"
+
+
+def test_probe_aggregates_derived_columns():
+    query, params = get_source_probes()["fabric_trans"].build_query("'GO1'")
+
+    assert "MAX(probe.[PROBE_DATE]) AS [PROBE_LATEST]" in query
+    assert "SUM(probe.[PROBE_VALUE_0]) AS [PROBE_SUM_0]" in query
+    assert "[TRANS_DATE] >= :probe_since" in query
+    assert params["probe_since"] == freshness.month_windows(step_months=6, steps=3)[-1]
+
+
+def test_single_key_probe():
+    query, params = get_source_probes()["go_quantity"].build_query("'GO1'")
+
+    assert "CASE" not in query
+    assert "[Factory Code] = 'EHV'" in query
+    assert params["probe_since"] == freshness._year_windows()[-1]
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pandas as pd
+
+from database.freshness import FreshnessRegistry
+from database.high_water_mark import HighWaterMarkPlanner, SYNC_KEY, overlap_windows
+
+
+def test_overlap_windows_start_before_mark_day():
+    windows = overlap_windows({"GO1": ("2026-10-10 15:20:00", "T0009")}, 7)
+
+    assert windows == {"GO1": "2026-10-03 00:00:00"}
+
+
+def test_in_window_keeps_same_day_and_backdated_rows():
+    windows = overlap_windows({"GO1": ("2026-10-10 15:20:00", "T0009"), "GO2": ("2026-10-01 00:00:00", "")}, 2)
+    data = pd.DataFrame({
+        SYNC_KEY: ["go1", "GO1", "GO1", "GO2", "GO2"],
+        "TRANS_DATE": pd.to_datetime([
+            "2026-10-10 15:20:00",  # cùng giây với mốc, TRANS_CD nhỏ hơn
+            "2026-10-09 08:00:00",  # nhập lùi ngày
+            "2026-10-07 23:59:59",  # trước cửa sổ của GO1
+            "2026-09-29 00:00:00",
+            "2026-09-28 12:00:00",
+        ]),
+    })
+
+    result = HighWaterMarkPlanner.in_window(data, windows)
+
+    assert list(result.index) == [0, 1, 3]
+
+
+def test_marks_require_same_reference(tmp_path):
+    registry = FreshnessRegistry(path=str(tmp_path / "freshness.db"))
+    registry.save_marks("fabric_trans", {"GO1": ("2026-10-10 15:20:00", "T0009")}, full=True, reference="10:2")
+
+    assert registry.get_marks("fabric_trans", ["go1"], "10:2") == {"GO1": ("2026-10-10 15:20:00", "T0009")}
+    assert registry.get_marks("fabric_trans", ["GO1"], "12:2") == {}
+    assert registry.get_marks("fabric_trans", ["GO1"], None) == {}
+
+
+def test_marks_table_without_reference_column_is_migrated(tmp_path):
+    path = str(tmp_path / "freshness.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute('''
+            CREATE TABLE "high_water_marks" (
+                "table_name" TEXT NOT NULL, "code" TEXT NOT NULL, "trans_date" TEXT NOT NULL,
+                "trans_cd" TEXT NOT NULL, "full_at" REAL NOT NULL, "updated_at" REAL NOT NULL,
+                PRIMARY KEY ("table_name", "code")
+            )
+        ''')
+        conn.execute('INSERT INTO "high_water_marks" VALUES (\'fabric_trans\', \'GO1\', \'2026-10-10 15:20:00\', \'\', 9e12, 9e12)')
+
+    registry = FreshnessRegistry(path=path)
+
+    # Mốc cũ không biết đã ghép với phiên bản tham chiếu nào: lấy lại toàn bộ
+    assert registry.get_marks("fabric_trans", ["GO1"], "10:2") == {}
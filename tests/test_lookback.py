@@ -0,0 +1,50 @@
+import re
+from datetime import datetime
+
+from database.lookback import LookbackPlanner, month_windows
+
+
+def make_planner(key_columns):
+    return LookbackPlanner(
+        view="dbo.V_Fabric_Trans_Summary_EHV",
+        date_column="[TRANS_DATE]",
+        key_columns=key_columns,
+        windows=["2026-04-01", "2025-10-01", "2025-04-01"],
+    )
+
+
+def test_month_windows_step_back_from_month_start():
+    windows = month_windows(step_months=6, steps=3, today=datetime(2026, 10, 17))
+
+    assert windows == ["2026-04-01", "2025-10-01", "2025-04-01"]
+
+
+def test_month_windows_cross_several_years():
+    windows = month_windows(step_months=12, steps=3, today=datetime(2026, 2, 3))
+
+    assert windows == ["2025-02-01", "2024-02-01", "2023-02-01"]
+
+
+def test_partition_by_derived_key_column():
+    query, params = make_planner(["[SC_NO]", "[JO_NO]"]).build_query("'GO1','GO2'", columns="[QTY] AS [QTY]")
+
+    partition = re.search(r"PARTITION BY ([^)]*)\)", query).group(1)
+    # CASE có truy vấn con STRING_SPLIT chỉ nằm trong bảng dẫn xuất keyed
+    assert partition == "keyed.[LOOKBACK_KEY]"
+    assert "CASE WHEN [SC_NO] IN (SELECT" in query
+    assert query.index("CASE WHEN") > query.index(") AS [LOOKBACK_LATEST]")
+    assert "[TRANS_DATE] >= :lookback_2" in query
+    assert params == {
+        "codes": "GO1,GO2",
+        "lookback_0": "2026-04-01",
+        "lookback_1": "2025-10-01",
+        "lookback_2": "2025-04-01",
+    }
+
+
+def test_window_expression_picks_latest_window_with_data():
+    query, _ = make_planner(["[SC_NO]"]).build_query("'GO1'")
+
+    assert ("WHERE src.[LOOKBACK_DATE] >= CASE WHEN src.[LOOKBACK_LATEST] >= :lookback_0 THEN :lookback_0 "
+            "WHEN src.[LOOKBACK_LATEST] >= :lookback_1 THEN :lookback_1 ELSE :lookback_2 END") in query
+    assert "CASE WHEN [SC_NO]" not in query
@@ -0,0 +1,144 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from ui_setup.data_dmkt import cutting_forecast
+from ui_setup.data_dmkt.cutting_forecast import CuttingForecast
+from ui_setup.data_dmkt.mes_http import AspNetFormClient
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "cutting_forecast")
+PAGE_PATH = "/MesReports/Reports/CuttingForecast.aspx"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class FakeMesHandler(BaseHTTPRequestHandler):
+    """Trang CuttingForecast.aspx giả: GET trả form, POST kiểm tra trạng thái form rồi trả trang kết quả"""
+    def log_message(self, format, *args):
+        pass
+
+    def _page(self, result=""):
+        return (fixture("form.html")
+                .replace("{viewstate}", self.server.viewstate)
+                .replace("{eventvalidation}", self.server.eventvalidation)
+                .replace("{result}", result))
+
+    def _send(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.gets += 1
+        self._send(200, self._page())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        fields = {name: values[0] for name, values in parse_qs(body, keep_blank_values=True).items()}
+        self.server.posts.append((self.path, fields))
+        # ASP.NET từ chối postback mang trạng thái form cũ
+        if (fields.get("__VIEWSTATE") != self.server.viewstate
+                or fields.get("__EVENTVALIDATION") != self.server.eventvalidation):
+            self._send(500, "Invalid viewstate.")
+            return
+
+        go = fields["ctl00$Main$txtGO"]
+        result = fixture("empty.html" if go == "GO-EMPTY" else "result.html").replace("{go}", go)
+        self._send(200, self._page(result))
+
+
+@pytest.fixture
+def mes_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMesHandler)
+    server.viewstate, server.eventvalidation = "VS-1", "EV-1"
+    server.gets, server.posts = 0, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}{PAGE_PATH}?site=EHV"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_forecast(mes_server, monkeypatch):
+    client = AspNetFormClient(mes_server.url, timeout=5)
+    monkeypatch.setattr(cutting_forecast, "CUTTING_FORECAST_ENGINE", "http")
+    monkeypatch.setattr(cutting_forecast, "_mes_client", client)
+    forecast = CuttingForecast.__new__(CuttingForecast)
+    forecast.code_name = ""
+    forecast.go_report = []
+    yield forecast
+    client.close()
+
+
+def test_postback_round_trips_form_state(mes_server):
+    client = AspNetFormClient(mes_server.url, timeout=5)
+    try:
+        client.submit({"txtGO": "GO-1"}, "btnQuery")
+        client.submit({"txtGO": "GO-2"}, "btnQuery")
+    finally:
+        client.close()
+
+    # Form chỉ tải một lần, mỗi lần tìm chỉ POST lại
+    assert mes_server.gets == 1
+    (path, first), (_, second) = mes_server.posts
+    assert path == f"{PAGE_PATH}?site=EHV"
+    assert first["__VIEWSTATE"] == "VS-1"
+    assert first["__EVENTVALIDATION"] == "EV-1"
+    assert first["__VIEWSTATEGENERATOR"] == "6C7C0A8F"
+    assert first["ctl00$Main$txtGO"] == "GO-1"
+    assert first["ctl00$Main$ddlSite"] == "EHV"
+    assert first["ctl00$Main$btnQuery"] == "Query"
+    assert "ctl00$Main$btnExport" not in first
+    assert "ctl00$Main$chkClosed" not in first
+    assert second["ctl00$Main$txtGO"] == "GO-2"
+
+
+def test_expired_viewstate_reloads_form(mes_server):
+    client = AspNetFormClient(mes_server.url, timeout=5)
+    try:
+        client.submit({"txtGO": "GO-1"}, "btnQuery")
+        mes_server.viewstate = "VS-2"
+        html = client.submit({"txtGO": "GO-2"}, "btnQuery")
+    finally:
+        client.close()
+
+    assert "JO-0001" in html
+    assert mes_server.gets == 2
+    assert [fields["__VIEWSTATE"] for _, fields in mes_server.posts] == ["VS-1", "VS-1", "VS-2"]
+
+
+@pytest.mark.parametrize("use_lxml", [True, False])
+def test_fetch_go_parses_result_table(http_forecast, monkeypatch, use_lxml):
+    if not use_lxml:
+        monkeypatch.setattr(cutting_forecast, "lxml_html", None)
+
+    rows, info = http_forecast.fetch_go("GO-1")
+
+    assert info["STATUS"] == "ok"
+    assert info["ROWS"] == 2
+    assert rows[0] == {
+        "GO": "GO-1", "JO": "JO-0001", "Color": "NVY", "Color_Desc": "Navy",
+        "Order_QTY": 1200.0, "Per_OVER-Short_Allowed": "3%", "Over_Short_Per": "2.5%",
+        "OverShort_QTY": 30.0, "Plan_Cut_Qty": 1230.0,
+        "PPO_No": "PPO-77", "Marker_YY": 1.25, "PPO_YY": 1.3,
+    }
+    assert rows[1]["JO"] == "JO-0002"
+    assert rows[1]["OverShort_QTY"] == -8.0
+
+
+def test_fetch_go_empty_page(http_forecast):
+    rows, info = http_forecast.fetch_go("GO-EMPTY")
+
+    assert rows == []
+    assert info["STATUS"] == "no_data"
@@ -0,0 +1,85 @@
+import hashlib
+import re
+
+import pandas as pd
+
+from database.reference_mirror import ReferenceMirror
+
+
+class FakeSupabase:
+    """Bảng trims_list phía Supabase, chỉ hỗ trợ các điều kiện theo id mà bản sao dùng"""
+    def __init__(self, rows):
+        self.data = pd.DataFrame(rows)
+
+    def _filter(self, conditions):
+        if not conditions:
+            return self.data
+        op, value = re.search(r'"id" ([<>]=?) (\d+)', conditions).groups()
+        ids = self.data["id"] if not self.data.empty else pd.Series(dtype="int64")
+        mask = {">": ids > int(value), "<=": ids <= int(value)}[op]
+        return self.data[mask]
+
+    def get_data_paged(self, table_name, items, conditions=None):
+        data = self._filter(conditions)
+        return data[["id"]] if items.strip() == '"id"' else data.reset_index(drop=True)
+
+    def count_rows(self, table_name, conditions=None):
+        return len(self._filter(conditions))
+
+    def checksum_rows(self, table_name, conditions=None):
+        data = self._filter(conditions)
+        if data.empty:
+            return ""
+        return hashlib.md5(data.sort_values("id").to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def make_mirror(tmp_path, rows):
+    mirror = ReferenceMirror(path=str(tmp_path / "mirror.sqlite"), sync_interval=0, full_reload_interval=3600)
+    mirror.supabase = FakeSupabase(rows)
+    return mirror
+
+
+ROWS = [
+    {"id": 1, "THV_CODE": "BTN01", "CONVERT": 2.0},
+    {"id": 2, "THV_CODE": "LBL02", "CONVERT": 0.5},
+]
+
+
+def test_in_place_edit_reaches_mirror_and_version(tmp_path):
+    mirror = make_mirror(tmp_path, ROWS)
+    before = mirror.version("trims_list")
+
+    # Sửa tại chỗ từ process khác: id và số dòng không đổi
+    mirror.supabase.data.loc[mirror.supabase.data["id"] == 1, "CONVERT"] = 3.0
+
+    assert mirror.version("trims_list") != before
+    assert mirror.lookup("trims_list", "THV_CODE", ["BTN01"])["CONVERT"].tolist() == [3.0]
+
+
+def test_new_rows_are_appended_without_changing_old_range(tmp_path):
+    mirror = make_mirror(tmp_path, ROWS)
+    before = mirror.version("trims_list")
+
+    mirror.supabase.data = pd.concat([mirror.supabase.data, pd.DataFrame([{"id": 3, "THV_CODE": "ZIP03", "CONVERT": 1.0}])],
+                                     ignore_index=True)
+
+    assert mirror.version("trims_list") != before
+    assert mirror.count("trims_list") == 3
+    assert mirror.version("trims_list") == mirror.version("trims_list")
+
+
+def test_empty_remote_table(tmp_path):
+    mirror = make_mirror(tmp_path, [])
+
+    assert mirror.version("trims_list") is None
+    assert mirror.count("trims_list") == 0
+
+
+def test_remote_table_emptied_clears_mirror(tmp_path):
+    mirror = make_mirror(tmp_path, ROWS)
+    assert mirror.count("trims_list") == 2
+
+    mirror.supabase.data = pd.DataFrame()
+    mirror.sync("trims_list", force=True)
+
+    assert mirror.count("trims_list") == 0
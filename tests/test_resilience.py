@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from database import resilience
+from database.resilience import CircuitBreaker, CircuitOpenError, async_call_with_retry, call_with_retry
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """Mạch của nguồn "test" đã mở và hết reset_timeout (chờ lời gọi thử)"""
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    monkeypatch.setitem(resilience._breakers, "test", breaker)
+    return breaker
+
+
+def interrupted():
+    raise KeyboardInterrupt
+
+
+def test_only_one_probe_passes(half_open):
+    assert half_open.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        half_open.before_call()
+
+
+def test_interrupted_probe_releases_slot(half_open):
+    with pytest.raises(KeyboardInterrupt):
+        call_with_retry(interrupted, "test", retries=1)
+
+    assert half_open.probing is False
+    assert call_with_retry(lambda: "ok", "test", retries=1) == "ok"
+    assert half_open.state == "closed"
+
+
+def test_cancelled_async_probe_releases_slot(half_open):
+    async def cancelled():
+        raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(async_call_with_retry(cancelled, "test", retries=1))
+
+    assert half_open.probing is False
+
@@ -0,0 +1,28 @@
+import os
+import time
+
+import pandas as pd
+
+from database.snapshot_store import SAVED_AT, SnapshotStore
+
+
+def test_load_reports_oldest_save_time(tmp_path):
+    store = SnapshotStore(root=str(tmp_path), max_age=3600)
+    before = time.time()
+    store.save("cutting_forecast", ["GO1", "GO2"], pd.DataFrame({"GO": ["GO1", "GO2"], "QTY": [1, 2]}))
+
+    data = store.load("cutting_forecast", ["GO1", "GO2"])
+
+    assert sorted(data["GO"]) == ["GO1", "GO2"]
+    assert before <= data.attrs[SAVED_AT] <= time.time()
+
+
+def test_load_rejects_snapshot_older_than_max_age(tmp_path):
+    store = SnapshotStore(root=str(tmp_path), max_age=3600)
+    store.save("cutting_forecast", ["GO1"], pd.DataFrame({"GO": ["GO1"], "QTY": [1]}))
+    folder = store._dir("cutting_forecast", "GO1")
+    (version,) = store._versions(folder)
+    stale = f"{time.time_ns() - 2 * 3600 * 10**9}.pkl"
+    os.rename(os.path.join(folder, version), os.path.join(folder, stale))
+
+    assert store.load("cutting_forecast", ["GO1"]) is None
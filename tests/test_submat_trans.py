@@ -0,0 +1,38 @@
+import pandas as pd
+
+from ui_setup.data_dmtt.submat_trans import SubmatTrans
+
+
+def make_trims_list():
+    return pd.DataFrame({"id": [1, 2], "THV_CODE": ["BTN01", "LBL02"], "CONVERT": [2.0, 0.5]})
+
+
+def make_chunk(item_codes):
+    return pd.DataFrame({
+        "ITEM_CODE": item_codes,
+        "QTY": [-4.0] * len(item_codes),
+        "TRANS_DATE": pd.to_datetime(["2026-10-01 08:30:00"] * len(item_codes)),
+    })
+
+
+def test_transform_without_dotted_codes():
+    sync = SubmatTrans.__new__(SubmatTrans)
+    chunk = make_chunk(["BTN01", "LBL02"])
+
+    result = sync.transform(chunk, make_trims_list())
+
+    assert list(result["PRODUCT_CODE"]) == ["BTN01", "LBL02"]
+    assert list(result["SUB_CODE"]) == ["", ""]
+    assert list(result["TOTAL"]) == [8.0, 2.0]
+    assert list(result["TRANS_DATE"]) == ["2026-10-01 08:30:00"] * 2
+
+
+def test_transform_mixed_codes():
+    sync = SubmatTrans.__new__(SubmatTrans)
+    chunk = make_chunk(["BTN01.RED", "LBL02"])
+
+    result = sync.transform(chunk, make_trims_list())
+
+    assert list(result["PRODUCT_CODE"]) == ["BTN01", "LBL02"]
+    assert list(result["SUB_CODE"]) == ["RED", ""]
+    assert list(sync.reference_keys(chunk)) == ["BTN01", "LBL02"]
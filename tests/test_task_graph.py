@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from ui_setup.utils import task_graph
+from ui_setup.utils.task_graph import GraphStep, TaskGraph, clear_memo
+
+
+class FakeMirror:
+    def __init__(self):
+        self.versions = {"range_dm": "10:2:aaa"}
+
+    def version(self, table_name):
+        return self.versions.get(table_name)
+
+
+@pytest.fixture
+def mirror(monkeypatch):
+    fake = FakeMirror()
+    monkeypatch.setattr(task_graph, "get_reference_mirror", lambda: fake)
+    clear_memo()
+    yield fake
+    clear_memo()
+
+
+def make_graph(calls):
+    async def report():
+        calls.append("report")
+        return True
+
+    return TaskGraph([GraphStep("report", "Report", report, inputs=["range_dm"])])
+
+
+def test_memo_reused_while_inputs_unchanged(mirror):
+    calls = []
+    asyncio.run(make_graph(calls).run(["report"], ["GO1"]))
+    asyncio.run(make_graph(calls).run(["report"], ["go1"]))
+
+    assert calls == ["report"]
+
+
+def test_write_from_other_process_invalidates_memo(mirror):
+    calls = []
+    asyncio.run(make_graph(calls).run(["report"], ["GO1"]))
+
+    # range_dm bị sửa ngoài process này: số lần ghi cục bộ không đổi, chỉ phiên bản bản sao đổi
+    mirror.versions["range_dm"] = "10:2:bbb"
+    asyncio.run(make_graph(calls).run(["report"], ["GO1"]))
+
+    assert calls == ["report", "report"]
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from ui_setup.data_dmtt import trans_sync
+from ui_setup.data_dmtt.submat_trans import SubmatTrans
+from ui_setup.data_dmtt.trans_sync import TransSync
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.staged, self.commits = [], []
+
+    def stage_upsert(self, table_name, data_json, stage_id=None):
+        self.staged.extend(data_json)
+        return stage_id or "stage-1"
+
+    def commit_upsert(self, table_name, stage_id, scope_conditions=None):
+        self.commits.append((table_name, stage_id, scope_conditions))
+        return True
+
+
+class FakeMirror:
+    def __init__(self, reference):
+        self.reference = reference
+
+    def count(self, table_name):
+        return len(self.reference)
+
+    def lookup(self, table_name, column, values):
+        return self.reference[self.reference[column].isin(values)]
+
+
+def make_sync(monkeypatch, reference):
+    sync = SubmatTrans.__new__(SubmatTrans)
+    sync.supa_func = FakeSupabase()
+    monkeypatch.setattr(trans_sync, "get_reference_mirror", lambda: FakeMirror(reference))
+    return sync
+
+
+def make_chunk():
+    return pd.DataFrame({
+        "ITEM_CODE": ["BTN01.RED"],
+        "QTY": [2.0],
+        "TRANS_DATE": pd.to_datetime(["2026-10-01 08:30:00"]),
+    })
+
+
+TRIMS_LIST = pd.DataFrame({"id": [1], "THV_CODE": ["BTN01"], "CONVERT": [2.0]})
+
+
+def test_trans_sync_is_abstract():
+    with pytest.raises(TypeError):
+        TransSync("'GO1'")
+
+
+def test_empty_window_still_commits_scoped_delete(monkeypatch):
+    sync = make_sync(monkeypatch, TRIMS_LIST)
+
+    assert sync.upload(iter([]), ' "SC_NO" = \'GO1\' ', replace_empty=True) is True
+
+    (table_name, stage_id, scope), = sync.supa_func.commits
+    assert table_name == "submat_trans"
+    assert stage_id
+    assert scope == ' "SC_NO" = \'GO1\' '
+    assert sync.supa_func.staged == []
+
+
+def test_empty_source_without_replace_writes_nothing(monkeypatch):
+    sync = make_sync(monkeypatch, TRIMS_LIST)
+
+    assert sync.upload(iter([]), ' "SC_NO" = \'GO1\' ') is None
+    assert sync.supa_func.commits == []
+
+
+def test_empty_reference_table_is_a_failure(monkeypatch):
+    sync = make_sync(monkeypatch, TRIMS_LIST.iloc[0:0])
+
+    assert sync.upload(iter([make_chunk()]), ' "SC_NO" = \'GO1\' ', replace_empty=True) is False
+    assert sync.supa_func.commits == []
+
+
+def test_upload_stages_transformed_rows(monkeypatch):
+    sync = make_sync(monkeypatch, TRIMS_LIST)
+
+    assert sync.upload(iter([make_chunk()])) is True
+
+    assert [row["TOTAL"] for row in sync.supa_func.staged] == [4.0]
+    assert sync.supa_func.commits == [("submat_trans", "stage-1", None)]
@@ -1,6 +1,9 @@
 
 import pandas as pd
 from database.connect_supabase import SupabaseFunctions
+from ui_setup.components.dm_classifier import (
+    RANGE_COLUMNS, merge_range, classify_note, classify_check_dm, remark_actual
+)
 
 class DmActual:
     def __init__(self, code_name):
@@ -98,44 +101,24 @@ class DmActual:
             return
         
         # Merge để lấy MIN, MAX, CODE_NAME, RANGE cho từng CODE_CUSTOMS
-        df = df.merge(
-            range_dm[["CODE", "MIN", "MAX", "CODE_NAME", "RANGE"]],
-            left_on="CODE_CUSTOMS", right_on="CODE", how="left"
-        )
-
-        def check_note(row):
-            if pd.notnull(row["DEMAND_AT"]) and pd.notnull(row["MIN"]) and pd.notnull(row["MAX"]):
-                if row["MIN"] < row["DEMAND_AT"] < row["MAX"]:
-                    return row["CODE_NAME"]
-            return None
-
-        def check_dm(row):
-            # CHECK_DM: chỉ ghi "Không {row['RANGE']}" nếu NOTE bị thiếu
-            if pd.isnull(row["NOTE_AT"]) and row["DEMAND_AT"] > 0:
-                return f"Không {row['RANGE']}" if pd.notnull(row["RANGE"]) else None
-            
-            return None
-        
-        df["NOTE_AT"] = df.apply(lambda row: check_note(row), axis=1)
-        df["CHECK_DM_AT"] = df.apply(lambda row: check_dm(row), axis=1)
+        df = merge_range(df, range_dm)
 
-        df["REMARK_AT"] = ''
-        df.loc[df["CODE_CUSTOMS"].isnull() | (df["CODE_CUSTOMS"] == ""), "REMARK_AT"] = "GO không có CODE HQ"
-        df.loc[df["TOTAL_PCS_AT"] == 0, "REMARK_AT"] = "GO không có số lượng WIP"
+        # NOTE, CHECK_DM, REMARK tính theo cột (không chạy hàm Python từng dòng)
+        df["NOTE_AT"] = classify_note(df["DEMAND_AT"], df["MIN"], df["MAX"], df["CODE_NAME"])
+        df["CHECK_DM_AT"] = classify_check_dm(df["NOTE_AT"], df["DEMAND_AT"], df["RANGE"])
+        df["REMARK_AT"] = remark_actual(df["CODE_CUSTOMS"], df["TOTAL_PCS_AT"])
 
         # df = df.drop(columns=["id"])
-        df = df.drop(columns=["CODE","MIN", "MAX", "CODE_NAME", "RANGE"])
+        df = df.drop(columns=RANGE_COLUMNS)
 
         sc_nos = df["SC_NO"].unique().tolist()
         sc_nos_str = ','.join(f"'{sc_no}'" for sc_no in sc_nos)
 
-        if self.supa_func.delete_data("dm_actual",f'"SC_NO" IN ({sc_nos_str})'):
-            print("✅ Xoá dữ liệu cũ thành công")
+        # Ghi dòng mới/thay đổi và xóa dòng cũ trong cùng một transaction
+        if self.supa_func.upsert_data("dm_actual", df.to_dict(orient="records"), f'"SC_NO" IN ({sc_nos_str})'):
+            print("✅ Cập nhật dữ liệu dm_actual thành công")
+            return True
 
-            if self.supa_func.insert_data("dm_actual", df.to_dict(orient="records")):
-                print("✅ Cập nhật dữ liệu dm_actual thành công")
-                return True
-            
-            else:
-                print("❌ Cập nhật dữ liệu dm_actual thất bại")
-                return False
\ No newline at end of file
+        else:
+            print("❌ Cập nhật dữ liệu dm_actual thất bại")
+            return False
\ No newline at end of file
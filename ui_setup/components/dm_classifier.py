@@ -0,0 +1,199 @@
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+# Các cột lấy từ range_dm khi ghép theo CODE_CUSTOMS
+RANGE_COLUMNS = ["CODE", "MIN", "MAX", "CODE_NAME", "RANGE"]
+
+# Mã bắt buộc của mỗi GO, xếp theo alphabet: bit i <=> REQUIRED_CODES[i], nhãn ghép theo thứ tự bit đã được sắp
+REQUIRED_CODES = ("CA", "CST", "IN", "PB", "THR", "W-FAB")
+ALL_REQUIRED = (1 << len(REQUIRED_CODES)) - 1
+# Lookahead để bắt cả các mã chồng lên nhau trong cùng CODE_CUSTOMS (quét chuỗi một lần)
+_REQUIRED_PATTERN = re.compile("(?=(" + "|".join(re.escape(code) for code in REQUIRED_CODES) + "))")
+_MASK_LABELS = [
+    ", ".join(code for bit, code in enumerate(REQUIRED_CODES) if mask >> bit & 1) for mask in range(ALL_REQUIRED + 1)
+]
+
+def merge_range(df: pd.DataFrame, range_dm: pd.DataFrame) -> pd.DataFrame:
+    """Ghép MIN, MAX, CODE_NAME, RANGE cho từng CODE_CUSTOMS"""
+    return df.merge(range_dm[RANGE_COLUMNS], left_on="CODE_CUSTOMS", right_on="CODE", how="left")
+
+def classify_note(demand: pd.Series, range_min: pd.Series, range_max: pd.Series, code_name: pd.Series) -> pd.Series:
+    """NOTE: CODE_NAME nếu MIN < DEMAND < MAX, ngược lại None"""
+    in_range = demand.notna() & range_min.notna() & range_max.notna() & (range_min < demand) & (demand < range_max)
+    return pd.Series(np.select([in_range], [code_name.to_numpy(dtype=object)], default=None), index=demand.index, dtype=object)
+
+def classify_check_dm(note: pd.Series, demand: pd.Series, range_text: pd.Series) -> pd.Series:
+    """CHECK_DM: "Không {RANGE}" khi không có NOTE và DEMAND > 0 (RANGE rỗng thì None)"""
+    missing = note.isna() & (demand > 0) & range_text.notna()
+    message = ("Không " + range_text.astype(str)).to_numpy(dtype=object)
+    return pd.Series(np.select([missing], [message], default=None), index=note.index, dtype=object)
+
+def remark_technical(note: pd.Series, check_dm: pd.Series, demand: pd.Series,
+                     code_customs: pd.Series, missing_label: pd.Series) -> pd.Series:
+    """
+    REMARK của dm_technical, theo thứ tự ưu tiên:
+    không NOTE và không CHECK_DM; DEMAND = 0 với CB/CST; GO thiếu mã bắt buộc (missing_label khác rỗng)
+    """
+    codes = code_customs.astype("object")
+    no_check = note.isna() & check_dm.isna()
+    no_ca = (demand == 0) & (codes.str.startswith("CB", na=False) | codes.str.startswith("CST", na=False))
+    missing = missing_label.fillna("").ne("") & codes.ne("")
+    choices = [
+        "Kiểm lại PPO_No hoặc Product_code",
+        "GO không có CA để tính CB và CST",
+        ("GO thiếu: " + missing_label.fillna("")).to_numpy(dtype=object),
+    ]
+    return pd.Series(np.select([no_check, no_ca, missing], choices, default=None), index=note.index, dtype=object)
+
+def remark_actual(code_customs: pd.Series, total_pcs: pd.Series) -> pd.Series:
+    """REMARK của dm_actual: thiếu WIP được ưu tiên hơn thiếu CODE HQ"""
+    no_wip = total_pcs == 0
+    no_code = code_customs.isna() | (code_customs.astype("object") == "")
+    return pd.Series(
+        np.select([no_wip, no_code], ["GO không có số lượng WIP", "GO không có CODE HQ"], default=""),
+        index=code_customs.index, dtype=object
+    )
+
+def required_code_bits(code_customs: pd.Series) -> pd.Series:
+    """Bitmask các mã bắt buộc xuất hiện (dạng chuỗi con) trong từng CODE_CUSTOMS"""
+    # Chỉ quét các giá trị khác nhau rồi map ngược lại từng dòng
+    codes = pd.Series(code_customs.dropna().astype(str).unique(), dtype=object)
+    bits = pd.Series(0, index=codes, dtype="int64")
+    if not codes.empty:
+        found = codes.str.extractall(_REQUIRED_PATTERN)[0]
+        if not found.empty:
+            weights = found.map({code: 1 << bit for bit, code in enumerate(REQUIRED_CODES)})
+            per_code = weights.groupby(level=0).agg(np.bitwise_or.reduce)
+            bits.iloc[per_code.index] = per_code.to_numpy()
+    return code_customs.map(bits).fillna(0).astype("int64")
+
+def missing_code_mask(sc_no: pd.Series, code_customs: pd.Series) -> pd.Series:
+    """Bitmask mã bắt buộc còn thiếu của từng SC_NO (index là SC_NO)"""
+    bits = required_code_bits(code_customs).to_numpy()
+    flags = pd.DataFrame({code: (bits >> bit & 1).astype(bool) for bit, code in enumerate(REQUIRED_CODES)})
+    found = flags.groupby(sc_no.to_numpy()).any()
+    weights = 1 << np.arange(len(REQUIRED_CODES))
+    return pd.Series((~found.to_numpy() * weights).sum(axis=1), index=found.index, dtype="int64")
+
+def missing_code_label(sc_no: pd.Series, code_customs: pd.Series) -> pd.Series:
+    """Danh sách mã còn thiếu của GO trên từng dòng ("CA, PB"), "" nếu đủ hoặc không có SC_NO"""
+    labels = missing_code_mask(sc_no, code_customs).map(_MASK_LABELS.__getitem__)
+    return sc_no.map(labels).fillna("").astype(object)
+
+def _legacy_missing(df: pd.DataFrame) -> dict:
+    """Cách tìm mã thiếu cũ (lặp mã bắt buộc x CODE_CUSTOMS trong groupby.apply), chỉ dùng cho benchmark"""
+    required_codes = set(REQUIRED_CODES)
+
+    def find_codes_in_row(codes):
+        found = set()
+        for req in required_codes:
+            for code in codes:
+                if pd.notnull(code) and req in str(code):
+                    found.add(req)
+        return found
+
+    go_codes = df.groupby("SC_NO")["CODE_CUSTOMS"].apply(lambda codes: find_codes_in_row(codes))
+    return go_codes.apply(lambda found: required_codes - found).to_dict()
+
+def _legacy_technical(df: pd.DataFrame, missing_dict: dict) -> pd.DataFrame:
+    """Cách tính cũ theo từng dòng (df.apply), chỉ dùng để đối chiếu trong benchmark"""
+    def check_note(row):
+        if pd.notnull(row["DEMAND"]) and pd.notnull(row["MIN"]) and pd.notnull(row["MAX"]):
+            if row["MIN"] < row["DEMAND"] < row["MAX"]:
+                return row["CODE_NAME"]
+        return None
+
+    def check_dm(row):
+        if pd.isnull(row["NOTE"]) and row["DEMAND"] > 0:
+            return f"Không {row['RANGE']}" if pd.notnull(row["RANGE"]) else None
+        return None
+
+    def remark_dm(row):
+        miss = missing_dict.get(row["SC_NO"], set())
+        if pd.isnull(row["NOTE"]) and pd.isnull(row["CHECK_DM"]):
+            return "Kiểm lại PPO_No hoặc Product_code"
+        elif row["DEMAND"] == 0 and (row["CODE_CUSTOMS"].startswith("CB") or row["CODE_CUSTOMS"].startswith("CST")):
+            return "GO không có CA để tính CB và CST"
+        elif miss and row["CODE_CUSTOMS"] != '':
+            return f"GO thiếu: {', '.join(sorted(miss))}"
+        return None
+
+    result = df.copy()
+    result["NOTE"] = result.apply(check_note, axis=1)
+    result["CHECK_DM"] = result.apply(check_dm, axis=1)
+    result["REMARK"] = result.apply(remark_dm, axis=1)
+    return result
+
+def _sample_data(rows: int, seed: int = 0):
+    """Dữ liệu giả lập dm_technical + range_dm cho benchmark"""
+    rng = np.random.default_rng(seed)
+    codes = np.array(["CA", "CB", "CST", "CST-1", "IN", "THR", "PB", "W-FAB", "LB", "BT", "CAINTHR", ""])
+    range_dm = pd.DataFrame({
+        "CODE": codes[:-1],
+        "MIN": rng.uniform(0, 1, len(codes) - 1),
+        "MAX": rng.uniform(1, 3, len(codes) - 1),
+        "CODE_NAME": [f"Định mức {code}" for code in codes[:-1]],
+        "RANGE": [f"trong khoảng {code}" for code in codes[:-1]],
+    })
+    range_dm.loc[3, ["MIN", "MAX"]] = np.nan
+    range_dm.loc[4, "RANGE"] = None
+
+    df = pd.DataFrame({
+        "SC_NO": [f"S24M{i:05d}" for i in rng.integers(0, rows // 8 + 1, rows)],
+        "CODE_CUSTOMS": rng.choice(codes, rows),
+        "DEMAND": rng.uniform(-0.5, 3.5, rows).round(3),
+    })
+    df.loc[rng.random(rows) < 0.05, "DEMAND"] = 0.0
+    df.loc[rng.random(rows) < 0.02, "DEMAND"] = np.nan
+    return merge_range(df, range_dm)
+
+if __name__ == "__main__":
+    # Benchmark: python -m ui_setup.components.dm_classifier [số dòng]
+    import sys
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    df = _sample_data(rows)
+    start = time.perf_counter()
+    missing_dict = _legacy_missing(df)
+    legacy_missing_label = df["SC_NO"].map({sc_no: ", ".join(sorted(miss)) for sc_no, miss in missing_dict.items()})
+    legacy_missing_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    missing_label = missing_code_label(df["SC_NO"], df["CODE_CUSTOMS"])
+    missing_seconds = time.perf_counter() - start
+
+    same = legacy_missing_label.fillna("").tolist() == missing_label.tolist()
+    print(f"{'✅' if same else '❌'} Mã thiếu theo SC_NO giống cách tính cũ: {same}")
+    print(f"📊 {rows} dòng: groupby.apply {legacy_missing_seconds:.2f}s, regex + bitmask {missing_seconds:.3f}s "
+          f"(nhanh hơn {legacy_missing_seconds / max(missing_seconds, 1e-9):.0f} lần)")
+
+    start = time.perf_counter()
+    legacy = _legacy_technical(df, missing_dict)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    note = classify_note(df["DEMAND"], df["MIN"], df["MAX"], df["CODE_NAME"])
+    check_dm = classify_check_dm(note, df["DEMAND"], df["RANGE"])
+    remark = remark_technical(note, check_dm, df["DEMAND"], df["CODE_CUSTOMS"], missing_label)
+    vector_seconds = time.perf_counter() - start
+
+    for name, result in [("NOTE", note), ("CHECK_DM", check_dm), ("REMARK", remark)]:
+        # So sánh giá trị (df.apply có thể suy ra dtype khác object)
+        expected = legacy[name]
+        same_nulls = expected.isna().equals(result.isna())
+        same_values = expected[expected.notna()].tolist() == result[result.notna()].tolist()
+        print(f"{'✅' if same_nulls and same_values else '❌'} {name} giống cách tính cũ: {same_nulls and same_values}")
+
+    df_actual = df.rename(columns={"DEMAND": "DEMAND_AT"})
+    df_actual["TOTAL_PCS_AT"] = np.where(np.arange(rows) % 7 == 0, 0, 100)
+    expected = pd.Series('', index=df_actual.index, dtype=object)
+    expected[df_actual["CODE_CUSTOMS"].isnull() | (df_actual["CODE_CUSTOMS"] == "")] = "GO không có CODE HQ"
+    expected[df_actual["TOTAL_PCS_AT"] == 0] = "GO không có số lượng WIP"
+    same = expected.equals(remark_actual(df_actual["CODE_CUSTOMS"], df_actual["TOTAL_PCS_AT"]))
+    print(f"{'✅' if same else '❌'} REMARK_AT giống cách tính cũ: {same}")
+
+    print(f"📊 {rows} dòng: df.apply {legacy_seconds:.2f}s, vector {vector_seconds:.3f}s "
+          f"(nhanh hơn {legacy_seconds / max(vector_seconds, 1e-9):.0f} lần)")
@@ -2,6 +2,9 @@ import pandas as pd
 from database.connect_supabase import SupabaseFunctions
 from ui_setup.data_dmkt.cutting_forecast import CuttingForecast
 from ui_setup.data_dmkt.get_dmsm_sql import DemandSM
+from ui_setup.components.dm_classifier import (
+    RANGE_COLUMNS, merge_range, classify_note, classify_check_dm, remark_technical, missing_code_label
+)
 
 class DemandTechnical():
     def __init__ (self, code_name):
@@ -22,7 +25,11 @@ class DemandTechnical():
 
             if df_demand.empty:
                 print("❌ Không tìm thấy dữ liệu technical_demand")
-                return
+                # Vẫn thay phạm vi các GO (chỉ xóa): dòng technical của GO không còn demand phải bị bỏ
+                if self.supabase.upsert_data("dm_technical", [], f' "SC_NO" IN ({code_str}) ') == False:
+                    print("❌ Lỗi khi xóa dữ liệu dm_technical")
+                    return False
+                return True
             
             df_demand["TOTAL"] = df_demand["TOTAL"].fillna(0)
             df_demand["CODE_CUSTOMS"] = df_demand["CODE_CUSTOMS"].fillna("")
@@ -30,12 +37,16 @@ class DemandTechnical():
             
             df_group = df_demand.groupby(["SC_NO", "CODE_CUSTOMS"]).agg(TOTAL=("TOTAL", "sum"), TOTAL_PCS=("TOTAL_PCS", "sum")).reset_index()
 
-            if self.supabase.insert_data("dm_technical", df_group.to_dict('records')) == False:
+            # Ghi dòng mới/thay đổi và xóa dòng cũ của các GO trong cùng một transaction
+            if self.supabase.upsert_data("dm_technical", df_group.to_dict('records'), f' "SC_NO" IN ({code_str}) ') == False:
                 print("❌ Lỗi khi đưa dữ liệu sang dm_technical")
-                return
+                return False
+
+            return True
 
         except Exception as e:
             print(f"❌ Lỗi process_to_technical: {e}")
+            return False
 
     def process_submat_demand(self):
         try:
@@ -152,67 +163,20 @@ class DemandTechnical():
                 return
 
             # Merge để lấy MIN, MAX, CODE_NAME, RANGE cho từng CODE_CUSTOMS
-            df = df.merge(
-                range_dm[["CODE", "MIN", "MAX", "CODE_NAME", "RANGE"]],
-                left_on="CODE_CUSTOMS", right_on="CODE", how="left"
-            )
+            df = merge_range(df, range_dm)
 
-            def check_note(row):
-                if pd.notnull(row["DEMAND"]) and pd.notnull(row["MIN"]) and pd.notnull(row["MAX"]):
-                    if row["MIN"] < row["DEMAND"] < row["MAX"]:
-                        return row["CODE_NAME"]
-                return None
-
-            # Tính NOTE
-            df["NOTE"] = df.apply(lambda row: check_note(row), axis=1)
-
-            required_codes = {"CA", "CST", "IN", "THR", "PB", "W-FAB"}
-
-            # Tạo hàm kiểm tra xuất hiện bất kỳ chuỗi nào trong required_codes
-            def find_codes_in_row(codes):
-                found = set()
-                for req in required_codes:
-                    for code in codes:
-                        if pd.notnull(code) and req in str(code):
-                            found.add(req)
-                return found
-
-            # Lấy các CODE_CUSTOMS thực tế xuất hiện cho từng SC_NO (theo logic mới)
-            go_codes = df.groupby("SC_NO")["CODE_CUSTOMS"].apply(lambda codes: find_codes_in_row(codes))
-
-            # Tìm các code còn thiếu
-            missing_codes = go_codes.apply(lambda found: required_codes - found)
-
-            # Tạo dict tra cứu GO thiếu CODE_CUSTOMS
-            missing_dict = missing_codes.to_dict()
-
-            def check_dm(row):
-                # CHECK_DM: chỉ ghi "Không {row['RANGE']}" nếu NOTE bị thiếu
-                if pd.isnull(row["NOTE"]) and row["DEMAND"] > 0:
-                    return f"Không {row['RANGE']}" if pd.notnull(row["RANGE"]) else None
-                
-                return None
-            
-            def remark_dm(row, missing_dict):
-                miss = missing_dict.get(row["SC_NO"], set())
-                # REMARK: chỉ ghi GO thiếu hoặc thiếu nếu miss không rỗng
-                if pd.isnull(row["NOTE"]) and pd.isnull(row["CHECK_DM"]):
-                    return "Kiểm lại PPO_No hoặc Product_code"
-                
-                elif row["DEMAND"] == 0 and (row["CODE_CUSTOMS"].startswith("CB") or row["CODE_CUSTOMS"].startswith("CST")):
-                    return "GO không có CA để tính CB và CST"
-                
-                elif miss and row["CODE_CUSTOMS"] != '':
-                    return f"GO thiếu: {', '.join(sorted(miss))}"               
-
-                return None
-
-            df["CHECK_DM"] = df.apply(check_dm, axis=1)
-            df["REMARK"] = df.apply(lambda row: remark_dm(row, missing_dict), axis=1)
+            # Tính NOTE theo cột
+            df["NOTE"] = classify_note(df["DEMAND"], df["MIN"], df["MAX"], df["CODE_NAME"])
+
+            # Mã bắt buộc còn thiếu của từng GO ("" nếu đủ), quét CODE_CUSTOMS một lần bằng regex nhiều mẫu
+            missing_label = missing_code_label(df["SC_NO"], df["CODE_CUSTOMS"])
+
+            df["CHECK_DM"] = classify_check_dm(df["NOTE"], df["DEMAND"], df["RANGE"])
+            df["REMARK"] = remark_technical(df["NOTE"], df["CHECK_DM"], df["DEMAND"], df["CODE_CUSTOMS"], missing_label)
 
             df = df.drop(columns=["id"])
             
-            df = df.drop(columns=["CODE","MIN", "MAX", "CODE_NAME", "RANGE"])
+            df = df.drop(columns=RANGE_COLUMNS)
 
             # pdate lại lên supabase
             update_cols = ["NOTE", "CHECK_DM", "REMARK"]
@@ -231,10 +195,9 @@ class DemandTechnical():
         self.process_submat_demand()
         self.process_fabric_demand()
 
-        if self.supabase.delete_data("dm_technical", f' "SC_NO" IN ({code_str}) '):
-            self.process_to_technical(code_str)
+        if self.process_to_technical(code_str):
             self.process_update_technical()
             return True
         else:
-            print("❌ Lỗi khi xóa dữ liệu dm_technical")
+            print("❌ Lỗi khi cập nhật dữ liệu dm_technical")
             return False
\ No newline at end of file
@@ -0,0 +1,113 @@
+import atexit
+import queue
+import threading
+import traceback
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.edge.options import Options
+
+from settings.config import BROWSER_POOL_SIZE
+
+def create_driver():
+    """Edge headless, tắt log"""
+    options = Options()
+    options.add_argument('--headless')  # Ẩn trình duyệt
+    options.add_argument('--disable-gpu')
+    options.add_argument('--log-level=3')
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    return webdriver.Edge(options=options)
+
+class BrowserPool:
+    """
+    Tối đa size trình duyệt sống lâu, dùng lại giữa các GO và giữa các lần lấy dữ liệu
+    thay vì mở/đóng Edge cho từng GO. Trình duyệt bị lỗi được đóng và tạo lại ở lần mượn sau
+    """
+    def __init__(self, size: int = BROWSER_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        driver = self._take()
+        broken = False
+        try:
+            yield driver
+        except TimeoutException:
+            # Trang chậm, trình duyệt vẫn dùng được
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            if broken:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+
+    def _take(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    return create_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            # Đủ số trình duyệt: chờ trình duyệt khác được trả lại (hoặc bị hủy để tạo mới)
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def close(self):
+        """Đóng các trình duyệt đang rảnh (khi tắt ứng dụng)"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool() -> BrowserPool:
+    """Pool dùng chung cho cả process"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(close_browser_pool)
+        return _pool
+
+def close_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            try:
+                _pool.close()
+            except Exception:
+                print(traceback.format_exc())
+            _pool = None
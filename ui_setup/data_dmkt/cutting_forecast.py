@@ -1,110 +1,255 @@
 import flet as ft
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+import threading
 import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from bs4 import BeautifulSoup
-from selenium.webdriver.edge.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+try:
+    # Parser C nhanh hơn nhiều so với html.parser thuần Python
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
 
+from settings.config import (
+    MES_BASE_URL, CUTTING_FORECAST_ENGINE, CUTTING_FORECAST_HTTP_WORKERS,
+    BROWSER_POOL_SIZE, CUTTING_FORECAST_WAIT_TIMEOUT, CUTTING_FORECAST_NO_DATA_TEXT
+)
 from database.connect_supabase import SupabaseFunctions
+from ui_setup.data_dmkt.browser_pool import get_browser_pool
+from ui_setup.data_dmkt.mes_http import AspNetFormClient
+
+CUTTING_FORECAST_URL = f"{MES_BASE_URL}/Reports/CuttingForecast.aspx?site=EHV"
+
+# Số lần thử lại một GO khi trình duyệt lỗi (trình duyệt lỗi được thay bằng trình duyệt mới)
+GO_RETRIES = 2
+
+# Trạng thái GO đã lấy được trọn vẹn (có bảng dữ liệu hoặc trang báo rõ không có dữ liệu):
+# chỉ các GO này được thay dữ liệu cũ trên Supabase
+FETCHED_STATUSES = ("ok", "no_data")
+
+RESULT_TABLE_SELECTOR = "table.ThinBorderTable"
+# Phần tử (không phải script) có nội dung đúng bằng thông báo không có dữ liệu
+NO_DATA_XPATH = (
+    f'//*[not(self::script) and not(self::style)][normalize-space(text()) = "{CUTTING_FORECAST_NO_DATA_TEXT}"]'
+)
+
+def has_no_data_marker(html):
+    """
+    Trang kết quả báo rõ GO không có dữ liệu: đã có bảng ThinBorderTable đầu (thông tin GO)
+    nhưng không có bảng chi tiết, và có phần tử hiển thị đúng thông báo CUTTING_FORECAST_NO_DATA_TEXT
+    (trang form chưa query hay chữ trong script không tính)
+    """
+    if lxml_html is not None:
+        doc = lxml_html.fromstring(html)
+        tables = doc.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " ThinBorderTable ")]')
+        markers = doc.xpath(NO_DATA_XPATH)
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+        tables = soup.find_all("table", class_="ThinBorderTable")
+        markers = [
+            tag for tag in soup.find_all(string=lambda text: text.strip() == CUTTING_FORECAST_NO_DATA_TEXT)
+            if tag.parent.name not in ("script", "style")
+        ]
+    return 1 <= len(tables) < 3 and len(markers) > 0
+
+def thin_border_rows(html):
+    """
+    Text các ô theo từng dòng (bỏ dòng header) của bảng ThinBorderTable thứ 3 (bảng chi tiết),
+    None nếu trang không có bảng dữ liệu. Dùng lxml nếu có, không thì BeautifulSoup
+    """
+    if lxml_html is not None:
+        doc = lxml_html.fromstring(html)
+        tables = doc.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " ThinBorderTable ")]')
+        if len(tables) < 3:
+            return None
+        rows = list(tables[2].iter("tr"))[1:]
+        return [[td.text_content().strip() for td in row.iter("td")] for row in rows]
+
+    soup = BeautifulSoup(html, 'html.parser')
+    tables = soup.find_all("table", class_="ThinBorderTable")
+    if len(tables) < 3:
+        return None
+    rows = tables[2].find_all("tr")[1:]
+    return [[td.text.strip() for td in row.find_all("td")] for row in rows]
+
+def parse_cutting_forecast(html, input_go):
+    """Các dòng dữ liệu Cutting Forecast của một GO, None nếu trang không có bảng dữ liệu"""
+    rows = thin_border_rows(html)
+    if rows is None:
+        return None
+
+    data = []
+    for cols in rows:
+        if len(cols) >= 8:
+            data.append({
+                "GO": input_go,
+                "JO": cols[0],
+                "Color": cols[1],
+                "Color_Desc": cols[2],
+                "Order_QTY": float(cols[3]),
+                "Per_OVER-Short_Allowed": str(cols[4]),
+                "Over_Short_Per": str(cols[5]),
+                "OverShort_QTY": float(cols[6]),
+                "Plan_Cut_Qty": float(cols[7]),
+                "PPO_No": cols[-3],
+                "Marker_YY": float(cols[-2]),
+                "PPO_YY": float(cols[-1])
+            })
+    return data
+
+def write_go_report(report, path: str = "GO_remaining.xlsx"):
+    """
+    GO_remaining.xlsx: sheet GO_remaining gồm các GO không có dữ liệu hoặc bị lỗi,
+    sheet timing gồm thời gian và kết quả của từng GO
+    """
+    df_report = pd.DataFrame(report, columns=["SC_NO", "STATUS", "ROWS", "SECONDS", "ATTEMPTS", "ERROR"])
+    df_remaining = df_report[df_report["STATUS"] != "ok"]
+    if df_remaining.empty:
+        return
+    with pd.ExcelWriter(path) as writer:
+        df_remaining.to_excel(writer, sheet_name="GO_remaining", index=False)
+        df_report.to_excel(writer, sheet_name="timing", index=False)
+
+_mes_client = None
+_mes_client_lock = threading.Lock()
+
+def get_mes_client() -> AspNetFormClient:
+    """Client HTTP dùng chung cho engine "http" """
+    global _mes_client
+    with _mes_client_lock:
+        if _mes_client is None:
+            _mes_client = AspNetFormClient(CUTTING_FORECAST_URL, CUTTING_FORECAST_WAIT_TIMEOUT)
+        return _mes_client
 
 class CuttingForecast:
     def __init__(self, code_name):
         self.supa_func = SupabaseFunctions()
         self.code_name = code_name
-    
+        # Thời gian/kết quả của từng GO ở lần lấy gần nhất
+        self.go_report = []
+
+    def query_go(self, driver, input_go):
+        """Gửi form tìm kiếm một GO và chờ trang kết quả tải xong thay vì sleep cố định"""
+        driver.get(CUTTING_FORECAST_URL)
+        wait = WebDriverWait(driver, CUTTING_FORECAST_WAIT_TIMEOUT)
+
+        # Nhập giá trị tìm kiếm
+        txt_go = wait.until(EC.presence_of_element_located((By.ID, "txtGO")))
+        txt_go.clear()
+        txt_go.send_keys(input_go)
+        btn_query = driver.find_element(By.ID, "btnQuery")
+
+        old_tables = driver.find_elements(By.CSS_SELECTOR, RESULT_TABLE_SELECTOR)
+        old_markers = driver.find_elements(By.XPATH, NO_DATA_XPATH)
+        btn_query.click()
+
+        def result_ready(d):
+            """Bảng chi tiết mới đã hiện hoặc trang mới báo không có dữ liệu (postback tải lại trang hay chỉ một phần)"""
+            tables = d.find_elements(By.CSS_SELECTOR, RESULT_TABLE_SELECTOR)
+            if len(tables) >= 3 and tables[2] not in old_tables:
+                return True
+            return any(marker not in old_markers for marker in d.find_elements(By.XPATH, NO_DATA_XPATH))
+
+        wait.until(result_ready)
+        return driver.page_source
+
+    def fetch_html(self, input_go):
+        """HTML trang kết quả của một GO theo engine cấu hình (CUTTING_FORECAST_ENGINE)"""
+        if CUTTING_FORECAST_ENGINE == "http":
+            return get_mes_client().submit({"txtGO": input_go}, "btnQuery")
+        with get_browser_pool().acquire() as driver:
+            return self.query_go(driver, input_go)
+
+    def fetch_go(self, input_go):
+        """Lấy dữ liệu một GO, trả về (dòng dữ liệu, thông tin thời gian/lỗi)"""
+        start = time.perf_counter()
+        info = {"SC_NO": input_go, "STATUS": "ok", "ROWS": 0, "SECONDS": 0.0, "ATTEMPTS": 0, "ERROR": ""}
+        rows = []
+
+        for attempt in range(GO_RETRIES):
+            info["ATTEMPTS"] = attempt + 1
+            try:
+                html = self.fetch_html(input_go)
+                parsed = parse_cutting_forecast(html, input_go)
+                if parsed is None and has_no_data_marker(html):
+                    info["STATUS"] = "no_data"
+                    print(f"✅ GO {input_go} không có dữ liệu cutting forecast")
+                elif parsed is None:
+                    # Không có bảng cũng không có thông báo rỗng: không chắc GO rỗng, giữ dữ liệu cũ
+                    info["STATUS"] = "no_table"
+                    print(f"❌ Không tìm thấy bảng dữ liệu cho GO: {input_go}")
+                else:
+                    rows = parsed
+                    info["ROWS"] = len(rows)
+                info["ERROR"] = ""
+                break
+            except (TimeoutException, httpx.TimeoutException):
+                info["STATUS"], info["ERROR"] = "timeout", f"Quá {CUTTING_FORECAST_WAIT_TIMEOUT}s chờ trang kết quả"
+                break
+            except (WebDriverException, httpx.HTTPError) as e:
+                # Trình duyệt lỗi đã bị thay / lỗi kết nối: thử lại
+                info["STATUS"], info["ERROR"] = "error", (str(e).strip() or type(e).__name__).split("\n")[0]
+            except Exception as e:
+                info["STATUS"], info["ERROR"] = "error", str(e)
+                break
+
+        info["SECONDS"] = round(time.perf_counter() - start, 2)
+        if info["STATUS"] not in FETCHED_STATUSES + ("no_table",):
+            print(f"❌ Lỗi khi lấy dữ liệu GO {input_go}: {info['ERROR']}")
+        return rows, info
+
     def get_data_web(self):
+        self.go_report = []
         try:
             
             code_str = self.code_name
-            
-            # ========== Lấy danh sách GO từ Supabase ==========
-            if self.supa_func.delete_data("cutting_forecast", f' "GO" IN ({code_str}) OR "JO" IN ({code_str}) ') == True:
-                print("✅ Đã xóa dữ liệu cutting forecast")
-            else:
-                print("❌ Lỗi khi xóa dữ liệu cutting forecast")
-                return
-            
-            data = []
-            data_remaining = []
-            # ========== Lặp qua từng GO ==========
-            for idx, input_go in enumerate(code_str.replace("'", "").split(",")):
-                options = Options()
-                options.add_argument('--headless')  # Ẩn trình duyệt
-                options.add_argument('--disable-gpu')
-                options.add_argument('--log-level=3')
-                options.add_experimental_option('excludeSwitches', ['enable-logging'])
-
-                # ========== Truy cập Web & Lấy HTML ==========
-                driver = webdriver.Edge(options=options)
-                driver.get("http://192.168.155.16/MesReports/Reports/CuttingForecast.aspx?site=EHV")
-
-                # Nhập giá trị tìm kiếm
-                driver.find_element(By.ID, "txtGO").clear()
-                driver.find_element(By.ID, "txtGO").send_keys(input_go)
-                driver.find_element(By.ID, "btnQuery").click()
-
-                # Chờ web tải dữ liệu
-                time.sleep(3)
-
-                # Lấy source HTML sau khi web load xong
-                html = driver.page_source
-                driver.quit()
-
-                # ========== Phân tích HTML để lấy bảng ==========
-                soup = BeautifulSoup(html, 'html.parser')
-
-                # Lấy bảng thứ 2 (theo yêu cầu)
-                tables = soup.find_all("table", class_="ThinBorderTable")
-                if len(tables) < 3:
-                    data_remaining.append({"SC_NO":input_go})
-                    print(f"❌ Không tìm thấy bảng dữ liệu cho GO: {input_go}")
-                    continue
-
-                target_table = tables[2]  # Bảng chứa dữ liệu chi tiết
-
-                rows = target_table.find_all("tr")[1:]  # Bỏ dòng header
-                
-                for row in rows:
-                    cols = [td.text.strip() for td in row.find_all("td")]
-                    if len(cols) >= 8:
-                        data.append({
-                            "GO": input_go,
-                            "JO": cols[0],
-                            "Color": cols[1],
-                            "Color_Desc": cols[2],
-                            "Order_QTY": float(cols[3]),
-                            "Per_OVER-Short_Allowed": str(cols[4]),
-                            "Over_Short_Per": str(cols[5]),
-                            "OverShort_QTY": float(cols[6]),
-                            "Plan_Cut_Qty": float(cols[7]),
-                            "PPO_No": cols[-3],
-                            "Marker_YY": float(cols[-2]),
-                            "PPO_YY": float(cols[-1])
-                        })
-            
-            df = pd.DataFrame(data_remaining)
-            if not df.empty:
-                df.to_excel("GO_remaining.xlsx", index=False)
-            
+            input_gos = [go.strip() for go in code_str.replace("'", "").split(",") if go.strip()]
+
+            # ========== Các GO chạy song song (pool trình duyệt hoặc các session HTTP) ==========
+            workers = CUTTING_FORECAST_HTTP_WORKERS if CUTTING_FORECAST_ENGINE == "http" else BROWSER_POOL_SIZE
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(input_gos)))) as executor:
+                results = list(executor.map(self.fetch_go, input_gos))
+
+            data = [row for rows, _ in results for row in rows]
+            self.go_report = [info for _, info in results]
+
+            fetched = [info for info in self.go_report if info["STATUS"] in FETCHED_STATUSES]
+            print(f"✅ Cutting forecast: {len(fetched)}/{len(input_gos)} GO, "
+                  f"{time.perf_counter() - start:.1f}s")
+            write_go_report(self.go_report)
+
             data_web = pd.DataFrame(data)
 
             return data_web
         except Exception as e:
+            print(traceback.format_exc())
             print(f"❌ Lỗi khi lấy dữ liệu từ web: {e}")
+            # Không GO nào được coi là đã lấy xong: không xóa dữ liệu cũ
+            self.go_report = []
             return pd.DataFrame()
 
     def into_supabase(self):
         data = self.get_data_web()
-        if data.empty:
+        # Chỉ thay dữ liệu của các GO lấy được trọn vẹn: GO lỗi/timeout giữ nguyên dữ liệu cũ
+        fetched_gos = [info["SC_NO"] for info in self.go_report if info["STATUS"] in FETCHED_STATUSES]
+        if not fetched_gos:
             print("❌ Không có dữ liệu để chèn vào Supabase")
             return
         
         # Chuyển đổi dữ liệu thành định dạng JSON
         data_json = data.to_dict('records')
 
-        # Giả sử bạn đã có hàm insert_data để chèn dữ liệu vào Supabase
-        if self.supa_func.insert_data("cutting_forecast", data_json) == True:
+        # Ghi dòng mới/thay đổi và xóa dòng cũ của các GO trong cùng một transaction
+        code_str = ",".join(f"'{go}'" for go in fetched_gos)
+        if self.supa_func.upsert_data("cutting_forecast", data_json, f' "GO" IN ({code_str}) OR "JO" IN ({code_str}) ') == True:
             print(f"✅ Đã lấy dữ liệu cutting forecast: {len(data)} dòng")
             return True
         else:
@@ -3,6 +3,8 @@ from datetime import datetime
 
 from database.connect_sqlserver import ConnectSQLServer
 from database.connect_supabase import SupabaseFunctions
+from database.lookback import LookbackPlanner, month_windows
+from database.view_schema import get_view_schema
 
 
 class DemandSM:
@@ -12,123 +14,99 @@ class DemandSM:
         self.code_sd = code_sd
         self.code_gq = code_gq
 
-    def get_data_demand(self):
+    def iter_data_demand(self):
         '''
-        Lấy dữ liệu Demand submat từ SQL Server và đẩy lên Supabase
-        Chỉ lấy dữ liệu từ 6 tháng trước tháng hiện tại
+        Đọc streaming dữ liệu Demand submat từ SQL Server theo từng chunk
+        Mỗi mã lấy từ mốc 12/24/36 tháng gần nhất còn có dữ liệu (một lần truy vấn)
         '''
-        code_str = self.code_sd
+        schema = get_view_schema("submat_demand", self.queries)
+        jo_no = schema.column("JO_NO")
+        required_qty = schema.column("Required_Qty")
+        planner = LookbackPlanner(
+            view=schema.view,
+            date_column=schema.column("Create_Date"),
+            key_columns=[f"LEFT({jo_no}, 8)", jo_no],
+            windows=month_windows(step_months=12, steps=3),
+            filters=[f"{required_qty} > 0", f"{required_qty} IS NOT NULL"]
+        )
+        # Chỉ lấy các cột cần dùng thay vì SELECT *
+        query, params = planner.build_query(self.code_sd, columns=schema.select_list())
+
+        for chunk in self.queries.getDataChunks(query, params):
+            yield schema.apply(planner.strip(chunk))
+
+    def transform_demand(self, df_month):
+        '''
+        Chuẩn hóa một chunk Demand submat trước khi đẩy lên Supabase
+        '''
+        df_month["GO"] = "S" + df_month["JO_NO"].str[:8]
 
-        # Tính year và from_month từ 6 tháng trước tháng hiện tại
-        today = datetime.today()
-        six_months_ago = today.replace(day=1)  # Đầu tháng hiện tại
-        for _ in range(3):  # Thử tối đa 2 lần (6 tháng trước, rồi lùi tiếp 6 tháng nữa nếu không có dữ liệu)
-            # Lùi 12 tháng
-            month = six_months_ago.month - 12
-            year = six_months_ago.year
-            if month <= 0:
-                month += 12
-                year -= 1
-
-            from_date = datetime(year, month, 1)
-            
-            query = f"""
-                SELECT * 
-                FROM dbo.V_MRP_JO_Demand_EHV
-                WHERE [Required Qty] > 0 
-                AND [Required Qty] IS NOT NULL
-                AND [Create Date] >= '{from_date.strftime('%Y-%m-%d')}'
-                AND (LEFT([JO NO], 8) IN ({code_str}) OR [JO NO] IN ({code_str}))
-            """
-
-            df_month = self.queries.getData(query)        
-
-            if not df_month.empty:
-                break  # Có dữ liệu thì dừng
-            else:
-                print(f"❌ Không tìm thấy dữ liệu dmsm trong 6 tháng từ {from_date.strftime('%m/%Y')}, thử lùi tiếp 12 tháng nữa...")
-                six_months_ago = from_date  # Lùi tiếp 12 tháng nữa
-
-        if df_month.empty:
-            print(f"❌ Không tìm thấy dữ liệu sau khi đã lùi 3 lần 6 tháng!")
-            return       
-        
-        df_month["GO"] = "S" + df_month['JO NO'].str[:8]
-
-        df_all = df_month
-        cols = [0, 7, 8, 9, 10, 11, 15, 17, 19, 20, 21]
-        df_all = df_all.iloc[:, cols]
-
-        df_all.columns = [
-            "JO_NO",
-            "Required_Qty",
-            "Allocated_Qty",
-            "Issued_Qty",
-            "Demand_Qty",
-            "UOM",
-            "Manual_Demand",
-            "Create_Date",
-            "Product_Code",
-            "Dimm_No",
-            "GO"
-        ]
-
-        # --- Đẩy lên supbase ---
-        if df_all.empty:
-            print(f"✅ Dữ liệu đã có trong Database!")
-            return
-        
-        df_remaining = df_all
+        df_remaining = df_month
         df_remaining = df_remaining.dropna()
         if "Create_Date" in df_remaining.columns:
             df_remaining["Create_Date"] = df_remaining["Create_Date"].dt.strftime("%Y-%m-%d %H:%M:%S")
-        data_json = df_remaining.to_dict('records')
 
-        if self.supa_func.delete_data("submat_demand", f' "JO_NO" IN ({code_str}) OR "GO" IN ({code_str}) ') == True:
-            if self.supa_func.insert_data("submat_demand", data_json) == True:
-                print(f"✅ Đã lấy dữ liệu submat demand so với list GO: {df_remaining['GO'].nunique()} / {code_str.count(',') + 1}")
-                return True
+        return df_remaining
+
+    def get_data_demand(self):
+        '''
+        Lấy dữ liệu Demand submat từ SQL Server và upsert lên Supabase theo từng chunk
+        '''
+        code_str = self.code_sd
+        stage_id = None
+        go_uploaded = set()
+
+        for df_month in self.iter_data_demand():
+            df_remaining = self.transform_demand(df_month)
+            if df_remaining.empty:
+                continue
+
+            stage_id = self.supa_func.stage_upsert("submat_demand", df_remaining.to_dict('records'), stage_id)
+            if stage_id is None:
+                print("❌ Lỗi khi thêm dữ liệu submat_demand")
+                return
+            go_uploaded.update(df_remaining["GO"].unique())
+
+        if stage_id is None:
+            print(f"❌ Không tìm thấy dữ liệu submat demand trong 36 tháng gần nhất!")
+            return
+
+        # Phạm vi khớp với điều kiện lọc phía SQL Server (mã GO không có chữ S đầu hoặc mã JO)
+        if self.supa_func.commit_upsert("submat_demand", stage_id, f' LEFT("JO_NO", 8) IN ({code_str}) OR "JO_NO" IN ({code_str}) ') != True:
+            print("❌ Lỗi khi cập nhật dữ liệu submat_demand")
+            return
+
+        print(f"✅ Đã lấy dữ liệu submat demand so với list GO: {len(go_uploaded)} / {code_str.count(',') + 1}")
+        return True
     
     def get_go_quantity(self):
         '''
             Đã đưa lên supabase dữ liệu năm 2023, 2024 và 2025 ngày 15/5
         '''
         jo_nos_str = self.code_gq
-   
-        today = datetime.today()
-        year = today.year
-        df = pd.DataFrame()
-        for i in range(2):  # Thử tối đa 2 lần (1 năm trước, rồi lùi tiếp 1 năm nữa nếu không có dữ liệu)
-            year -= 1
-
-            query = f"""
-            SELECT [GO No], [Order QTY], [Year] 
-            FROM escmowner.V_GO
-            WHERE [Factory Code] = 'EHV'
-            AND [Year] >= '{year}'
-            AND [Order QTY] > 0
-            AND [GO No] IN ({jo_nos_str})
-            """
-
-            df = self.queries.getData(query)
-            
-            if not df.empty:
-                break  # Có dữ liệu thì dừng
-            else:
-                print(f"❌ Không tìm thấy dữ liệu trong năm {year}, thử lùi tiếp 1 năm nữa...")
-                year -= 1
-        
-        df_remaining = df
+
+        # Mỗi GO lấy từ năm trước, nếu không có thì lùi thêm 2 năm (một lần truy vấn)
+        year = datetime.today().year
+        schema = get_view_schema("go_quantity", self.queries)
+        planner = LookbackPlanner(
+            view=schema.view,
+            date_column=schema.column("Year"),
+            key_columns=[schema.column("GO_No")],
+            windows=[str(year - 1), str(year - 3)],
+            filters=["[Factory Code] = 'EHV'", f"{schema.column('Order_QTY')} > 0"]
+        )
+        query, params = planner.build_query(jo_nos_str, columns=schema.select_list())
+
+        df_remaining = schema.apply(planner.strip(self.queries.getData(query, params)))
 
         if df_remaining.empty:
             print(f"❌ Không tìm thấy dữ liệu")
             return
-        df_remaining.columns = ["GO_No", "Order_QTY", "Year"]
 
         df_remaining = df_remaining.dropna()
 
         df_remaining['Year'] = df_remaining['Year'].astype(int).astype(str)
         df_remaining['Order_QTY'] = df_remaining['Order_QTY'].astype(int)
-        if self.supa_func.delete_data("go_quantity", f' "GO_No" IN ({jo_nos_str}) '):
-            if self.supa_func.insert_data("go_quantity", df_remaining.to_dict('records')):
-                print(f"✅ Đã lấy dữ liệu được so với list GO: {df_remaining['GO_No'].nunique()} / {self.code_name.count(',') + 1}")
\ No newline at end of file
+        if self.supa_func.upsert_data("go_quantity", df_remaining.to_dict('records'), f' "GO_No" IN ({jo_nos_str}) '):
+            print(f"✅ Đã lấy dữ liệu được so với list GO: {df_remaining['GO_No'].nunique()} / {jo_nos_str.count(',') + 1}")
+            return True
@@ -0,0 +1,102 @@
+import threading
+from urllib.parse import urljoin
+
+import httpx
+from bs4 import BeautifulSoup
+
+# Loại input không gửi kèm form (nút bấm chỉ gửi nút được bấm)
+SKIPPED_INPUT_TYPES = {"submit", "image", "reset", "file", "button"}
+
+def form_state(html, base_url: str):
+    """
+    Trạng thái form ASP.NET của trang: (action, giá trị các trường gồm __VIEWSTATE/__EVENTVALIDATION...,
+    {id: name} và {id: value} của các control để điền giá trị và chọn nút bấm)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    form = soup.find("form")
+    if form is None:
+        raise ValueError("Trang không có form")
+
+    fields, names, values = {}, {}, {}
+    for element in form.find_all(["input", "select", "textarea"]):
+        name = element.get("name")
+        if not name or element.has_attr("disabled"):
+            continue
+        if element.get("id"):
+            names[element["id"]] = name
+            values[element["id"]] = element.get("value", "")
+
+        if element.name == "textarea":
+            fields[name] = element.text
+        elif element.name == "select":
+            option = element.find("option", selected=True) or element.find("option")
+            if option is not None:
+                fields[name] = option.get("value", option.text)
+        else:
+            input_type = element.get("type", "text").lower()
+            if input_type in SKIPPED_INPUT_TYPES:
+                continue
+            if input_type in ("checkbox", "radio") and not element.has_attr("checked"):
+                continue
+            fields[name] = element.get("value", "")
+
+    action = urljoin(base_url, form.get("action") or base_url)
+    return action, fields, names, values
+
+class AspNetFormClient:
+    """
+    Gửi lại postback của form ASP.NET qua HTTP thay vì điều khiển trình duyệt:
+    lấy trang một lần để có trạng thái form (VIEWSTATE...), mỗi lần tìm chỉ POST form đó với giá trị mới.
+    Mỗi thread một client riêng (keep-alive, cookie phiên riêng để server không xếp hàng các request)
+    """
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def _client(self) -> httpx.Client:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = httpx.Client(timeout=self.timeout, follow_redirects=True,
+                                  limits=httpx.Limits(max_connections=1, max_keepalive_connections=1))
+            self._local.client = client
+            self._local.form = None
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def _load_form(self, client: httpx.Client):
+        response = client.get(self.url)
+        response.raise_for_status()
+        return form_state(response.text, str(response.url))
+
+    def submit(self, values: dict, button_id: str) -> str:
+        """
+        Điền values ({id control: giá trị}), bấm nút button_id và trả về HTML trang kết quả.
+        Server từ chối trạng thái form (VIEWSTATE hết hạn, đổi phiên) thì lấy lại form và gửi lại một lần
+        """
+        client = self._client()
+        for attempt in range(2):
+            if self._local.form is None:
+                self._local.form = self._load_form(client)
+            action, fields, names, control_values = self._local.form
+
+            data = dict(fields)
+            data.update({names[control_id]: value for control_id, value in values.items()})
+            data[names[button_id]] = control_values[button_id]
+            try:
+                response = client.post(action, data=data)
+                response.raise_for_status()
+                return response.text
+            except httpx.HTTPStatusError:
+                self._local.form = None
+                if attempt:
+                    raise
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
@@ -2,6 +2,8 @@
 import pandas as pd
 from database.connect_supabase import SupabaseFunctions
 from database.connect_sqlserver import ConnectSQLServer
+from database.query_builder import CodeSet
+from database.view_schema import get_view_schema
 
 class JoProcessWip():
     def __init__(self, code_name):
@@ -12,12 +14,16 @@ class JoProcessWip():
     def get_table(self):
 
         jo_nos_str = self.code_name
+        schema = get_view_schema("process_wip", self.sql_query)
+        jo_no = schema.column("JO_NO")
+        code_set = CodeSet(jo_nos_str)
 
+        # Chỉ lấy các cột cần dùng thay vì SELECT *, danh sách mã bind thành tham số
         query = f'''
-            SELECT * FROM [dbo].[V_JO_Process_WIP_EHV]
-            WHERE LEFT([JO NO], 8) IN ({jo_nos_str}) OR [JO NO] IN ({jo_nos_str})
+            SELECT {schema.select_list()} FROM {schema.view}
+            WHERE {code_set.match([f"LEFT({jo_no}, 8)", jo_no])}
         '''
-        data = self.sql_query.getData(query)
+        data = schema.apply(self.sql_query.getData(query, code_set.params))
 
         if data.empty:
             print("❌ Không tìm thấy dữ liệu jo_process_wip")
@@ -31,24 +37,17 @@ class JoProcessWip():
             print("❌ Không tìm thấy dữ liệu jo_process_wip")
             return
         
-        cols = [1, 2, 3, 4, 8, 9, 10, 11, 12]
-        
-        data = data.iloc[:, cols]
-
-        data["SC_NO"] = "S"+ data["JO NO"].str[:8]
+        data["SC_NO"] = "S"+ data["JO_NO"].str[:8]
 
-        data.columns = ["JO_NO", "Color_Code","Size_Code", "Process_Code", "In_Qty", "Output_Qty", "Pull_In_Qty", "Discrepancy_Qty", "Wip", "SC_NO"]
         for col in data.select_dtypes(include=['object']).columns:
             data[col] = data[col].fillna('')
         for col in data.select_dtypes(include=['float64']).columns:
             data[col] = data[col].fillna(0)
 
-        if self.supa_func.delete_data("process_wip", f' LEFT("JO_NO", 8) IN ({self.code_name}) ') == True:
-            print("✅ Xóa dữ liệu process_wip thanh cong")
-
-            if self.supa_func.insert_data("process_wip", data.to_dict(orient="records")) == True:
-                print("✅ Thêm dữ liệu process_wip thành công")
-                return True
-            else:
-                print("❌ Lỗi khi thêm dữ liệu process_wip")
-                return False
\ No newline at end of file
+        # Ghi dòng mới/thay đổi và xóa dòng cũ trong cùng một transaction
+        if self.supa_func.upsert_data("process_wip", data.to_dict(orient="records"), f' LEFT("JO_NO", 8) IN ({self.code_name}) OR "JO_NO" IN ({self.code_name}) ') == True:
+            print("✅ Cập nhật dữ liệu process_wip thành công")
+            return True
+        else:
+            print("❌ Lỗi khi cập nhật dữ liệu process_wip")
+            return False
\ No newline at end of file
@@ -0,0 +1,185 @@
+import uuid
+from abc import ABC, abstractmethod
+
+import pandas as pd
+from database.connect_sqlserver import ConnectSQLServer
+from database.connect_supabase import SupabaseFunctions
+from database.freshness import get_freshness_registry
+from database.high_water_mark import HighWaterMarkPlanner, SYNC_KEY, overlap_windows
+from database.lookback import LookbackPlanner, month_windows
+from database.reference_mirror import get_reference_mirror
+from database.query_builder import parse_codes
+from database.view_schema import get_view_schema
+from settings.config import TRANS_SYNC_MODE, TRANS_SYNC_OVERLAP_DAYS
+
+
+class TransSync(ABC):
+    '''
+        Đồng bộ bảng giao dịch (fabric_trans/submat_trans) từ view SQL Server lên Supabase,
+        mỗi dòng được ghép với bảng tham chiếu (MasterList) theo reference_column.
+        Lớp con khai báo tên bảng và cài đặt reference_keys/transform
+    '''
+    table_name = None
+    reference_table = None
+    reference_column = None
+
+    def __init__(self, code_name):
+        self.sql_query = ConnectSQLServer()
+        self.supa_func = SupabaseFunctions()
+        self.code_name = code_name
+
+    @abstractmethod
+    def reference_keys(self, chunk: pd.DataFrame) -> pd.Series:
+        '''Giá trị reference_column cần tra trong bảng tham chiếu cho từng dòng của chunk'''
+
+    @abstractmethod
+    def transform(self, data: pd.DataFrame, reference: pd.DataFrame) -> pd.DataFrame:
+        '''Chuẩn hóa một chunk và ghép với các dòng bảng tham chiếu tương ứng'''
+
+    def iter_table(self, codes_str: str = None, marks: dict = None):
+        '''
+            Đọc streaming view theo từng chunk,
+            mỗi mã lấy từ mốc 6/12/18 tháng gần nhất còn có dữ liệu (một lần truy vấn).
+            marks (nếu có) được cập nhật mốc (TRANS_DATE, TRANS_CD) lớn nhất của từng mã
+        '''
+        schema = get_view_schema(self.table_name, self.sql_query)
+        planner = LookbackPlanner(
+            view=schema.view,
+            date_column=schema.column("TRANS_DATE"),
+            key_columns=[schema.column("SC_NO"), schema.column("JO_NO")],
+            windows=month_windows(step_months=6, steps=3)
+        )
+        # Chỉ lấy các cột cần dùng thay vì SELECT *
+        query, params = planner.build_query(codes_str or self.code_name, columns=schema.select_list())
+
+        has_data = False
+        for chunk in self.sql_query.getDataChunks(query, params):
+            has_data = True
+            chunk = schema.apply(chunk)
+            if marks is not None:
+                HighWaterMarkPlanner.merge_marks(marks, HighWaterMarkPlanner.marks_of(chunk, "LOOKBACK_KEY"))
+            yield planner.strip(chunk)
+
+        if not has_data:
+            print(f"❌ Không tìm thấy dữ liệu {self.table_name} trong 18 tháng gần nhất")
+
+    def iter_window_rows(self, windows: dict, new_marks: dict):
+        '''
+            Đọc streaming các giao dịch trong cửa sổ đọc lại của từng mã,
+            new_marks được cập nhật mốc mới
+        '''
+        schema = get_view_schema(self.table_name, self.sql_query)
+        planner = HighWaterMarkPlanner(
+            view=schema.view,
+            date_column=schema.column("TRANS_DATE"),
+            key_columns=[schema.column("SC_NO"), schema.column("JO_NO")]
+        )
+        query, params = planner.build_query(windows, columns=schema.select_list())
+
+        for chunk in self.sql_query.getDataChunks(query, params):
+            chunk = planner.in_window(schema.apply(chunk), windows)
+            if chunk.empty:
+                continue
+            HighWaterMarkPlanner.merge_marks(new_marks, HighWaterMarkPlanner.marks_of(chunk, SYNC_KEY))
+            yield planner.strip(chunk)
+
+    def get_table(self):
+        chunks = list(self.iter_table())
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True)
+
+    def upload(self, chunks, scope_conditions: str = None, replace_empty: bool = False):
+        '''
+            Xử lý, đẩy lên stage từng chunk rồi ghi vào bảng trong một transaction.
+            scope_conditions: phạm vi xóa dòng cũ không còn trong nguồn (None: chỉ thêm/cập nhật)
+            replace_empty: nguồn không có dòng nào vẫn commit để xóa các dòng cũ trong phạm vi.
+            Trả về True khi ghi xong, False khi lỗi (kể cả bảng tham chiếu rỗng), None khi nguồn không có dòng
+        '''
+        mirror = get_reference_mirror()
+        reference = None
+        stage_id = None
+        total_rows = 0
+
+        # Xử lý và đẩy lên stage từng chunk để bộ nhớ không phụ thuộc số GO
+        for chunk in chunks:
+            if reference is None and mirror.count(self.reference_table) == 0:
+                print(f"❌ Không tìm thấy dữ liệu {self.reference_table}")
+                return False
+
+            # Chỉ lấy các dòng bảng tham chiếu có trong chunk (bản sao cục bộ)
+            reference = mirror.lookup(self.reference_table, self.reference_column, self.reference_keys(chunk))
+            data_result = self.transform(chunk, reference)
+            stage_id = self.supa_func.stage_upsert(self.table_name, data_result.to_dict(orient="records"), stage_id)
+            if stage_id is None:
+                print(f"❌ Lỗi khi thêm dữ liệu {self.table_name}")
+                return False
+            total_rows += len(data_result)
+
+        if stage_id is None:
+            if scope_conditions is None or not replace_empty:
+                return
+            # Stage rỗng: commit chỉ xóa các dòng trong phạm vi không còn trong nguồn
+            stage_id = str(uuid.uuid4())
+
+        # Ghi dòng mới/thay đổi (và xóa dòng cũ trong phạm vi) trong cùng một transaction
+        if self.supa_func.commit_upsert(self.table_name, stage_id, scope_conditions) != True:
+            print(f"❌ Lỗi khi cập nhật dữ liệu {self.table_name}")
+            return False
+
+        print(f"✅ Cập nhật dữ liệu {self.table_name} thành công: {total_rows} dòng")
+        return True
+
+    def process_full(self, codes: list, reference_version: str = None):
+        '''
+            Lấy lại toàn bộ giao dịch (theo mốc lookback) của các mã, xóa dòng cũ không còn trong nguồn
+            và lưu mốc đồng bộ mới cùng phiên bản bảng tham chiếu đã ghép
+        '''
+        codes_str = ",".join(f"'{code}'" for code in codes)
+        marks = {}
+        result = self.upload(self.iter_table(codes_str, marks), f' "SC_NO" IN ({codes_str}) OR "JO_NO" IN ({codes_str}) ')
+        if result is None:
+            print(f"❌ Không tìm thấy dữ liệu {self.table_name}")
+        elif result is True:
+            get_freshness_registry().save_marks(self.table_name, marks, full=True, reference=reference_version)
+        return result
+
+    def process_incremental(self, marks: dict):
+        '''
+            Đọc lại cửa sổ từ ngày của mốc lùi TRANS_SYNC_OVERLAP_DAYS ngày của từng mã và thay đúng cửa sổ đó:
+            upsert theo khóa không tạo dòng trùng, dòng trong cửa sổ không còn trong nguồn bị xóa
+        '''
+        windows = overlap_windows(marks, TRANS_SYNC_OVERLAP_DAYS)
+        scope_conditions = " OR ".join(
+            f'(("SC_NO" = \'{code}\' OR "JO_NO" = \'{code}\') AND "TRANS_DATE" >= \'{since}\')'
+            for code, since in windows.items()
+        )
+        new_marks = {}
+        result = self.upload(self.iter_window_rows(windows, new_marks), f" {scope_conditions} ", replace_empty=True)
+        if result is True:
+            get_freshness_registry().save_marks(self.table_name, new_marks)
+        return result
+
+    def process_data(self, full_refresh: bool = False):
+        '''
+            Đồng bộ bảng giao dịch: mã đã có mốc (TRANS_DATE, TRANS_CD) chỉ đọc lại cửa sổ gần mốc,
+            mã chưa có mốc, quá hạn lấy lại toàn bộ, bảng tham chiếu đã đổi từ lần lấy toàn bộ
+            hoặc full_refresh thì lấy lại toàn bộ
+        '''
+        codes = parse_codes(self.code_name)
+        # Dòng đã ghi ghép với bảng tham chiếu cũ: đổi phiên bản thì mốc cũ không còn dùng được
+        reference_version = get_reference_mirror().version(self.reference_table)
+        marks = {}
+        if not full_refresh and TRANS_SYNC_MODE == "incremental":
+            marks = get_freshness_registry().get_marks(self.table_name, codes, reference_version)
+
+        results = []
+        full_codes = [code for code in codes if code.upper() not in marks]
+        if full_codes:
+            results.append(self.process_full(full_codes, reference_version))
+        if marks:
+            results.append(self.process_incremental(marks))
+
+        if False in results:
+            return False
+        return True if True in results else None
@@ -8,6 +8,8 @@ import uuid
 import unicodedata
 
 from ui_setup.utils.task_manager import AsyncQueryEngine
+from database.table_dtypes import restore_dtypes
+from ui_setup.utils.warm_up import get_readiness
 
 # Constants
 COLLECTION_NAME = "command_embeddings"
@@ -86,7 +88,17 @@ class ChatPage:
         )
         
         self.comment_text = ft.Text("")
-        
+        self.status_text = ft.Text(self._readiness_label(), size=12, italic=True, color=ft.Colors.GREY_700)
+
+    def _readiness_label(self) -> str:
+        """Trạng thái khởi động nền (warm up) của kết nối và model"""
+        readiness = get_readiness()
+        labels = {"sql_server": "SQL Server", "supabase": "Supabase", "embedding_model": "Model"}
+        return "  ".join(
+            f"{'🟢' if readiness[name] else ('🔴' if name in readiness['errors'] else '⏳')} {label}"
+            for name, label in labels.items()
+        )
+
     def chat_bot(self):
         """Tạo giao diện chatbot"""
         header = ft.Container(
@@ -98,7 +110,9 @@ class ChatPage:
                         weight=ft.FontWeight.BOLD,
                         color=ft.Colors.BLUE_800
                     ),
-                ]
+                    self.status_text,
+                ],
+                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
             ),
             padding=ft.padding.all(15),
             bgcolor=ft.Colors.BLUE_50,
@@ -296,6 +310,7 @@ class ChatPage:
         
         if "id" in data.columns:
             data = data.drop(columns=["id"])
+        data = restore_dtypes(data)
 
         return ft.DataTable(
             columns=[ft.DataColumn(ft.Text(col, weight=ft.FontWeight.BOLD)) for col in data.columns],
@@ -486,6 +501,10 @@ Hãy thử hỏi tôi về dữ liệu bạn cần! 🚀
             await self.query_engine.warm_up_connections()
             self._warmed_up = True
 
+        self.status_text.value = self._readiness_label()
+        if not get_readiness()["embedding_model"]:
+            self.add_progress_message("⏳ Hệ thống đang khởi động model, câu hỏi đầu tiên có thể chậm hơn...")
+
         typing_indicator = self.show_typing_indicator()
 
         try:
@@ -513,8 +532,10 @@ Hãy thử hỏi tôi về dữ liệu bạn cần! 🚀
                 current_query_idx = len(self.data_history) - 1
                 
                 for table_name, df in tables.items():
+                    # Bảng đọc lỗi được trả về dạng chuỗi thông báo lỗi
+                    rows_label = f"{len(df)} dòng" if isinstance(df, pd.DataFrame) else "lỗi"
                     btn = ft.ElevatedButton(
-                        f"Xem {table_name.replace('_',' ').title()} ({len(df)} dòng)",
+                        f"Xem {table_name.replace('_',' ').title()} ({rows_label})",
                         on_click=lambda e, idx=current_query_idx, tn=table_name: self.show_table_in_chat(idx, tn)
                     )
                     download_btn = ft.IconButton(
@@ -529,7 +550,7 @@ Hãy thử hỏi tôi về dữ liệu bạn cần! 🚀
                 self.display_message(msg)
                 self.chat_container.controls.extend(table_buttons)
                 if ai_response["type"] == "table_choices":
-                    if tables and any(df is not None and not df.empty for df in tables.values()):
+                    if tables and any(isinstance(df, pd.DataFrame) and not df.empty for df in tables.values()):
                         self.add_download_prompt()
                         self.last_data = tables
 
@@ -598,12 +619,12 @@ Hãy thử hỏi tôi về dữ liệu bạn cần! 🚀
                         "go_quantity": "GO_Quantity",
                         "compare_dm": "Compare_DM"
                     }.get(sheet_name, sheet_name)
-                    if df is not None and not df.empty:
-                        df = df.drop(columns=["id"])
+                    if isinstance(df, pd.DataFrame) and not df.empty:
+                        df = restore_dtypes(df.drop(columns=["id"]))
                         df.to_excel(writer, index=False, sheet_name=sheet)
         # Nếu là DataFrame (1 sheet)
         elif isinstance(data, pd.DataFrame):
-            data = data.drop(columns=["id"])
+            data = restore_dtypes(data.drop(columns=["id"]))
             with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
                 data.to_excel(writer, index=False, sheet_name="Sheet1")
         return output.getvalue()
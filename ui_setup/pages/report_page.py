@@ -3,6 +3,7 @@ from typing import List
 import flet as ft
 import pandas as pd
 from database.connect_supabase import SupabaseFunctions
+from database.reference_mirror import get_reference_mirror
 from datetime import datetime
 import uuid
 import unicodedata
@@ -362,7 +363,7 @@ class ReportPage:
         self.list_go_checked = e.control.value
 
     def get_list_go_str(self):        
-        data_go = SupabaseFunctions().get_data("list_go", "*")
+        data_go = get_reference_mirror().get_table("list_go")
         sc_nos = data_go["SC_NO"].unique().tolist()
         sc_nos_str = ','.join(f"'{sc_no}'" for sc_no in sc_nos)
         return sc_nos_str
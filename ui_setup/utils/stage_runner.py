@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from settings.config import STAGE_CONCURRENCY
+
+class Stage:
+    """Một bước ETL: tên, mô tả hiển thị và hàm tạo coroutine chạy bước đó"""
+    def __init__(self, name: str, description: str, run: Callable[[], Awaitable[Any]]):
+        self.name = name
+        self.description = description
+        self.run = run
+
+class StageRunner:
+    """
+    Chạy đồng thời các bước độc lập (đọc view khác nhau, ghi bảng khác nhau),
+    tối đa max_concurrency bước cùng lúc, gom thông báo tiến độ và lỗi của từng bước
+    """
+    def __init__(self, add_process: Optional[Callable[[str], Any]] = None, max_concurrency: int = STAGE_CONCURRENCY):
+        self.add_process = add_process
+        self.max_concurrency = max_concurrency
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+
+    def _notify(self, text: str):
+        if self.add_process:
+            self.add_process(text)
+
+    @staticmethod
+    def error_of(stage: Stage, result: Any) -> Optional[str]:
+        """Thông báo lỗi nếu kết quả của bước là lỗi / False / DataFrame rỗng"""
+        if isinstance(result, dict) and result.get("type") == "error":
+            return result.get("message")
+        if result is False or (isinstance(result, pd.DataFrame) and result.empty):
+            return f"❌ Lỗi khi kết nối hoặc không có dữ liệu {stage.description}."
+        return None
+
+    async def _run_stage(self, stage: Stage, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await stage.run()
+                error = self.error_of(stage, result)
+            except Exception as e:
+                result, error = None, f"❌ Lỗi khi chạy {stage.description}: {e}"
+            self.timings[stage.name] = time.perf_counter() - start
+
+        self.results[stage.name] = result
+        if error:
+            self.errors[stage.name] = error
+            self._notify(f"❌ {stage.description} lỗi ({self.timings[stage.name]:.1f}s)")
+        else:
+            self._notify(f"✅ {stage.description} xong ({self.timings[stage.name]:.1f}s)")
+
+    async def run(self, stages: List[Stage]) -> Dict[str, Any]:
+        """Chạy các bước, trả về kết quả theo tên bước (lỗi xem ở self.errors)"""
+        self._notify("🔄 Đang chạy đồng thời: " + ", ".join(stage.description for stage in stages) + "...")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(self._run_stage(stage, semaphore) for stage in stages))
+        return self.results
+
+    def error_result(self) -> Optional[dict]:
+        """Gộp lỗi của các bước thành một kết quả lỗi cho TaskManager, None nếu không có lỗi"""
+        if not self.errors:
+            return None
+        return {"type": "error", "message": "\n".join(self.errors.values())}
@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from settings.config import STAGE_CONCURRENCY, TASK_MEMO_TTL, TASK_MEMO_MAX_ENTRIES
+from database.read_cache import read_cache
+from database.reference_mirror import MIRROR_TABLES, get_reference_mirror
+from ui_setup.utils.stage_runner import Stage, StageRunner
+
+class GraphStep:
+    """
+    Một bước của đồ thị tác vụ.
+    deps: các bước phải xong trước; inputs: bảng được ghi từ nơi khác (vd MasterList)
+    mà kết quả của bước phụ thuộc vào, dùng để biết khi nào kết quả đã nhớ hết hiệu lực.
+    outputs: bảng mà bước lấy từ nguồn bên ngoài (SQL Server, MES) rồi ghi vào. Chỉ chạy mới biết
+    nguồn đã đổi hay chưa nên bước có outputs luôn chạy (không nhớ kết quả, tự bỏ qua khi nguồn chưa đổi),
+    các bước sau phụ thuộc vào số lần ghi của outputs thay vì lần chạy
+    """
+    def __init__(self, name: str, description: str, run: Callable[[], Awaitable[Any]],
+                 deps: List[str] = None, inputs: List[str] = None, outputs: List[str] = None):
+        self.name = name
+        self.description = description
+        self.run = run
+        self.deps = deps or []
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+
+# Kết quả đã chạy theo (bước, bộ mã), dùng chung cho mọi session:
+# {"version": ..., "run_id": ..., "at": ..., "result": ...}
+_memo = OrderedDict()
+_run_ids = itertools.count(1)
+# Bước đang chạy theo (event loop, bước, bộ mã, phiên bản): session khác chờ cùng lần chạy
+_inflight = {}
+# _memo và _inflight dùng chung giữa các thread (mỗi thread một event loop)
+_lock = threading.Lock()
+
+def clear_memo():
+    with _lock:
+        _memo.clear()
+
+def _codes_key(codes: List[str]) -> frozenset:
+    return frozenset(code.strip().upper() for code in codes)
+
+class TaskGraph:
+    """
+    Chạy các bước theo đồ thị phụ thuộc với độ song song tối đa (giới hạn max_concurrency bước
+    đang làm việc cùng lúc). Mỗi bước được nhớ theo (bước, bộ mã, phiên bản dữ liệu):
+    phiên bản gồm số lần ghi và phiên bản bản sao cục bộ (thấy cả lần ghi từ process khác/MasterList)
+    của các bảng inputs và lần chạy của các bước phụ thuộc,
+    nên chỉ chạy lại khi đầu vào đổi hoặc kết quả cũ quá TASK_MEMO_TTL giây.
+    Bước lấy dữ liệu nguồn (có outputs) luôn chạy, phiên bản của nó là số lần ghi các bảng outputs
+    """
+    def __init__(self, steps: List[GraphStep], add_process: Optional[Callable[[str], Any]] = None,
+                 max_concurrency: int = STAGE_CONCURRENCY, memo_ttl: int = TASK_MEMO_TTL):
+        self.steps = {step.name: step for step in steps}
+        self.add_process = add_process
+        self.max_concurrency = max_concurrency
+        self.memo_ttl = memo_ttl
+
+    def _closure(self, targets: List[str]) -> List[str]:
+        """Các bước cần chạy cho targets (kể cả phụ thuộc), theo thứ tự topo"""
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"Đồ thị tác vụ có vòng lặp tại {name}")
+            visiting.add(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for target in targets:
+            visit(target)
+        return ordered
+
+    @staticmethod
+    def _input_versions(step: GraphStep) -> tuple:
+        """Số lần ghi trong process và phiên bản bản sao cục bộ (đồng bộ với Supabase) của từng bảng inputs"""
+        mirror = get_reference_mirror()
+        return tuple(
+            (read_cache.generation(table), mirror.version(table) if table in MIRROR_TABLES else None)
+            for table in step.inputs
+        )
+
+    async def _version(self, step: GraphStep, run_ids: Dict[str, Any]) -> tuple:
+        # Đồng bộ bản sao có thể đọc Supabase: chạy ngoài event loop
+        inputs = await asyncio.to_thread(self._input_versions, step) if step.inputs else ()
+        return (inputs, tuple(run_ids[dep] for dep in step.deps))
+
+    async def _execute(self, step: GraphStep, key, version, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            result = await step.run()
+        # Chỉ nhớ kết quả thành công của bước không lấy dữ liệu nguồn
+        if StageRunner.error_of(step, result) is None and not step.outputs:
+            with _lock:
+                _memo[key] = {"version": version, "run_id": next(_run_ids), "at": time.time(), "result": result}
+                _memo.move_to_end(key)
+                while len(_memo) > TASK_MEMO_MAX_ENTRIES:
+                    _memo.popitem(last=False)
+        return result
+
+    def _shared_task(self, step: GraphStep, key, version, semaphore: asyncio.Semaphore) -> asyncio.Future:
+        """Lần chạy đang diễn ra của (bước, bộ mã, phiên bản) trên loop hiện tại, hoặc lần chạy mới"""
+        inflight_key = (asyncio.get_running_loop(), key, version)
+
+        def forget(_):
+            with _lock:
+                if _inflight.get(inflight_key) is task:
+                    del _inflight[inflight_key]
+
+        with _lock:
+            task = _inflight.get(inflight_key)
+            # Task đã xong nhưng chưa được dọn (callback chưa chạy): không dùng lại kết quả cũ
+            if task is None or task.done():
+                task = asyncio.ensure_future(self._execute(step, key, version, semaphore))
+                _inflight[inflight_key] = task
+                task.add_done_callback(forget)
+        return task
+
+    async def _run_step(self, step: GraphStep, codes_key, done: Dict[str, asyncio.Future],
+                        run_ids: Dict[str, int], semaphore: asyncio.Semaphore, force: bool = False):
+        try:
+            for dep in step.deps:
+                if not await done[dep]:
+                    return {"type": "error", "message": f"⏭️ Bỏ qua {step.description} do bước {self.steps[dep].description} lỗi."}
+
+            key = (step.name, codes_key)
+            version = await self._version(step, run_ids)
+
+            if step.outputs:
+                # Bước lấy dữ liệu nguồn: luôn chạy, bước sau dùng số lần ghi outputs làm phiên bản
+                result = await asyncio.shield(self._shared_task(step, key, version, semaphore))
+                if StageRunner.error_of(step, result) is None:
+                    run_ids[step.name] = tuple(read_cache.generation(table) for table in step.outputs)
+                    done[step.name].set_result(True)
+                return result
+
+            with _lock:
+                entry = _memo.get(key)
+            if not force and entry and entry["version"] == version and time.time() - entry["at"] < self.memo_ttl:
+                if self.add_process:
+                    self.add_process(f"♻️ {step.description}: dùng kết quả lúc {datetime.fromtimestamp(entry['at']):%H:%M:%S} (dữ liệu chưa đổi)")
+                result = entry["result"]
+            else:
+                result = await asyncio.shield(self._shared_task(step, key, version, semaphore))
+
+            with _lock:
+                entry = _memo.get(key)
+            if entry and entry["version"] == version:
+                run_ids[step.name] = entry["run_id"]
+                done[step.name].set_result(True)
+            return result
+        finally:
+            if not done[step.name].done():
+                done[step.name].set_result(False)
+
+    async def run(self, targets: List[str], codes: List[str], force: bool = False) -> StageRunner:
+        """
+        Chạy targets và các bước phụ thuộc, trả về StageRunner chứa results/errors theo tên bước.
+        force: không dùng kết quả đã nhớ (vẫn ghi nhớ kết quả mới)
+        """
+        names = self._closure(targets)
+        codes_key = _codes_key(codes)
+        loop = asyncio.get_running_loop()
+        done = {name: loop.create_future() for name in names}
+        run_ids: Dict[str, Any] = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Mọi bước khởi chạy cùng lúc và tự chờ phụ thuộc, giới hạn song song nằm ở semaphore
+        runner = StageRunner(self.add_process, max_concurrency=len(names))
+        await runner.run([
+            Stage(name, self.steps[name].description,
+                  lambda step=self.steps[name]: self._run_step(step, codes_key, done, run_ids, semaphore, force))
+            for name in names
+        ])
+        return runner
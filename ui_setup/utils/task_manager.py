@@ -1,10 +1,19 @@
 import asyncio
 import re
+import threading
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 
 import pandas as pd
 
 from database.connect_supabase import SupabaseFunctions
+from database.connect_supabase_async import AsyncSupabaseFunctions
+from database.read_cache import read_cache
+from database.snapshot_store import SAVED_AT, snapshot_store
+from database.table_dtypes import compact_dtypes
+from database.freshness import get_freshness_registry
+from database.resilience import DataSourceError
+from ui_setup.utils.task_graph import GraphStep, TaskGraph
 from ui_setup.utils.task_pattern import TaskPattern
 from ui_setup.utils.data_processor import DataProcessor
 
@@ -244,6 +253,16 @@ class TaskManager:
         
         return any(re.search(kw, query.lower(), re.IGNORECASE) for kw in keywords)
     
+    def is_full_refresh_query(self, query: str) -> bool:
+        """Kiểm tra xem người dùng có muốn lấy lại toàn bộ dữ liệu (bỏ qua đồng bộ tăng dần) hay không"""
+        keywords = [
+            r"làm.*?mới.*?toàn.*?bộ",
+            r"(lấy|tải).*?lại.*?toàn.*?bộ",
+            r"đồng.*?bộ.*?lại",
+            r"full.*?(refresh|rebuild)",
+        ]
+        return any(re.search(kw, query.lower(), re.IGNORECASE) for kw in keywords)
+
     def get_all_data(self, query: str) -> bool:
         """ Kiểm tra xem người dùng có muốn lấy tất cả dữ liệu về không """
         keywwords = [
@@ -287,6 +306,118 @@ class TaskManager:
             "task": task
         }
     
+    async def _read_offline(self, query_engine, table: str, condition: str, codes: List[str], add_process=None) -> pd.DataFrame:
+        """Xem offline: đọc snapshot cục bộ, chỉ gọi Supabase khi có mã chưa có snapshot (hoặc snapshot quá cũ)"""
+        data = await asyncio.to_thread(snapshot_store.load, table, codes)
+        if data is not None:
+            if add_process and data.attrs.get(SAVED_AT):
+                add_process(f"📥 {table}: dữ liệu offline lưu lúc {datetime.fromtimestamp(data.attrs[SAVED_AT]):%d/%m/%Y %H:%M}")
+            # Ghép snapshot của nhiều mã làm mất category, đổi lại kiểu gọn
+            return compact_dtypes(table, data)
+
+        data = await query_engine.get_data_async(table, "*", condition)
+        if not data.empty:
+            await asyncio.to_thread(snapshot_store.save, table, codes, data)
+        return data
+
+    async def _read_back(self, query_engine, table: str, condition: str, codes: List[str]) -> pd.DataFrame:
+        """Đọc lại kết quả sau khi chạy online và lưu snapshot cho các lần xem offline"""
+        # Không gộp vào lần đọc đang chạy: lần đó có thể bắt đầu trước khi bước online ghi xong
+        # (một số rpc ghi phía server không tăng generation của bảng)
+        data = await query_engine.get_data_async(table, "*", condition, coalesce=False)
+        if not data.empty:
+            await asyncio.to_thread(snapshot_store.save, table, codes, data)
+        return data
+
+    async def _read_tables(self, query_engine, reads: Dict[str, str], codes: List[str] = None, offline: bool = False,
+                           add_process=None) -> Dict[str, Any]:
+        """
+        Đọc đồng thời nhiều bảng {table: condition} trong một lượt.
+        Bảng bị lỗi không làm hỏng các bảng khác: giá trị là chuỗi thông báo lỗi
+        """
+        if codes:
+            if offline:
+                read = lambda table, condition: self._read_offline(query_engine, table, condition, codes, add_process)
+            else:
+                read = lambda table, condition: self._read_back(query_engine, table, condition, codes)
+            results = await asyncio.gather(
+                *(read(table, condition) for table, condition in reads.items()),
+                return_exceptions=True
+            )
+            results = dict(zip(reads, results))
+        else:
+            results = await query_engine.fetch_many({table: (table, "*", condition) for table, condition in reads.items()})
+
+        for table, result in results.items():
+            if isinstance(result, Exception):
+                print(f"Data retrieval error for {table}: {result}")
+                results[table] = f"Lỗi khi lấy dữ liệu {table}: {result}"
+        return results
+
+    def _graph_steps(self, conditions: dict, query_engine) -> List[GraphStep]:
+        """
+        Đồ thị các bước của DM Technical / DM Actual / Compare theo mã trong conditions:
+        cutting_forecast, submat_demand -> dm_technical; fabric_trans, submat_trans, process_wip -> dm_actual;
+        dm_technical, dm_actual -> compare. inputs là bảng MasterList mà bước đọc để tính,
+        outputs là bảng mà bước lấy nguồn ghi vào (các bước này luôn chạy, tự bỏ qua khi nguồn chưa đổi)
+        """
+        from ui_setup.components.dm_technical import DemandTechnical
+        from ui_setup.components.dm_actual import DmActual
+        from ui_setup.components.compare_report import ReportCompare
+
+        code_name = ",".join(conditions.get("codes", []))
+        codes_str = self.processor.normalize_codes(code_name)
+
+        def run_technical_report():
+            """Chạy TechnicalReport trong thread riêng"""
+            ds = DemandTechnical(code_name=codes_str)
+            return ds.get_results_dm_technical()
+
+        def run_dm_actual():
+            """Chạy DmActual trong thread riêng"""
+            ds = DmActual(code_name=code_name)
+            return ds.update_note_actual() is not False
+
+        async def run_report_compare():
+            result = await asyncio.to_thread(lambda: ReportCompare(code_name=code_name).process_compare())
+            if isinstance(result, pd.DataFrame) or not result:
+                return {"type": "error", "message": "❌ Không thể tạo báo cáo so sánh. Dữ liệu trống hoặc có lỗi."}
+            return result
+
+        return [
+            GraphStep("cutting_forecast", "Cutting Forecast",
+                      lambda: self._execute_cutting_forecast(conditions, query_engine), outputs=["cutting_forecast"]),
+            GraphStep("submat_demand", "Submat Demand",
+                      lambda: self._execute_submat_demand(conditions, query_engine),
+                      outputs=["submat_demand", "go_quantity"]),
+            GraphStep("fabric_trans", "Fabric Transaction Summary",
+                      lambda: self._execute_fabric_trans(conditions, query_engine), outputs=["fabric_trans"]),
+            GraphStep("submat_trans", "Submat Transaction Summary",
+                      lambda: self._execute_submat_trans(conditions, query_engine), outputs=["submat_trans"]),
+            GraphStep("process_wip", "Process WIP",
+                      lambda: self._execute_process_wip(conditions, query_engine), outputs=["process_wip"]),
+            GraphStep("dm_technical", "DM Technical Report",
+                      lambda: asyncio.to_thread(run_technical_report),
+                      deps=["cutting_forecast", "submat_demand"], inputs=["fabric_list", "trims_list", "range_dm"]),
+            GraphStep("dm_actual", "DM Actual Report",
+                      lambda: asyncio.to_thread(run_dm_actual),
+                      deps=["fabric_trans", "submat_trans", "process_wip"], inputs=["range_dm"]),
+            GraphStep("compare", "Report Compare", run_report_compare,
+                      deps=["dm_technical", "dm_actual"]),
+        ]
+
+    async def _run_graph(self, targets: List[str], conditions: dict, query_engine, add_process=None) -> TaskGraph:
+        graph = TaskGraph(self._graph_steps(conditions, query_engine), add_process)
+        return await graph.run(targets, conditions.get("codes", []), force=conditions.get("full_refresh", False))
+
+    def _notify_refresh(self, add_process, description: str, refresh: dict):
+        """Thông báo các mã được bỏ qua vì nguồn SQL Server chưa đổi"""
+        if add_process and refresh["skipped"]:
+            if refresh["refreshed"]:
+                add_process(f"♻️ {description}: {len(refresh['skipped'])} mã nguồn chưa đổi, chỉ cập nhật {len(refresh['refreshed'])} mã")
+            else:
+                add_process(f"♻️ {description}: nguồn chưa đổi kể từ lần cập nhật trước, dùng dữ liệu đã có")
+
     async def execute_task(self, task_name: str, conditions: dict, query_engine, context = None) -> Any:
         """Thực thi task với các điều kiện đã được validate"""
         if task_name not in self.tasks:
@@ -307,16 +438,10 @@ class TaskManager:
 
             if codes:
 
-                from ui_setup.components.dm_technical import DemandTechnical
                 code_name = ",".join(codes)
                 codes_str = self.processor.normalize_codes(code_name)
 
                 codes_sub = ",".join(f"'{code}'" for code in codes)
-                
-                def run_technical_report():
-                    """Chạy TechnicalReport trong thread riêng"""
-                    ds = DemandTechnical(code_name=codes_str)
-                    ds.get_results_dm_technical()
 
                 condition = f'"SC_NO" IN ({codes_str})'
                 conditions_cf = f'"GO" IN ({codes_sub}) OR "JO" IN ({codes_sub})'
@@ -326,46 +451,35 @@ class TaskManager:
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thành \"Lấy báo cáo hoặc dữ liệu ...\"")
 
-                    data = await query_engine.get_data_async("dm_technical", "*", condition)
-                    data_cf = await query_engine.get_data_async("cutting_forecast", "*", conditions_cf)
-                    data_sd = await query_engine.get_data_async("submat_demand", "*", conditions_sd)
+                    results = await self._read_tables(query_engine, {
+                        "submat_demand": conditions_sd,
+                        "cutting_forecast": conditions_cf,
+                        "dm_technical": condition,
+                    }, codes, offline=True, add_process=add_process)
                 else:
-                    # 1. Chạy Cutting Forecast
-                    if add_process:
-                        add_process("🔄 Đang lấy dữ liệu Cutting Forecast...")
-
-                    result_cutting = await self._execute_cutting_forecast(conditions, query_engine)
-                    if result_cutting is False or (isinstance(result_cutting, pd.DataFrame) and result_cutting.empty):
-                        return {"type": "error", "message": "❌ Lỗi khi kết nối hoặc không có dữ liệu Cutting Forecast."}
-                    
-                    # 2. Chạy Submat Demand
-                    if add_process:
-                        add_process("🔄 Đang lấy dữ liệu Submat Demand...")
-
-                    result_submat = await self._execute_submat_demand(conditions, query_engine)
-                    if result_submat is False or (isinstance(result_submat, pd.DataFrame) and result_submat.empty):
-                        return {"type": "error", "message": "❌ Lỗi khi kết nối hoặc không có dữ liệu Submat Demand."}
-                    # 3. Chạy Technical Report
-                    if add_process:
-                        add_process("🔄 Đang tổng hợp DM Technical Report...")
-
-                    await asyncio.to_thread(run_technical_report)
-
-                    data = await query_engine.get_data_async("dm_technical", "*", condition)
-                    data_cf = await query_engine.get_data_async("cutting_forecast", "*", conditions_cf)
-                    data_sd = await query_engine.get_data_async("submat_demand", "*", conditions_sd)
+                    # Cutting Forecast, Submat Demand chạy đồng thời rồi tổng hợp Technical Report,
+                    # bước nào đã chạy cho cùng bộ mã và dữ liệu chưa đổi thì dùng lại kết quả
+                    runner = await self._run_graph(["dm_technical"], conditions, query_engine, add_process)
+                    if runner.error_result():
+                        return runner.error_result()
+
+                    results = await self._read_tables(query_engine, {
+                        "submat_demand": conditions_sd,
+                        "cutting_forecast": conditions_cf,
+                        "dm_technical": condition,
+                    }, codes)
                 
             else:
                 if add_process:
                     add_process("📥 Không có mã cụ thể, đang lấy toàn bộ dữ liệu demand technical...")
 
-                data = await query_engine.get_data_async("dm_technical", "*")
-                data_cf = await query_engine.get_data_async("cutting_forecast", "*")
-                data_sd = await query_engine.get_data_async("submat_demand", "*")
+                results = await self._read_tables(query_engine, {
+                    "submat_demand": "",
+                    "cutting_forecast": "",
+                    "dm_technical": "",
+                })
 
-            all_results["submat_demand"] = data_sd
-            all_results["cutting_forecast"] = data_cf
-            all_results["dm_technical"] = data
+            all_results.update(results)
                 
             return all_results  # Trả về dict chứa tất cả kết quả
             
@@ -381,17 +495,11 @@ class TaskManager:
             query = context.get("query") if context else ""
             codes = conditions.get("codes", [])
             if codes:
-                from ui_setup.components.dm_actual import DmActual
                 code_name = ",".join(codes)
                 codes_str = self.processor.normalize_codes(code_name)
 
                 codes_sub = ",".join(f"'{code}'" for code in codes)
 
-                def run_dm_actual():
-                    """Chạy DmActual trong thread riêng"""
-                    ds = DmActual(code_name=code_name)
-                    ds.update_note_actual()
-
                 condition = f'"SC_NO" IN ({codes_str})'
                 condition_fb = f'"SC_NO" IN ({codes_sub}) OR "JO_NO" IN ({codes_sub})'
                 condition_sm = f'"SC_NO" IN ({codes_sub}) OR "JO_NO" IN ({codes_sub})'
@@ -400,58 +508,37 @@ class TaskManager:
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thành \"Lấy báo cáo hoặc dữ liệu ...\"")
-                    data = await query_engine.get_data_async("dm_actual", "*", condition)
-                    data_fb = await query_engine.get_data_async("fabric_trans", "*", condition_fb)
-                    data_sm = await query_engine.get_data_async("submat_trans", "*", condition_sm)
-                    data_wip = await query_engine.get_data_async("process_wip", "*", condition_wip)
+                    results = await self._read_tables(query_engine, {
+                        "dm_actual": condition,
+                        "fabric_trans": condition_fb,
+                        "submat_trans": condition_sm,
+                        "process_wip": condition_wip,
+                    }, codes, offline=True, add_process=add_process)
 
                 else:
-                    # 1. Chạy fabric trans
-                    if add_process:
-                        add_process("🔄 Đang chạy Fabric Transaction Summary...")
-
-                    result_fabric = await self._execute_fabric_trans(conditions, query_engine)
-                    if result_fabric is False or (isinstance(result_fabric, pd.DataFrame) and result_fabric.empty):
-                        return {"type": "error", "message": "❌ Lỗi khi kết nối hoặc không có dữ liệu Fabric Transaction Summary."}
-                    
-                    # 2. Chạy submat trans
-                    if add_process:
-                        add_process("🔄 Đang chạy Submat Transaction Summary...")
-
-                    result_submat = await self._execute_submat_trans(conditions, query_engine)
-                    
-                    if result_submat is False or (isinstance(result_submat, pd.DataFrame) and result_submat.empty):
-                        return {"type": "error", "message": "❌ Lỗi khi kết nối hoặc không có dữ liệu Submat Transaction Summary."}                    
-                    
-                    # 3. Chạy process wip
-                    if add_process:
-                        add_process("🔄 Đang chạy Process WIP...")
-
-                    result_process_wip = await self._execute_process_wip(conditions, query_engine)
-                    if result_process_wip is False or (isinstance(result_process_wip, pd.DataFrame) and result_process_wip.empty):
-                        return {"type": "error", "message": "❌ Lỗi khi kết nối hoặc không có dữ liệu Process WIP."}
-                    
-                    if add_process:
-                        add_process("🔄 Đang chạy tổng hợp Actual Report...")
-                    
-                    await asyncio.to_thread(run_dm_actual)
-
-                    data = await query_engine.get_data_async("dm_actual", "*", condition)
-                    data_fb = await query_engine.get_data_async("fabric_trans", "*", condition_fb)
-                    data_sm = await query_engine.get_data_async("submat_trans", "*", condition_sm)
-                    data_wip = await query_engine.get_data_async("process_wip", "*", condition_wip)
+                    # Fabric trans, submat trans, process wip đọc view và ghi bảng khác nhau: chạy đồng thời
+                    # rồi tổng hợp Actual Report, bước đã chạy với dữ liệu chưa đổi thì dùng lại
+                    runner = await self._run_graph(["dm_actual"], conditions, query_engine, add_process)
+                    if runner.error_result():
+                        return runner.error_result()
+
+                    results = await self._read_tables(query_engine, {
+                        "dm_actual": condition,
+                        "fabric_trans": condition_fb,
+                        "submat_trans": condition_sm,
+                        "process_wip": condition_wip,
+                    }, codes)
             else:
                 if add_process:
                     add_process("📥 Không có mã cụ thể, đang lấy toàn bộ dữ liệu định mức thức tế...")
-                data = await query_engine.get_data_async("dm_actual", "*")
-                data_fb = await query_engine.get_data_async("fabric_trans", "*")
-                data_sm = await query_engine.get_data_async("submat_trans", "*")
-                data_wip = await query_engine.get_data_async("process_wip", "*")
+                results = await self._read_tables(query_engine, {
+                    "dm_actual": "",
+                    "fabric_trans": "",
+                    "submat_trans": "",
+                    "process_wip": "",
+                })
 
-            all_results["dm_actual"] = data
-            all_results["fabric_trans"] = data_fb
-            all_results["submat_trans"] = data_sm
-            all_results["process_wip"] = data_wip
+            all_results.update(results)
 
             return all_results
         
@@ -466,23 +553,20 @@ class TaskManager:
             codes = conditions.get("codes", [])
             code_name = None
 
-            if codes and add_process and not self.is_no_sql_query(query):
-                code_name = ",".join(codes)
+            if codes and not self.is_no_sql_query(query):
+                # DM Technical và DM Actual chạy song song theo đồ thị, dùng chung các bước
+                # đã chạy trước đó (vd vừa lấy DM Technical cho cùng mã)
+                if add_process:
+                    add_process("📥 Đang lấy dữ liệu demand technical và demand actual...")
+                runner = await self._run_graph(["compare"], conditions, query_engine, add_process)
+                if runner.error_result():
+                    return runner.error_result()
+                # Kết quả được nhớ dùng chung giữa các lần hỏi: trả bản sao cho UI
+                return {name: data.copy() for name, data in runner.results["compare"].items()}
 
-                # 1. Chạy demand technicl
-                add_process("📥 Đang lấy dữ liệu demand technical...")
-                result_dm_technical = await self._execute_dm_technical(conditions, query_engine)
-                if isinstance(result_dm_technical, dict) and result_dm_technical.get("type") == "error":
-                    return result_dm_technical
-                
-                # 2. Chạy demand submat
-                add_process("📥 Đang lấy dữ liệu demand submat...")
-                result_dm_submat = await self._execute_dm_actual(conditions, query_engine)
-                if isinstance(result_dm_submat, dict) and result_dm_submat.get("type") == "error":
-                    return result_dm_submat
-            else:
+            if add_process:
                 add_process("📥 Dữ liệu offline demand technical và demand submat...")
-            # 3. Chạy report compare
+            # Chạy report compare
             if add_process:
                 add_process("📥 Đang phân tích và lấy dữ liệu report compare...")
             from ui_setup.components.compare_report import ReportCompare
@@ -507,6 +591,7 @@ class TaskManager:
             add_process = context.get("add_process_message") if context else None
             query = context.get("query") if context else ''
             codes = conditions.get("codes", [])
+            full_refresh = conditions.get("full_refresh", False)
             if codes:
                 
                 from ui_setup.data_dmtt.jo_process_wip import JoProcessWip
@@ -518,20 +603,23 @@ class TaskManager:
                 condition = f'"SC_NO" IN ({codes_str}) OR "JO_NO" IN ({codes_str})'
 
                 def run_jo_process_wip():
-                    """Chạy JoProcessWip trong thread riêng"""
-                    jpw = JoProcessWip(code_name=jo_nos_str)
-                    jpw.process_wip()
+                    """Chạy JoProcessWip trong thread riêng, bỏ qua mã có nguồn chưa đổi"""
+                    return get_freshness_registry().refresh(
+                        "process_wip", jo_nos_str, lambda changed: JoProcessWip(code_name=changed).process_wip(),
+                        force=full_refresh
+                    )
 
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thành \"Lấy báo cáo hoặc lấy dữ liệu ...\"")
-                    data = await query_engine.get_data_async("process_wip", "*", condition)
+                    data = await self._read_offline(query_engine, "process_wip", condition, codes, add_process)
                 else:
                     if add_process:
                         add_process("📥 Đang lấy dữ liệu process wip...")
                     # Import và chạy JoProcessWip
-                    await asyncio.to_thread(run_jo_process_wip)
-                    data = await query_engine.get_data_async("process_wip", "*", condition)
+                    refresh = await asyncio.to_thread(run_jo_process_wip)
+                    self._notify_refresh(add_process, "Process WIP", refresh)
+                    data = await self._read_back(query_engine, "process_wip", condition, codes)
             else:
                 data = await query_engine.get_data_async("process_wip", "*")
             
@@ -622,12 +710,12 @@ class TaskManager:
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thành \"Lấy báo cáo hoặc lấy dữ liệu ...\"")
-                    data = await query_engine.get_data_async("cutting_forecast", "*", condition)
+                    data = await self._read_offline(query_engine, "cutting_forecast", condition, codes, add_process)
                 else:
                     if add_process:
                         add_process("📥 Đang lấy dữ liệu Cutting Forecast...")
                     await asyncio.to_thread(run_cutting_forecast)
-                    data = await query_engine.get_data_async("cutting_forecast", "*", condition)
+                    data = await self._read_back(query_engine, "cutting_forecast", condition, codes)
             else:
                 data = await query_engine.get_data_async("cutting_forecast", "*")
 
@@ -642,26 +730,31 @@ class TaskManager:
             add_process = context.get("add_process_message") if context else None
             query = context.get("query") if context else ''
             codes = conditions.get("codes", [])
+            full_refresh = conditions.get("full_refresh", False)
             if codes:
                 from ui_setup.data_dmtt.fabric_trans import FabricTrans
                 codes_str = ",".join(f"'{code}'" for code in codes)
 
                 def run_fabric_trans():
-                    """Chạy FabricTrans trong thread riêng"""
-                    ft = FabricTrans(code_name=codes_str)
-                    ft.process_data()
+                    """Chạy FabricTrans trong thread riêng, bỏ qua mã có nguồn chưa đổi"""
+                    return get_freshness_registry().refresh(
+                        "fabric_trans", codes_str,
+                        lambda changed: FabricTrans(code_name=changed).process_data(full_refresh=full_refresh),
+                        force=full_refresh
+                    )
 
                 condition = f'"SC_NO" IN ({codes_str}) OR "JO_NO" IN ({codes_str})'
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thông \"Lấy báo cáo hoặc lấy dữ liệu ...\"")
-                    data = await query_engine.get_data_async("fabric_trans", "*", condition)
+                    data = await self._read_offline(query_engine, "fabric_trans", condition, codes, add_process)
                 else:
                     if add_process:
                         add_process("📥 Đang lấy dữ liệu Fabric Transaction Summary...")
                     # Import và chạy FabricTrans
-                    await asyncio.to_thread(run_fabric_trans)                           
-                    data = await query_engine.get_data_async("fabric_trans", "*", condition)
+                    refresh = await asyncio.to_thread(run_fabric_trans)
+                    self._notify_refresh(add_process, "Fabric Transaction Summary", refresh)
+                    data = await self._read_back(query_engine, "fabric_trans", condition, codes)
             else:
                 data = await query_engine.get_data_async("fabric_trans", "*")
 
@@ -676,26 +769,31 @@ class TaskManager:
             add_process = context.get("add_process_message") if context else None
             query = context.get("query") if context else ''
             codes = conditions.get("codes", [])
+            full_refresh = conditions.get("full_refresh", False)
             if codes:
                 from ui_setup.data_dmtt.submat_trans import SubmatTrans
                 codes_str = ",".join(f"'{code}'" for code in codes)
 
                 def run_submat_trans():
-                    """Chạy SubmatTrans trong thread riêng"""
-                    st = SubmatTrans(code_name=codes_str)
-                    st.process_data()
+                    """Chạy SubmatTrans trong thread riêng, bỏ qua mã có nguồn chưa đổi"""
+                    return get_freshness_registry().refresh(
+                        "submat_trans", codes_str,
+                        lambda changed: SubmatTrans(code_name=changed).process_data(full_refresh=full_refresh),
+                        force=full_refresh
+                    )
                 
                 condition = f'"SC_NO" IN ({codes_str}) OR "JO_NO" IN ({codes_str})'
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thông \"Lấy báo cáo hoặc lấy dữ liệu ...\"")
-                    data = await query_engine.get_data_async("submat_trans", "*", condition)
+                    data = await self._read_offline(query_engine, "submat_trans", condition, codes, add_process)
                 else:
                     if add_process:
                         add_process("📥 Đang lấy dữ liệu Submat Transaction Summary...")
                     # Import và chạy SubmatTrans
-                    await asyncio.to_thread(run_submat_trans)
-                    data = await query_engine.get_data_async("submat_trans", "*", condition)
+                    refresh = await asyncio.to_thread(run_submat_trans)
+                    self._notify_refresh(add_process, "Submat Transaction Summary", refresh)
+                    data = await self._read_back(query_engine, "submat_trans", condition, codes)
             else:
                 data = await query_engine.get_data_async("submat_trans", "*")
 
@@ -710,6 +808,7 @@ class TaskManager:
             add_process = context.get("add_process_message") if context else None
             query = context.get("query") if context else ""
             codes = conditions.get("codes", [])
+            full_refresh = conditions.get("full_refresh", False)
             if codes:
                 
                 from ui_setup.data_dmkt.get_dmsm_sql import DemandSM
@@ -721,22 +820,29 @@ class TaskManager:
 
                 def run_submat_demand():
                     """Chạy DemandSM trong thread riêng"""
-                    ds = DemandSM(code_sd, code_gq)
-                    ds.get_data_demand()
-                    ds.get_go_quantity()
+                    # Chỉ lấy lại các mã có nguồn đã đổi
+                    registry = get_freshness_registry()
+                    refresh = registry.refresh(
+                        "submat_demand", code_sd, lambda changed: DemandSM(changed, code_gq).get_data_demand(),
+                        force=full_refresh
+                    )
+                    registry.refresh("go_quantity", code_gq, lambda changed: DemandSM(code_sd, changed).get_go_quantity(),
+                                     force=full_refresh)
+                    return refresh
 
                 condition = f'"JO_NO" IN ({codes_str}) OR "GO" IN ({codes_str})'
                 if self.is_no_sql_query(query):
                     if add_process:
                         add_process("📥 Đang xem dữ liệu offline. Nếu cần cập nhật online hãy đổi câu hỏi thông \"Lấy báo cáo hoặc lấy dữ liệu ...\"")
-                    data = await query_engine.get_data_async("submat_demand", "*", condition)
+                    data = await self._read_offline(query_engine, "submat_demand", condition, codes, add_process)
                     
                 else:
                     if add_process:
                         add_process("📥 Đang lấy dữ liệu Submat Demand...")
                     # Import và chạy DemandSM
-                    await asyncio.to_thread(run_submat_demand)
-                    data = await query_engine.get_data_async("submat_demand", "*", condition)
+                    refresh = await asyncio.to_thread(run_submat_demand)
+                    self._notify_refresh(add_process, "Submat Demand", refresh)
+                    data = await self._read_back(query_engine, "submat_demand", condition, codes)
             else:
                 data = await query_engine.get_data_async("submat_demand", "*")
             return data
@@ -756,11 +862,23 @@ class TaskManager:
             data = await query_engine.get_data_async("go_quantity", "*")
         return data
     
+# Các lần đọc đang chạy, dùng chung giữa mọi AsyncQueryEngine (single-flight).
+# Mỗi event loop (thread) có key riêng nhưng dict và thống kê dùng chung nên cần lock
+_inflight_reads = {}
+_inflight_stats = {"requests": 0, "coalesced": 0}
+_inflight_lock = threading.Lock()
+
+def get_coalescing_stats() -> dict:
+    """Số lần đọc và số lần được gộp vào một lần đọc đang chạy"""
+    with _inflight_lock:
+        return dict(_inflight_stats)
+
 class AsyncQueryEngine:
     """Updated AsyncQueryEngine với TaskManager"""
     
     def __init__(self):
         self.supabase = SupabaseFunctions()
+        self.supabase_async = AsyncSupabaseFunctions()
         self.task_manager = TaskManager(self)  # Thêm TaskManager
         self.task_patterns = TaskPattern()
 
@@ -796,10 +914,14 @@ class AsyncQueryEngine:
             }
         
         # Execute task
+        conditions = validation["satisfied_conditions"]
+        if self.task_manager.is_full_refresh_query(query):
+            # Lấy lại toàn bộ: bỏ qua probe độ mới, mốc đồng bộ tăng dần và kết quả đã nhớ
+            conditions["full_refresh"] = True
         try:
             result = await self.task_manager.execute_task(
                 task_name, 
-                validation["satisfied_conditions"], 
+                conditions, 
                 self,
                 context
             )
@@ -833,35 +955,83 @@ class AsyncQueryEngine:
         try:
             await asyncio.sleep(0.1)  # Đợi app khởi động xong
             # Warm up database connection
-            await asyncio.to_thread(self.supabase.get_data, "list_go LIMIT 1", ' "SC_NO" ')
+            # Mở sẵn kết nối keep-alive của client async
+            await self.supabase_async.get_data("list_go LIMIT 1", ' "SC_NO" ')
         except Exception as e:
             print(f"Warm up error: {e}")
             
-    async def get_data_async(self, table: str, columns: str = "*", condition: str = "") -> pd.DataFrame:
-        """Async data retrieval"""
+    async def get_data_async(self, table: str, columns: str = "*", condition: str = "", compact: bool = True,
+                             coalesce: bool = True) -> pd.DataFrame:
+        """
+        Async data retrieval. Các lần đọc giống hệt nhau (table, columns, condition) đang chạy
+        cùng lúc, kể cả từ các session khác, được gộp thành một lần gọi Supabase.
+        Key gồm generation của bảng: lần đọc bắt đầu sau khi bảng được ghi không gộp vào lần đọc cũ.
+        coalesce=False luôn đọc mới (vd đọc lại ngay sau khi ghi).
+        Kết quả dùng để hiển thị nên mặc định được đổi sang kiểu gọn (compact_dtypes)
+        """
+        if not coalesce:
+            with _inflight_lock:
+                _inflight_stats["requests"] += 1
+            return await self._fetch_data(table, columns, condition, compact)
+
+        key = (asyncio.get_running_loop(), table, columns.strip(), (condition or "").strip(), compact,
+               read_cache.generation(table))
+        with _inflight_lock:
+            task = _inflight_reads.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_data(table, columns, condition, compact))
+                _inflight_reads[key] = task
+                task.add_done_callback(lambda _: self._forget_read(key))
+            else:
+                _inflight_stats["coalesced"] += 1
+            _inflight_stats["requests"] += 1
+
+        # shield: một waiter bị hủy không hủy lần đọc của các waiter khác
+        data = await asyncio.shield(task)
+        # Mỗi waiter nhận bản copy riêng để không sửa lẫn dữ liệu của nhau
+        return data.copy()
+
+    @staticmethod
+    def _forget_read(key):
+        with _inflight_lock:
+            _inflight_reads.pop(key, None)
+
+    async def _fetch_data(self, table: str, columns: str = "*", condition: str = "", compact: bool = True) -> pd.DataFrame:
         try:
-            return await asyncio.to_thread(self.supabase.get_data, table, columns, condition)
-        except Exception as e:
+            if not condition:
+                # Lấy toàn bộ bảng ("tất cả"): đọc phân trang song song thay vì một response lớn
+                data = await self.supabase_async.get_data_paged(table, columns)
+            else:
+                data = await self.supabase_async.get_data(table, columns, condition)
+            return compact_dtypes(table, data) if compact else data
+        except DataSourceError as e:
+            # Không trả DataFrame rỗng khi lỗi: executor báo lỗi thay vì "không có dữ liệu"
             print(f"Data retrieval error for {table}: {e}")
-            return pd.DataFrame()
+            raise
     
+    async def fetch_many(self, queries: Dict[str, tuple]) -> Dict[str, Any]:
+        """
+        Đọc đồng thời nhiều bảng {key: (table, columns, condition)}.
+        Mỗi key nhận DataFrame hoặc exception của riêng nó (lỗi một bảng không hủy các bảng khác)
+        """
+        results = await asyncio.gather(
+            *(self.get_data_async(table, columns, condition) for table, columns, condition in queries.values()),
+            return_exceptions=True
+        )
+        return dict(zip(queries, results))
+
     async def process_multiple_queries(self, queries: List[tuple]) -> Dict[str, pd.DataFrame]:
         """Xử lý nhiều queries đồng thời"""
-        tasks = []
-        for table, columns, condition in queries:
-            task = self.get_data_async(table, columns, condition)
-            tasks.append((table, task))
-        
+        fetched = await self.fetch_many({table: (table, columns, condition) for table, columns, condition in queries})
+
         results = {}
-        for table, task in tasks:
-            try:
-                data = await task
-                if not data.empty and 'id' in data.columns:
-                    data = data.drop(columns=["id"])
-                results[table] = data
-            except Exception as e:
-                print(f"Error processing {table}: {e}")
+        for table, data in fetched.items():
+            if isinstance(data, Exception):
+                print(f"Error processing {table}: {data}")
                 results[table] = pd.DataFrame()
+                continue
+            if not data.empty and 'id' in data.columns:
+                data = data.drop(columns=["id"])
+            results[table] = data
         
         return results
-    
\ No newline at end of file
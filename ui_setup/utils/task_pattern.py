@@ -1,10 +1,28 @@
 import asyncio
 import re
+import threading
 from typing import Optional
 
 import numpy as np
 from ui_setup.utils.data_processor import DataProcessor
 
+EMBEDDING_MODEL_NAME = "thenlper/gte-base"
+
+# Model embedding dùng chung cho cả process (mọi session chat), load một lần
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """Load model embedding (chạy trong thread vì mất vài giây)"""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+def is_embedding_model_loaded() -> bool:
+    return _embedding_model is not None
 
 class TaskPattern:
     def __init__(self):
@@ -18,10 +36,7 @@ class TaskPattern:
         """Lazy loading cho embedding model"""
         
         if self._embedding_model is None:
-            from sentence_transformers import SentenceTransformer
-            self._embedding_model = await asyncio.to_thread(
-                SentenceTransformer, "thenlper/gte-base"
-            )
+            self._embedding_model = await asyncio.to_thread(get_embedding_model)
         return self._embedding_model
     
     async def _generate_task_embeddings(self):
@@ -0,0 +1,105 @@
+import threading
+import time
+import traceback
+
+from sqlalchemy import text
+
+from settings.config import WARM_UP_SQL_CONNECTIONS, WARM_UP_KEEPALIVE_INTERVAL
+
+# Trạng thái sẵn sàng của từng thành phần, UI đọc qua get_readiness()
+_readiness = {
+    "sql_server": False,
+    "supabase": False,
+    "embedding_model": False,
+}
+_errors = {}
+_readiness_lock = threading.Lock()
+_started = threading.Event()
+
+def _set_ready(name: str, ready: bool, error: str = None):
+    with _readiness_lock:
+        _readiness[name] = ready
+        if error:
+            _errors[name] = error
+        else:
+            _errors.pop(name, None)
+
+def get_readiness() -> dict:
+    """{"sql_server": bool, "supabase": bool, "embedding_model": bool, "errors": {...}}"""
+    with _readiness_lock:
+        return dict(_readiness, errors=dict(_errors))
+
+def is_ready() -> bool:
+    with _readiness_lock:
+        return all(_readiness.values())
+
+def _run_step(name: str, func):
+    try:
+        start = time.perf_counter()
+        func()
+        _set_ready(name, True)
+        print(f"✅ Warm up {name}: {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        _set_ready(name, False, str(e))
+        print(f"❌ Warm up {name} lỗi: {e}")
+
+def _warm_sql_server():
+    """Mở sẵn vài kết nối trong pool dùng chung rồi trả về pool"""
+    from database.connect_sqlserver import build_dsn, get_engine
+    engine = get_engine(build_dsn())
+    connections = []
+    try:
+        for _ in range(max(1, WARM_UP_SQL_CONNECTIONS)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            connections.append(conn)
+    finally:
+        for conn in connections:
+            conn.close()
+
+def _ping_sql_server():
+    from database.connect_sqlserver import build_dsn, get_engine
+    with get_engine(build_dsn()).connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+def _ping_supabase():
+    """Một truy vấn nhỏ để mở (hoặc giữ) kết nối TLS của client Supabase"""
+    from database.connect_supabase import supabase
+    supabase.rpc("select_data", {
+        "table_name": "list_go LIMIT 1",
+        "select_item": ' "SC_NO" ',
+        "conditions": None
+    }).execute()
+
+def _load_embedding_model():
+    from ui_setup.utils.task_pattern import get_embedding_model
+    get_embedding_model()
+
+def _warm_up_loop():
+    # Các bước độc lập chạy song song để tổng thời gian bằng bước lâu nhất
+    steps = [
+        threading.Thread(target=_run_step, args=("sql_server", _warm_sql_server), daemon=True),
+        threading.Thread(target=_run_step, args=("supabase", _ping_supabase), daemon=True),
+        threading.Thread(target=_run_step, args=("embedding_model", _load_embedding_model), daemon=True),
+    ]
+    for step in steps:
+        step.start()
+    for step in steps:
+        step.join()
+
+    # Giữ kết nối sống để không bị server/NAT cắt khi không có người dùng
+    while True:
+        time.sleep(WARM_UP_KEEPALIVE_INTERVAL)
+        _run_step("sql_server", _ping_sql_server)
+        _run_step("supabase", _ping_supabase)
+
+def start_warm_up():
+    """Chạy warm up nền (chỉ một lần cho cả process), không chặn giao diện"""
+    if _started.is_set():
+        return
+    _started.set()
+    try:
+        threading.Thread(target=_warm_up_loop, name="warm-up", daemon=True).start()
+    except Exception:
+        _started.clear()
+        print(traceback.format_exc())